@@ -164,3 +164,35 @@ STATICFILES_DIRS = [
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# MEHF handler loading
+# Reads the 'MEH_PROFILE' environment variable to determine the role of this server.
+# Each profile lists the handlers to load ('allow') and skip ('deny'),
+# as fnmatch patterns on the module name ('recog') or handler ('recog.FaceRecognize').
+# The top level 'ALLOW' list is used for profiles that do not provide one,
+# and the top level 'DENY' list applies to all profiles.
+# Handler modules that are not allowed are never imported!
+# Reads the 'MEH_RECOG_WORKERS' environment variable to determine the number of
+# worker processes each recognition handler is ran in, 0 to run them in a thread.
+# Reads the 'MEH_INFERENCE_WORKERS' environment variable to determine the number of
+# threads the async consumer runs synchronous handlers in.
+# Reads the 'MEH_CONSUMER_WORKERS' environment variable to determine the number of
+# threads the sync consumer handles the frames of all connections in.
+
+MEH = {
+    'PATH': 'meh/hands/',
+    'LAZY': True,
+    'RECOG_WORKERS': int(os.environ.get('MEH_RECOG_WORKERS', 0)),
+    'INFERENCE_WORKERS': int(os.environ.get('MEH_INFERENCE_WORKERS', 8)),
+    'CONSUMER_WORKERS': int(os.environ.get('MEH_CONSUMER_WORKERS', 16)),
+    'PROFILE': os.environ.get('MEH_PROFILE', 'all'),
+    'ALLOW': ['*'],
+    'DENY': [],
+    'PROFILES': {
+        'all': {},
+        'recognizer': {'allow': ['recog']},
+        'admin-sync': {'allow': ['misc.SheetsSync']},
+        'demo': {'allow': ['dummy']},
+    },
+}
@@ -1,8 +1,35 @@
 import json
+import asyncio
+import threading
 
-from channels.generic.websocket import WebsocketConsumer
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from channels.generic.websocket import WebsocketConsumer, AsyncWebsocketConsumer
 
 from meh.collection import HandlerCollection, parse_directory
+from meh.delta import DeltaTracker
+from meh.envelope import is_envelope, pack, unpack
+from meh.errors import EnvelopeError
+from meh.formatters import NegotiatedFormatter
+from meh.mailbox import Mailbox, AsyncMailbox
+from meh.rate import RateAdvisor
+
+# Frames older than this many milliseconds are dropped,
+# unless the client provides a deadline of it's own:
+
+FRAME_TIMEOUT = 1000
+
+# Connections that only receive what changed are sent
+# the full response this often, in seconds:
+
+DELTA_INTERVAL = 5.0
+
+# Formats responses can be negotiated in, used to read responses when sending deltas:
+
+FORMATS = NegotiatedFormatter()
 
 # The camera consumer takes image data from the webcam (sent over websockets)
 # and sends back the processed metadata.
@@ -10,17 +37,43 @@ from meh.collection import HandlerCollection, parse_directory
 # In this example, we create a HandlerCollection
 # and load the relevant handlers.
 
-# Create the HandlerCollection:
+# Determine the handlers to load for the profile of this server:
+
+config = getattr(settings, 'MEH', {})
+profile = config.get('PROFILES', {}).get(config.get('PROFILE'))
+
+# Create the HandlerCollection.
+# The AsyncCameraConsumer runs synchronous handlers (that have no pool of their own)
+# in a bounded executor, so sockets don't each need a thread:
 
 print("> Creating HandlerCollection ...")
 
-hands = HandlerCollection()
+hands = HandlerCollection(executor=ThreadPoolExecutor(max_workers=config.get('INFERENCE_WORKERS', 8), thread_name_prefix='inference'))
+
+# The CameraConsumer handles the frames of each connection in this executor,
+# so connections only hold a thread while they have frames to handle:
+
+workers = ThreadPoolExecutor(max_workers=config.get('CONSUMER_WORKERS', 16), thread_name_prefix='camera-consumer')
+
+# Recommends how fast (and at what size and quality) each client should send frames,
+# based on how long their frames take, and how many frames we handle at once:
+
+advisor = RateAdvisor(capacity=config.get('INFERENCE_WORKERS', 8))
+
+if profile is None:
 
-# Load all handlers:
+    raise ImproperlyConfigured("Unknown MEH profile: {}".format(config.get('PROFILE')))
 
-print("> Loading handlers ...")
+# Load the handlers, deferring expensive modules until their events are received:
 
-parse_directory('meh/hands/', hands)
+print("> Loading handlers for profile [{}] ...".format(config.get('PROFILE')))
+
+parse_directory(
+    config.get('PATH', 'meh/hands/'), hands,
+    lazy=config.get('LAZY', True),
+    allow=profile.get('allow', config.get('ALLOW')),
+    deny=list(config.get('DENY', ())) + list(profile.get('deny', ())),
+)
 
 # Start all handlers:
 
@@ -35,6 +88,7 @@ hands.start_all()
 print("+========================================+")
 print("         --== [MEHF Status] ==--")
 print("\nHandlers Loaded: [{}]".format(hands.num_loaded))
+print("Events Deferred: [{}]".format(', '.join(map(str, hands.pending))))
 
 # Iterate over each handler:
 
@@ -48,36 +102,529 @@ print("\n         --== [End MEHF Status] ==--")
 print("+========================================+")
 
 
-class CameraConsumer(WebsocketConsumer):
+class FrameProtocol(object):
+    """
+    Reads frames and builds responses, for both of our consumers.
+
+    Frames should be sent as binary envelopes (see meh.envelope),
+    which carry the length of the metadata in a fixed size header,
+    so the payload is never scanned or copied.
+    Responses to envelopes are sent back in an envelope,
+    with the metadata of the request.
+    Clients can choose the format of responses for the connection
+    by providing it under 'format' in the metadata, such as 'msgpack'.
+    Binary responses (such as MessagePack) are sent as binary payloads.
+    Clients can also ask to only be sent what changed for the connection,
+    by providing True under 'delta' in the metadata (see 'send_delta()').
+
+    The older formats are still accepted, and are responded to as text:
+    text frames, with the metadata followed by a Base64 data URI,
+    and binary frames, with the metadata followed by the raw image bytes.
+
+    Each connection has a mailbox that holds a single frame (see meh.mailbox).
+    Frames are put in the mailbox as they arrive, and a worker takes and handles
+    the latest one, so a frame that arrives while another is handled
+    replaces any frame still waiting, which is dropped.
+    Responses to envelopes carry the ID of the frame that was handled under 'frame'
+    (the ID the client provided, or the number of the frame on the connection),
+    and the number of frames dropped since the last response under 'dropped'.
+
+    Responses to envelopes also carry hints from the RateAdvisor under 'hints':
+    the recommended 'interval' between frames in milliseconds,
+    the 'width' of frames in pixels, and the JPEG 'quality' from 0 to 1.
+    Clients should follow these, so they send less when we are busy,
+    and more when we have room.
+
+    If a frame can't be handled (such as when it has no 'id'),
+    then we send back an error response instead (see 'build_error()'),
+    and carry on with the next frame.
+    """
+
+    def setup(self):
+        """
+        Sets up the state of a new connection.
+        """
+
+        # Format of our responses, negotiated by the client:
+
+        self.format = None
+
+        # Tracker of the responses we sent, if the client only wants what changed:
+
+        self.delta = None
+
+        # Number of frames received, and dropped frames we told the client about:
+
+        self.frames = 0
+        self.reported = 0
+
+        # Measurements of this connection, used for our rate hints:
+
+        self.rate = advisor.track()
+
+    def read_frame(self, text_data=None, bytes_data=None):
+        """
+        Reads the metadata and data of the given frame.
+
+        We return the metadata, the data, and the state we need to respond,
+        which is the metadata of the response if the frame is an envelope,
+        or the text of the metadata otherwise.
+
+        :param text_data: Text data to process
+        :type text_data: str
+        :param bytes_data: Binary data to process
+        :type bytes_data: bytes
+        :return: Metadata, data, and response state, or None if the frame is dropped
+        :rtype: tuple
+        """
+
+        if is_envelope(bytes_data):
+
+            try:
+
+                meta, data, _ = unpack(bytes_data)
+
+            except EnvelopeError as e:
+
+                print("Dropping malformed envelope: {}".format(e))
+
+                return None
+
+            self.frames += 1
+
+            reply = dict(meta)
+
+            reply.setdefault('frame', self.frames)
+
+            # Clients choose the format of responses once, and it is used for the entire connection:
+
+            if 'format' in meta:
+
+                self.format = meta['format']
+
+            elif self.format is not None:
+
+                meta['format'] = self.format
+
+            # Clients can also ask to only be sent what changed:
+
+            if 'delta' in meta:
+
+                self.delta = DeltaTracker(DELTA_INTERVAL) if meta['delta'] else None
+
+            meta.setdefault('timeout', FRAME_TIMEOUT)
+
+            return meta, data, reply
+
+        if bytes_data is not None:
+
+            # Split the metadata from the image, without copying the image:
+
+            index = bytes_data.index(b'}')
+
+            meta_text = bytes_data[0:index+1].decode()
+            data = memoryview(bytes_data)[index+1:]
+
+        else:
+
+            index = text_data.index('}')
+
+            meta_text = text_data[0:index+1]
+            data = text_data[index+1:]
+
+        meta = json.loads(meta_text)
+
+        # Responses are sent as text, so binary formats can't be used:
+
+        meta.pop('format', None)
+
+        meta.setdefault('timeout', FRAME_TIMEOUT)
+
+        return meta, data, meta_text
+
+    def build_response(self, meta, state, temp):
+        """
+        Builds the message to send in response to a frame.
+
+        :param meta: Metadata of the request
+        :type meta: dict
+        :param state: Response state given by 'read_frame()'
+        :type state: dict or str
+        :param temp: Data returned by the handlers
+        :type temp: Any
+        :return: Keyword arguments to pass to 'send()'
+        :rtype: dict
+        """
+
+        if isinstance(state, dict):
+
+            if self.delta is not None:
+
+                temp = self.send_delta(meta, state, temp)
+
+            # Tell the client how many frames were dropped:
+
+            dropped = self.mailbox.dropped
+
+            state['dropped'], self.reported = dropped - self.reported, dropped
+
+            # Tell the client how fast to send frames:
+
+            state['hints'] = advisor.hints(self.rate)
+
+            # Binary responses are sent as is, everything else as text:
+
+            if not isinstance(temp, (str, bytes, bytearray, memoryview)):
+
+                temp = json.dumps(temp)
+
+            return {'bytes_data': pack(state, temp)}
+
+        # Empty and late responses are not yet encoded:
+
+        if not isinstance(temp, str):
+
+            temp = json.dumps(temp)
+
+        return {'text_data': state + temp}
+
+    def build_error(self, state, exc):
+        """
+        Builds the message to send when a frame could not be handled.
+
+        The response is an object with the name of the exception under 'error',
+        and it's message under 'message'.
+        Responses to envelopes also carry True under 'error' in their metadata.
+
+        :param state: Response state given by 'read_frame()'
+        :type state: dict or str
+        :param exc: Exception that was raised
+        :type exc: Exception
+        :return: Keyword arguments to pass to 'send()'
+        :rtype: dict
+        """
+
+        print("Failed to handle frame: {!r}".format(exc))
+
+        body = json.dumps({'error': type(exc).__name__, 'message': str(exc)})
+
+        if isinstance(state, dict):
+
+            state['error'] = True
+
+            return {'bytes_data': pack(state, body)}
+
+        return {'text_data': state + body}
+
+    def send_delta(self, meta, reply, data):
+        """
+        Determines the part of the response that should be sent,
+        for clients that only want what changed.
+
+        Each response is compared to the last response sent for the same event,
+        and only the fields that changed are sent (fields that were removed are sent as null).
+        If nothing changed, then the payload is empty,
+        but the metadata (frame ID, dropped frames, and hints) is still sent.
+        The full response is sent every DELTA_INTERVAL seconds,
+        or when the client provides True under 'keyframe' in the metadata,
+        in which case 'keyframe' is True in the metadata of the response.
+
+        :param meta: Metadata of the request
+        :type meta: dict
+        :param reply: Metadata of the response
+        :type reply: dict
+        :param data: Full response, as reverted by the handlers
+        :type data: Any
+        :return: Response to send, empty if nothing changed
+        :rtype: Any
+        """
+
+        # Read the response in the format it was sent in:
+
+        form = FORMATS.formats.get(meta.get('format'), FORMATS.default)
+
+        try:
+
+            full = form.convert(data) if isinstance(data, (str, bytes, bytearray, memoryview)) else data
+
+        except Exception:
+
+            # Can't be read, send it as is:
+
+            full = data
+
+        out, keyframe = self.delta.update(meta['id'], full, meta.get('keyframe', False))
+
+        reply['keyframe'] = keyframe
+
+        if out is None:
+
+            # Nothing changed:
+
+            return ''
+
+        return data if keyframe else form.revert(out)
+
+
+async def _main_loop():
+    """
+    Gets the event loop channels is running on.
+
+    :return: Event loop
+    :rtype: asyncio.AbstractEventLoop
+    """
+
+    return asyncio.get_running_loop()
+
+
+class CameraConsumer(FrameProtocol, WebsocketConsumer):
+    """
+    Synchronous consumer of camera frames.
+
+    Frames are put in our mailbox as they arrive.
+    When a frame arrives and we are not already working,
+    we handle the frames in our mailbox in the shared 'workers' executor
+    until it is empty, so idle connections do not hold a thread.
+    Responses are sent using 'send()', which we run in the thread
+    channels runs it's synchronous consumers in.
+    """
 
     def connect(self):
+
+        self.setup()
+
+        self.mailbox = Mailbox()
+        self.loop = async_to_sync(_main_loop)()
+
+        self.working = False  # Value determining if our frames are being handled
+        self.lock = threading.Lock()
+
         self.accept()
 
     def disconnect(self, close_code):
         print("Disconnecting")
-        pass
 
-    def receive(self, text_data):
+        self.mailbox.close()
+
+    def receive(self, text_data=None, bytes_data=None):
         """
         Here is where the magic happens.
 
         This function will be called upon each frame received.
+        We put the frame in our mailbox, replacing any frame still waiting,
+        and start handling frames if we are not already.
+        See FrameProtocol for the formats we accept.
+
+        :param text_data: Text data to process
+        :type text_data: str
+        :param bytes_data: Binary data to process
+        :type bytes_data: bytes
+        """
+
+        frame = self.read_frame(text_data, bytes_data)
+
+        if frame is None:
+
+            return
+
+        self.mailbox.put(frame)
+
+        with self.lock:
+
+            if self.working:
+
+                # The frame will be taken by the work in progress:
+
+                return
+
+            self.working = True
+
+        workers.submit(self.work)
+
+    def work(self):
+        """
+        Handles the latest frame in our mailbox until it is empty.
+
         We pass the data through MEHF and then return the result.
+        If a frame fails, we send back an error and carry on.
+        If we can no longer send, then we close the connection.
+        """
+
+        try:
+
+            while True:
+
+                with self.lock:
+
+                    frame = self.mailbox.take(0)
+
+                    if frame is None:
+
+                        # Nothing left to do (or disconnected):
+
+                        self.working = False
+
+                        return
+
+                meta, data, state = frame
+
+                try:
+
+                    # Send the data along, measuring how long it takes:
+
+                    start = advisor.begin()
+
+                    try:
+
+                        temp = hands.handle(meta['id'], data, meta)
+
+                    finally:
+
+                        advisor.end(self.rate, start)
+
+                    out = self.build_response(meta, state, temp)
+
+                except Exception as e:
+
+                    out = self.build_error(state, e)
+
+                self.call(self.send, **out)
+
+        except Exception as e:
+
+            print("Camera consumer stopped: {!r}".format(e))
 
-        :param text_data: Data to process
+            with self.lock:
+
+                self.working = False
+
+            self.mailbox.close()
+
+            try:
+
+                self.call(self.close)
+
+            except Exception:
+
+                # Already closed:
+
+                pass
+
+    def call(self, func, *args, **kwargs):
+        """
+        Runs the given method in the thread channels runs our methods in, and waits for it.
+
+        We are called from the 'workers' executor,
+        which channels knows nothing about,
+        so methods that talk to the socket (such as 'send()') are ran by channels instead.
+
+        :param func: Method to run
+        :type func: Callable
+        :return: Value returned by the method
+        :rtype: Any
+        """
+
+        return asyncio.run_coroutine_threadsafe(sync_to_async(func)(*args, **kwargs), self.loop).result()
+
+
+class AsyncCameraConsumer(FrameProtocol, AsyncWebsocketConsumer):
+    """
+    Asynchronous consumer of camera frames.
+
+    We are identical to the CameraConsumer, except that we run on the event loop,
+    so idle connections do not hold a thread.
+    Frames are read on the event loop, and handled using 'HandlerCollection.handle_async()'
+    by a worker task of our own:
+    handlers with a pool of their own (such as the recognition handlers) are awaited in their pool,
+    AsyncHandlers are awaited natively, and other handlers are ran in the
+    bounded executor of the collection (see 'INFERENCE_WORKERS' in the MEH settings).
+    """
+
+    async def connect(self):
+
+        self.setup()
+
+        self.mailbox = AsyncMailbox()
+        self.worker = asyncio.ensure_future(self.work())
+
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        print("Disconnecting")
+
+        self.mailbox.close()
+
+    async def receive(self, text_data=None, bytes_data=None):
+        """
+        Puts each frame received in our mailbox, replacing any frame still waiting.
+
+        :param text_data: Text data to process
         :type text_data: str
+        :param bytes_data: Binary data to process
+        :type bytes_data: bytes
         """
 
-        index = text_data.index('}')
+        frame = self.read_frame(text_data, bytes_data)
 
-        # Process meta data:
+        if frame is not None:
 
-        meta_text = text_data[0:text_data.index('}')+1]
+            self.mailbox.put(frame)
 
-        meta = json.loads(meta_text)
+    async def work(self):
+        """
+        Handles the latest frame in our mailbox until we disconnect,
+        without holding a thread.
+
+        If a frame fails, we send back an error and carry on.
+        If we can no longer send, then we close the connection.
+        """
+
+        try:
+
+            while True:
+
+                frame = await self.mailbox.take()
+
+                if frame is None:
+
+                    # Disconnected:
+
+                    return
+
+                meta, data, state = frame
+
+                try:
+
+                    start = advisor.begin()
+
+                    try:
+
+                        temp = await hands.handle_async(meta['id'], data, meta)
+
+                    finally:
+
+                        advisor.end(self.rate, start)
+
+                    out = self.build_response(meta, state, temp)
+
+                except Exception as e:
+
+                    out = self.build_error(state, e)
+
+                await self.send(**out)
+
+        except Exception as e:
+
+            print("Camera consumer stopped: {!r}".format(e))
+
+            self.mailbox.close()
+
+            try:
+
+                await self.close()
 
-        # Send the data along:
+            except Exception:
 
-        temp = hands.handle(meta['id'], text_data[index+1:], meta)
+                # Already closed:
 
-        self.send(meta_text + temp)
+                pass
@@ -0,0 +1,35 @@
+"""
+Heavy resources shared by the handlers and views of this app.
+
+Each resource is registered with the ResourceRegistry of MEHF,
+so only one copy is kept in memory no matter how many
+handlers (or views) use it, and it is only loaded once needed.
+The libraries behind each resource are only imported when it is created.
+
+The following resources are available:
+
+* gesture_model - HandGestureClassifier used to classify hand landmarks
+* mp_hands - MediapipeHands graph used to find hand landmarks, NOT thread safe
+
+The FaceClassifier holds no state of it's own, so it is created where needed instead.
+"""
+
+from meh.resources import registry
+
+
+def _gesture_model():
+
+    from interaction.hand import HandGestureClassifier
+
+    return HandGestureClassifier()
+
+
+def _mp_hands():
+
+    from interaction.hand import MediapipeHands
+
+    return MediapipeHands()
+
+
+registry.register('gesture_model', _gesture_model)
+registry.register('mp_hands', _mp_hands, close=lambda hands: hands.close())
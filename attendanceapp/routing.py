@@ -4,4 +4,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     path('ws/camera', consumers.CameraConsumer.as_asgi()),
+    path('ws/camera/async', consumers.AsyncCameraConsumer.as_asgi()),
 ]
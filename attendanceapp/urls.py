@@ -7,5 +7,7 @@ urlpatterns = [
     path('app/', views.app, name='app'),
     path('oldapp/', views.oldapp, name='oldapp'),
     path('sync/', views.sync, name='sync'),
+    path('stats/', views.stats, name='stats'),
+    path('reload/<str:module>/', views.reload, name='reload'),
     path('register/<slug:groupid>', views.user_register, name='demoreg'),
 ]
@@ -1,4 +1,6 @@
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_POST
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 from django.utils import timezone
 
@@ -8,10 +10,13 @@ from .models import Person, Photo, Group
 from.forms import PersonForm
 
 from interaction.frame_analyzer import FrameAnalyzer
+from interaction.face import FaceClassifier
 
-from attendanceapp.consumers import hands
+from meh.resources import registry
 
-fa = FrameAnalyzer()
+from attendanceapp.consumers import hands, advisor
+
+import attendanceapp.resources  # Registers the shared models
 
 
 def index(request):
@@ -30,11 +35,41 @@ def sync(request):
     
     # Send a dummy message through:
     
-    num = hands.handle('sync', 'blah', None)
+    num = hands.handle('sync', 'blah', {})
 
     return HttpResponse("Sync operation completed, {} records loaded.".format(num))
 
 
+@staff_member_required
+def stats(request):
+
+    # Report the state of the handler pools, breakers, caches, shared resources and error throttle:
+
+    return JsonResponse({
+        'pools': hands.pool_stats(),
+        'breakers': hands.breaker_stats(),
+        'caches': hands.cache_stats(),
+        'resources': registry.stats(),
+        'errors': hands.throttle.stats() if hands.throttle is not None else {},
+        'deadlines': {'expired': hands.expired, 'timeouts': hands.timeouts},
+        'load': advisor.stats(),
+    })
+
+
+@staff_member_required
+@require_POST
+def reload(request, module):
+
+    # Reload the handlers in the module, without dropping any sockets:
+
+    new = hands.reload(module)
+
+    return JsonResponse({
+        'module': module,
+        'reloaded': [hand.name or type(hand).__name__ for hand in new],
+    })
+
+
 def user_register(request, groupid):
 
     if request.method == 'POST':
@@ -82,9 +117,11 @@ def user_register(request, groupid):
 
             image = cv2.imread(img.image.path)
 
-            fa.set_frame(image, 'BGR')
+            # Encode the face:
+
+            frame = FrameAnalyzer.standardize_frame_colorspace(image, 'BGR')
 
-            enc = fa._get_face_encoding()
+            enc = FaceClassifier().encode_face(frame, num_jitters=5, model='large')
 
             if enc is None:
                 
@@ -92,7 +129,7 @@ def user_register(request, groupid):
                 
                 return HttpResponse("Invalid face uploaded!")
 
-            print(fa.frame)
+            print(frame)
             print(enc)
 
             inst.encodings = enc.tolist()
@@ -0,0 +1,12 @@
+"""
+Benchmarks for the MEH Framework.
+
+These are not tests, they are scripts that measure
+how much overhead the framework adds to each frame.
+Each benchmark can be ran directly, for example:
+
+python -m benchmarks.bench_dispatch
+
+The overhead suite under 'bench_overhead' can save it's results
+under the current commit, so regressions can be compared across commits.
+"""
@@ -0,0 +1,160 @@
+"""
+Measures the dispatch overhead of HandlerCollection.handle().
+
+We compare the precompiled routing table against the legacy
+dispatch path, which built new handler lists for every event.
+All handlers used here do no work, so the numbers only show
+the cost of the framework itself, per frame.
+
+Run this benchmark like so:
+
+python -m benchmarks.bench_dispatch
+"""
+
+import timeit
+
+from collections import defaultdict
+
+from meh.collection import HandlerCollection
+from meh.hand import BaseHandler
+
+
+class StubHandler(BaseHandler):
+    """
+    StubHandler - Returns a constant, does no other work.
+    """
+
+    def handle(self, data):
+
+        return data
+
+
+class LegacyHandlerCollection(HandlerCollection):
+    """
+    LegacyHandlerCollection - Dispatches like HandlerCollection used to.
+
+    We keep a defaultdict of handlers, and concatenate
+    the handler lists on each call to handle().
+    """
+
+    def __init__(self) -> None:
+
+        super().__init__()
+
+        self.hands = defaultdict(lambda: [])
+
+    def handle(self, id, data, meta):
+
+        hands = self.hands[id]
+
+        if not hands:
+
+            hands = hands + self.hands[None]
+
+        else:
+
+            hands = hands + self.hands[HandlerCollection.GLOBAL]
+
+        final_data = {}
+        temp = None
+
+        for hand in hands:
+
+            try:
+
+                temp = hand._meta_handle(data, meta)
+
+            except Exception as e:
+
+                temp = self.error_handle(e, hand, data, 'handle', e, meta)
+
+            finally:
+
+                if temp is not None:
+
+                    final_data = temp
+
+        return final_data
+
+
+def build(cls, num_ids=10):
+    """
+    Creates a collection with a handler bound to each ID,
+    as well as a global handler and a default handler.
+
+    :param cls: Collection class to instantiate
+    :type cls: type
+    :param num_ids: Number of event IDs to register
+    :type num_ids: int
+    :return: Populated collection
+    :rtype: HandlerCollection
+    """
+
+    hands = cls()
+
+    for num in range(num_ids):
+
+        hands.load_handler(StubHandler(), ids=['event{}'.format(num)])
+
+    hands.load_handler(StubHandler(), ids=[HandlerCollection.GLOBAL])
+    hands.load_handler(StubHandler(), ids=[None])
+
+    return hands
+
+
+def bench(hands, id, number):
+    """
+    Returns the average time in nanoseconds for one dispatch.
+
+    :param hands: Collection to dispatch through
+    :type hands: HandlerCollection
+    :param id: Event ID to send
+    :type id: str
+    :param number: Number of dispatches to run
+    :type number: int
+    :return: Nanoseconds per dispatch
+    :rtype: float
+    """
+
+    meta = {'id': id}
+
+    best = min(timeit.repeat(lambda: hands.handle(id, 'frame', meta), number=number, repeat=5))
+
+    return best / number * 1e9
+
+
+def main(number=200000):
+
+    cases = (
+        ('known id', 'event3'),
+        ('unknown id', 'missing'),
+    )
+
+    print("{:<14}{:>14}{:>14}{:>10}".format('case', 'legacy (ns)', 'routed (ns)', 'speedup'))
+
+    for name, id in cases:
+
+        # Create fresh collections, so the legacy
+        # defaultdict does not carry over keys between cases:
+
+        before = bench(build(LegacyHandlerCollection), id, number)
+        after = bench(build(HandlerCollection), id, number)
+
+        print("{:<14}{:>14.1f}{:>14.1f}{:>9.2f}x".format(name, before, after, before / after))
+
+    # Show the legacy key growth:
+
+    legacy = build(LegacyHandlerCollection)
+    routed = build(HandlerCollection)
+
+    for num in range(1000):
+
+        legacy.handle('unknown{}'.format(num), 'frame', None)
+        routed.handle('unknown{}'.format(num), 'frame', None)
+
+    print("\nKeys after 1000 unknown events - legacy: {}, routed: {}".format(len(legacy.hands), len(routed.hands)))
+
+
+if __name__ == '__main__':
+
+    main()
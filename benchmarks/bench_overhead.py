@@ -0,0 +1,240 @@
+"""
+Measures the overhead the MEH Framework adds to each frame.
+
+All handlers used here do no work, so the numbers only show
+the cost of dispatching, converting and handling errors,
+apart from the models themselves.
+Image cases use a real JPEG face image, sent as a data URI
+just like the frontend sends frames.
+
+Each case reports the operations per second, the 50th and 99th
+percentile latency, the peak memory allocated per call,
+and the memory blocks leaked per call.
+
+Run this benchmark like so:
+
+python -m benchmarks.bench_overhead
+
+Results can be saved under the current commit with '--save',
+and compared against saved results with '--compare <path>':
+
+python -m benchmarks.bench_overhead --save --compare benchmarks/results/overhead-<commit>.json
+"""
+
+import os
+import json
+import base64
+import argparse
+
+from meh.breaker import ErrorThrottle
+from meh.collection import HandlerCollection
+from meh.envelope import pack, unpack
+from meh import formatters
+from meh.formatters import BaseFormatter, JSONFormatter, FastJSONFormatter, Base64ImageFormatter
+from meh.hand import BaseHandler
+
+from benchmarks.harness import measure, save, load, report
+
+IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'face_images', 'BarackObama.jpg')  # Image used for frames
+
+
+class StubHandler(BaseHandler):
+    """
+    StubHandler - Returns the data given to it, does no other work.
+    """
+
+    def handle(self, data):
+
+        return data
+
+
+class FailHandler(BaseHandler):
+    """
+    FailHandler - Raises an exception for every request.
+    """
+
+    def handle(self, data):
+
+        raise ValueError("Benchmark failure!")
+
+
+class ErrorHandler(BaseHandler):
+    """
+    ErrorHandler - Returns a constant error response.
+    """
+
+    def handle(self, data):
+
+        return {'error': True}
+
+
+def frame() -> str:
+    """
+    Creates a frame in the format the frontend sends.
+
+    :return: Base64 JPEG data URI
+    :rtype: str
+    """
+
+    with open(IMAGE, 'rb') as f:
+
+        return 'data:image/jpeg;base64,' + base64.b64encode(f.read()).decode('ascii')
+
+
+def split_text(data: bytes) -> tuple:
+    """
+    Splits a message in the old format into metadata and payload,
+    the same way the consumer does for binary messages.
+
+    The payload is sliced from a memoryview, so it is never copied.
+
+    :param data: Message, JSON metadata followed by the payload
+    :type data: bytes
+    :return: Metadata and a view of the payload
+    :rtype: tuple
+    """
+
+    index = data.index(b'}')
+
+    return json.loads(data[:index + 1]), memoryview(data)[index + 1:]
+
+
+def cases() -> dict:
+    """
+    Creates each case to measure.
+
+    :return: Case names to functions
+    :rtype: dict
+    """
+
+    uri = frame()
+    raw = Base64ImageFormatter().convert(uri)
+    doc = json.dumps({'id': 'frame', 'user': 12, 'boxes': [[10, 20, 110, 140]] * 4, 'name': 'Barack Obama'})
+    meta = {'id': 'frame'}
+
+    final = {}
+
+    # Dispatch through the collection:
+
+    hands = HandlerCollection()
+
+    for num in range(10):
+
+        hands.load_handler(StubHandler(), ids=['event{}'.format(num)])
+
+    hands.load_handler(StubHandler(), ids=[HandlerCollection.GLOBAL])
+    hands.load_handler(StubHandler(), ids=[None])
+
+    final['dispatch/known'] = lambda: hands.handle('event3', 'frame', meta)
+    final['dispatch/unknown'] = lambda: hands.handle('missing', 'frame', meta)
+
+    # Handler overhead, without the collection:
+
+    stub = StubHandler()
+
+    final['meta_handle/stub'] = lambda: stub._meta_handle('frame', meta)
+
+    # Formatters:
+
+    jform = JSONFormatter()
+    iform = Base64ImageFormatter()
+    conv = jform.convert(doc)
+
+    fform = FastJSONFormatter()
+
+    final['json/convert'] = lambda: jform.convert(doc)
+    final['json/revert'] = lambda: jform.revert(conv)
+    final['fastjson/convert'] = lambda: fform.convert(doc)
+    final['fastjson/revert'] = lambda: fform.revert(conv)
+
+    if formatters.msgpack is not None:
+
+        mform = formatters.MsgPackFormatter()
+        packed = mform.revert(conv)
+
+        final['msgpack/convert'] = lambda: mform.convert(packed)
+        final['msgpack/revert'] = lambda: mform.revert(conv)
+
+    final['image/convert'] = lambda: iform.convert(uri)
+    final['image/revert'] = lambda: iform.revert(raw)
+
+    if formatters.np is not None:
+
+        # Decoding into arrays, at full size and at the size the models use:
+
+        full = formatters.ImageArrayFormatter()
+        scaled = formatters.ScaledImageFormatter((360, 360))
+
+        final['image/decode_full'] = lambda: full.convert(raw)
+        final['image/decode_scaled'] = lambda: scaled.convert(raw)
+
+    # Envelopes, compared to the old text format:
+
+    env = pack(meta, raw)
+    text = (json.dumps(meta) + uri).encode()
+
+    final['envelope/unpack'] = lambda: unpack(env)
+    final['envelope/split_text'] = lambda: split_text(text)
+
+    # Image frames through the collection, two handlers share one conversion:
+
+    images = HandlerCollection()
+
+    images.load_handler(StubHandler(convert=Base64ImageFormatter(), revert=BaseFormatter()), ids=['frame'])
+    images.load_handler(StubHandler(convert=Base64ImageFormatter(), revert=BaseFormatter()), ids=['frame'])
+
+    final['dispatch/image'] = lambda: images.handle('frame', uri, meta)
+
+    # Errors, with and without throttling:
+
+    errors = HandlerCollection()
+
+    errors.load_handler(FailHandler(), ids=['frame'])
+    errors.load_handler(ErrorHandler(), ids=[BaseException])
+
+    final['error/throttled'] = lambda: errors.handle('frame', 'frame', meta)
+
+    loud = HandlerCollection()
+
+    loud.throttle = ErrorThrottle(rate=1e12, burst=2**62)
+
+    loud.load_handler(FailHandler(), ids=['frame'])
+    loud.load_handler(ErrorHandler(), ids=[BaseException])
+
+    final['error/handled'] = lambda: loud.handle('frame', 'frame', meta)
+
+    return final
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description="Measures the overhead of the MEH Framework.")
+
+    parser.add_argument('-n', '--number', type=int, default=20000, help="Number of calls to time for each case")
+    parser.add_argument('-k', '--filter', default='', help="Only run cases containing this string")
+    parser.add_argument('--save', action='store_true', help="Save the results under the current commit")
+    parser.add_argument('--output', default=None, help="Path to save the results to, implies --save")
+    parser.add_argument('--compare', default=None, help="Path to saved results to compare against")
+
+    args = parser.parse_args()
+
+    results = {}
+
+    for name, func in cases().items():
+
+        if args.filter in name:
+
+            # Image cases are much slower, so we run less of them:
+
+            results[name] = measure(func, args.number // 10 if 'image' in name else args.number)
+
+    report(results, load(args.compare) if args.compare else None)
+
+    if args.save or args.output:
+
+        print("\nSaved results to {}".format(save('overhead', results, args.output)))
+
+
+if __name__ == '__main__':
+
+    main()
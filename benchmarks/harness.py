@@ -0,0 +1,226 @@
+"""
+Shared tools for measuring and recording benchmarks.
+
+Each case is a function that is called with no arguments.
+We report the operations per second, the 50th and 99th
+percentile latency, and the memory allocated per call.
+
+Results can be saved as JSON under the current git commit,
+and compared against the results of another commit,
+so we can see if a change made things slower.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import platform
+import subprocess
+import tracemalloc
+
+from typing import Callable, Optional
+
+RESULTS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')  # Directory results are saved to
+
+
+def measure(func: Callable[[], object], number: int=10000, warmup: int=100) -> dict:
+    """
+    Measures the given function.
+
+    We time each call on it's own, so we can determine the latency percentiles.
+    Timing each call adds a small constant to each sample,
+    which is the same for every commit, so comparisons are still fair.
+
+    Allocations are measured on separate calls using 'tracemalloc',
+    as tracing slows down the calls we time:
+
+        * alloc_bytes - Peak memory allocated during one call, in bytes
+        * alloc_blocks - Memory blocks still allocated after one call, which should be 0
+
+    :param func: Function to measure
+    :type func: Callable
+    :param number: Number of calls to time
+    :type number: int
+    :param warmup: Number of calls to make before timing
+    :type warmup: int
+    :return: Dictionary of results
+    :rtype: dict
+    """
+
+    for _ in range(warmup):
+
+        func()
+
+    # Time each call, without the garbage collector getting in the way:
+
+    samples = [0] * number
+    clock = time.perf_counter_ns
+
+    gc.collect()
+    gc.disable()
+
+    try:
+
+        for num in range(number):
+
+            start = clock()
+
+            func()
+
+            samples[num] = clock() - start
+
+    finally:
+
+        gc.enable()
+
+    samples.sort()
+
+    total = sum(samples)
+
+    # Measure the allocations:
+
+    blocks = sys.getallocatedblocks()
+    calls = min(number, 1000)
+
+    for _ in range(calls):
+
+        func()
+
+    gc.collect()
+
+    leaked = (sys.getallocatedblocks() - blocks) / calls
+
+    tracemalloc.start()
+
+    try:
+
+        func()
+
+        tracemalloc.reset_peak()
+
+        base = tracemalloc.get_traced_memory()[0]
+
+        func()
+
+        peak = tracemalloc.get_traced_memory()[1] - base
+
+    finally:
+
+        tracemalloc.stop()
+
+    return {
+        'ops': number / total * 1e9 if total else 0.0,
+        'p50_ns': samples[number // 2],
+        'p99_ns': samples[min(number - 1, number * 99 // 100)],
+        'alloc_bytes': peak,
+        'alloc_blocks': round(leaked, 2),
+    }
+
+
+def commit() -> str:
+    """
+    Gets the hash of the current git commit.
+
+    :return: Short commit hash, 'unknown' if not in a git repository
+    :rtype: str
+    """
+
+    try:
+
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+
+    except (OSError, subprocess.CalledProcessError):
+
+        return 'unknown'
+
+
+def save(name: str, results: dict, path: Optional[str]=None) -> str:
+    """
+    Saves the given results as JSON.
+
+    By default, we save to 'results/<name>-<commit>.json'
+    in the benchmarks directory.
+
+    :param name: Name of the benchmark
+    :type name: str
+    :param results: Case names to results
+    :type results: dict
+    :param path: Path to save to, None for the default
+    :type path: str
+    :return: Path the results were saved to
+    :rtype: str
+    """
+
+    rev = commit()
+
+    if path is None:
+
+        os.makedirs(RESULTS, exist_ok=True)
+
+        path = os.path.join(RESULTS, '{}-{}.json'.format(name, rev))
+
+    with open(path, 'w') as f:
+
+        json.dump({
+            'benchmark': name,
+            'commit': rev,
+            'time': time.time(),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent=2)
+
+    return path
+
+
+def load(path: str) -> dict:
+    """
+    Loads results saved by 'save()'.
+
+    :param path: Path to load from
+    :type path: str
+    :return: Case names to results
+    :rtype: dict
+    """
+
+    with open(path, 'r') as f:
+
+        return json.load(f)['results']
+
+
+def report(results: dict, base: Optional[dict]=None):
+    """
+    Prints a table of the given results.
+
+    If base results are given, then we also print
+    the change in operations per second for each case.
+
+    :param results: Case names to results
+    :type results: dict
+    :param base: Case names to results to compare against
+    :type base: dict
+    """
+
+    head = "{:<28}{:>12}{:>11}{:>11}{:>12}{:>9}".format('case', 'ops/sec', 'p50 (us)', 'p99 (us)', 'alloc (B)', 'leaked')
+
+    if base is not None:
+
+        head += "{:>10}".format('change')
+
+    print(head)
+
+    for name, res in results.items():
+
+        line = "{:<28}{:>12.0f}{:>11.2f}{:>11.2f}{:>12}{:>9}".format(
+            name, res['ops'], res['p50_ns'] / 1000, res['p99_ns'] / 1000, res['alloc_bytes'], res['alloc_blocks'],
+        )
+
+        if base is not None and name in base and base[name]['ops']:
+
+            line += "{:>+9.1f}%".format((res['ops'] / base[name]['ops'] - 1) * 100)
+
+        print(line)
@@ -20,30 +20,116 @@ if (location.protocol == 'https:'){
 
 // make connection
 const ws = new WebSocket(WS_URL);
+ws.binaryType = 'arraybuffer';
 ws.onopen = () => {
   console.log(`Connected to ${WS_URL}`);
 }
 
+// Hints from the server on how fast to send frames, and at what size and quality.
+// The server updates these with each response, based on how busy it is.
+
+var hints = {interval: 500, width: 640, quality: 0.9};
+var sending = false;
+
+function applyHints(next) {
+
+    hints = next;
+
+    // Keep the aspect ratio of the camera:
+
+    Webcam.set({
+        dest_width: hints.width,
+        dest_height: Math.round(hints.width * 600 / 640),
+        jpeg_quality: Math.round(hints.quality * 100)
+    });
+}
+
 // set camera click
 
 function click() {
-    
+
+    // Only start sending once, the interval is taken from the hints:
+
+    if (sending) {
+        return;
+    }
+
+    sending = true;
+
     var i = 0
-    setInterval(function () {
-        
-        // $(window).on('load', function(){
-        //     setTimeout(removeLoader, 2000); //wait for page load PLUS two seconds.
-        //   });
-        
+
+    function next() {
+
         takeSnapShot();
         i = i+1
         console.log(i);
 
-    },500) 
+        setTimeout(next, hints.interval);
+    }
+
+    next();
 }
 
 var flag = ''
-// TAKE A SNAPSHOT.
+
+// Messages are wrapped in envelopes (see meh/envelope.py):
+// an 8 byte header ('ME', version, flags, metadata length),
+// followed by the metadata as JSON, and then the payload.
+
+const ENVELOPE_VERSION = 1;
+const FLAG_TEXT = 0x01;
+
+function packEnvelope(meta, payload, flags) {
+
+    var metaBytes = new TextEncoder().encode(JSON.stringify(meta));
+    var header = new DataView(new ArrayBuffer(8));
+
+    header.setUint8(0, 0x4D);  // 'M'
+    header.setUint8(1, 0x45);  // 'E'
+    header.setUint8(2, ENVELOPE_VERSION);
+    header.setUint8(3, flags || 0);
+    header.setUint32(4, metaBytes.length);
+
+    return new Blob([header, metaBytes, payload]);
+}
+
+function unpackEnvelope(buffer) {
+
+    var view = new DataView(buffer);
+    var flags = view.getUint8(3);
+    var size = view.getUint32(4);
+    var meta = JSON.parse(new TextDecoder().decode(new Uint8Array(buffer, 8, size)));
+    var payload = new Uint8Array(buffer, 8 + size);
+
+    if (flags & FLAG_TEXT) {
+        payload = new TextDecoder().decode(payload);
+    }
+
+    return {meta: meta, payload: payload};
+}
+
+// Sends a frame in an envelope, with the raw JPEG bytes as the payload.
+// This is a third smaller than sending the data URI as text.
+
+// Each frame is given an ID, responses tell us which frame was handled,
+// as the server drops frames that arrive while it is busy.
+
+var frameCount = 0;
+
+function sendFrame(id, data_uri) {
+
+    var raw = atob(data_uri.slice(data_uri.indexOf(',') + 1));
+    var bytes = new Uint8Array(raw.length);
+
+    for (var i = 0; i < raw.length; i++) {
+        bytes[i] = raw.charCodeAt(i);
+    }
+
+    frameCount += 1;
+
+    ws.send(packEnvelope({"id": id, "frame": frameCount}, bytes));
+}
+
 takeSnapShot = function () {
 Webcam.snap(function (data_uri) {
 
@@ -57,13 +143,13 @@ Webcam.snap(function (data_uri) {
     // Send the image for face processing:
 
     if (flag == 'face') {
-        ws.send('{"id": "face"}' + str);
+        sendFrame('face', str);
     }
     
 
     // Send the image for hand processing:
     if (flag == 'hand') {
-        ws.send('{"id": "hand"}' + str);
+        sendFrame('hand', str);
     }
     
 
@@ -96,18 +182,46 @@ function faceRec() {
 
 ws.onmessage = (message) => {
 
-    // Decode any metadata we sent:
+    if (message.data instanceof ArrayBuffer) {
 
-    meta = message.data.slice(0, message.data.indexOf('}')+1);
+        // Responses to envelopes come back in an envelope:
 
-    // Get payload data:
+        var env = unpackEnvelope(message.data);
 
-    payload = message.data.slice(message.data.indexOf('}')+1);
+        meta_data = env.meta;
+        meta = JSON.stringify(meta_data);
+        // Connections that only receive what changed get an empty payload if nothing did:
+
+        data = env.payload.length ? JSON.parse(env.payload) : {};
+
+        if (meta_data['hints']) {
+            applyHints(meta_data['hints']);
+        }
+
+        if (meta_data['error']) {
+            console.log("Server failed to handle frame " + meta_data['frame'] + ": " + env.payload);
+        }
+
+        if (meta_data['dropped']) {
+            console.log("Server dropped " + meta_data['dropped'] + " frames, handled frame " + meta_data['frame']);
+        }
+
+    } else {
+
+        // Decode any metadata we sent:
+
+        meta = message.data.slice(0, message.data.indexOf('}')+1);
+
+        // Get payload data:
+
+        payload = message.data.slice(message.data.indexOf('}')+1);
+
+        data = JSON.parse(payload);
+        meta_data = JSON.parse(meta);
+    }
 
     // Output some stuff:
 
-    data = JSON.parse(payload);
-    meta_data = JSON.parse(meta);
     console.log("Server says:", JSON.stringify(data));
     console.log("Metadata: " + meta);
     // output.innerText = JSON.stringify(data);
@@ -15,9 +15,16 @@ class FaceClassifier:
             standard frame of image
         The frame of the image that contains the face.
         """
+        return self.locate_and_encode_face(std_frame, num_jitters, model)[1]
+
+    def locate_and_encode_face(self, std_frame, num_jitters=1, model='small'):
+        """Same as ``encode_face()``, but also returns the location of the
+        encoded face, as a (top, right, bottom, left) box in pixels.
+        Returns (None, None) if no face is found.
+        """
         face_locations = fr.face_locations(std_frame)
         if len(face_locations) == 0:
-            return
+            return None, None
         face_encodings = fr.face_encodings(
             std_frame,
             face_locations,
@@ -25,8 +32,8 @@ class FaceClassifier:
             model=model,
         )
         if len(face_encodings) == 0:
-            return
-        return face_encodings[0]
+            return None, None
+        return face_locations[0], face_encodings[0]
 
     def find_best_matching_face_index(self, enc, list_of_encs):
         """Compares and returns the most similar face/encoding in list of 
@@ -46,3 +53,23 @@ class FaceClassifier:
                 min_dist = dist
                 best_index = i
         return best_index
+
+    def find_best_matching_face_indices(self, list_of_enc, list_of_encs):
+        """Same as ``find_best_matching_face_index()``, but for many encoded
+        faces at once, using a single distance matrix.
+        Parameters
+        ----------
+        list_of_enc : list of numpy arrays
+            encoded faces to compare
+        list_of_encs : list of numpy arrays
+            list of saved face encoding to compare with each enc
+        """
+        if len(list_of_enc) == 0:
+            return []
+        if len(list_of_encs) == 0:
+            return [-1] * len(list_of_enc)
+        dists = np.linalg.norm(
+            np.asarray(list_of_enc)[:, np.newaxis, :] - np.asarray(list_of_encs)[np.newaxis, :, :],
+            axis=2,
+        )
+        return np.argmin(dists, axis=1).tolist()
@@ -207,5 +207,79 @@ class FrameAnalyzer():
         if enc is not None:
             return self.face_classifier.find_best_matching_face_index(enc, list_of_encs)
     
+    def recognize_hand_batch(self, frames, rgb):
+        """Recognize the best hand in each of the given frames.
+
+        Landmarks are found one frame at a time, and then all hands are
+        classified with a single call to the model.
+
+        Parameters
+        ----------
+        frames : list of numpy.ndarray
+            The frames to be analyzed.
+        rgb : str
+            The color space of the frames.
+
+        Returns
+        -------
+        hands : list of ``hand.Hand`` instances or None
+            One element per frame, None if no hand is detected.
+        """
+        found, list_of_landmarks, list_of_points = [], [], []
+        for i, frame in enumerate(frames):
+            self.set_frame(frame, rgb)
+            self.mp_hands.process_frame(self.frame)
+            if self.mp_hands.n_hands_found > 0:
+                found.append(i)
+                list_of_landmarks.append(self.mp_hands.get_best_landmarks())
+                list_of_points.append(self.mp_hands.get_best_points())
+        hands = [None] * len(frames)
+        for i, hand, points in zip(found, self.hand_classifier.predict_many(list_of_landmarks), list_of_points):
+            hand.points = points
+            hands[i] = hand
+        return hands
+
+    def recognize_face_batch(self, frames, rgb, list_of_encs, return_boxes=False):
+        """Recognize the face in each of the given frames.
+
+        Faces are encoded one frame at a time, and then all encodings are
+        matched against ``list_of_encs`` at once.
+
+        Parameters
+        ----------
+        frames : list of numpy.ndarray
+            The frames to be analyzed.
+        rgb : str
+            The color space of the frames.
+        list_of_encs : list of numpy.ndarray
+            The known face encodings.
+        return_boxes : bool, default False
+            Whether to also return the box of the face found in each frame.
+
+        Returns
+        -------
+        faces : list of int or None
+            One index into ``list_of_encs`` per frame, None if no face is found.
+        boxes : list of tuple or None
+            Only returned if ``return_boxes`` is True. One (top, right, bottom,
+            left) box in pixels per frame, None if no face is found.
+        """
+        found, list_of_enc = [], []
+        boxes = [None] * len(frames)
+        for i, frame in enumerate(frames):
+            self.set_frame(frame, rgb)
+            box, enc = self.face_classifier.locate_and_encode_face(self.frame)
+            if enc is not None:
+                found.append(i)
+                list_of_enc.append(enc)
+                boxes[i] = box
+        faces = [None] * len(frames)
+        matches = self.face_classifier.find_best_matching_face_indices(list_of_enc, list_of_encs)
+        for i, index in zip(found, matches):
+            faces[i] = index
+        if return_boxes:
+            return faces, boxes
+        return faces
+
     def _get_face_encoding(self, num_jitters=5, model='large'):
         return self.face_classifier.encode_face(self.frame, num_jitters=num_jitters, model=model)
\ No newline at end of file
@@ -16,7 +16,7 @@ class Hand:
         'thumbs down',
     ]
 
-    def __init__(self, gesture, landmarks):
+    def __init__(self, gesture, landmarks, points=None):
         """
 
         Parameters
@@ -28,9 +28,14 @@ class Hand:
             https://github.com/MSU-AI/Attendance-Project/blob/master/hand-landmarks.png
             There should be 21 rows (landmarks) and 3 columns ((x, y, z)
             coordinates).
+        points : pandas.DataFrame, default None
+            The same landmarks before normalization, with (x, y) relative to
+            the width and height of the frame, i.e. in [0, 1]. Useful for
+            drawing the hand over the frame.
         """
         self.gesture = gesture
         self.landmarks = landmarks
+        self.points = points
 
     def __eq__(self, other):
         """
@@ -160,10 +165,12 @@ class MediapipeHands(mp.solutions.hands.Hands):
         """
         outputs = self.process(frame)
         self.landmarks_list = []
+        self.points_list = []
         multi_hand_landmarks = outputs.multi_hand_landmarks or []
         for one_hand_landmarks in multi_hand_landmarks:
-            df_hand = self.landmarks_to_dataframe(one_hand_landmarks)
-            df_hand = self.normalize_hand(df_hand, frame.shape)
+            df_points = self.landmarks_to_dataframe(one_hand_landmarks)
+            df_hand = self.normalize_hand(df_points, frame.shape)
+            self.points_list.append(df_points)
             self.landmarks_list.append(df_hand)
         return self.landmarks_list
     
@@ -181,6 +188,12 @@ class MediapipeHands(mp.solutions.hands.Hands):
     def get_best_landmarks(self):
         return self.landmarks_list[0]
 
+    def get_best_points(self):
+        """Returns the landmarks of the best hand before normalization,
+        i.e. relative to the frame.
+        """
+        return self.points_list[0]
+
 
 class HandGestureClassifier:
     """A class that classifies hand gestures from normalized landmarks.
@@ -208,7 +221,30 @@ class HandGestureClassifier:
         hand : Hand instance
             The hand instance with predicted gesture.
         """
-        x = normed_landmarks.to_numpy()[1:].flatten() # ignore the first row, wrist
-        gesture_index = self.model.predict(x.reshape(1, -1))[0]
-        gesture_name = Hand.gestures[gesture_index]
-        return Hand(gesture_name, normed_landmarks)
\ No newline at end of file
+        return self.predict_many([normed_landmarks])[0]
+
+    def predict_many(self, list_of_normed_landmarks):
+        """Predict the gestures of many hands with a single model call.
+
+        Parameters
+        ----------
+        list_of_normed_landmarks : list of pandas.DataFrame
+            Each element is normalized according to
+            ``MediapipeHands.normalize_hand()``.
+
+        Returns
+        -------
+        hands : list of Hand instances
+            The hand instances with predicted gestures, in the same order.
+        """
+        if len(list_of_normed_landmarks) == 0:
+            return []
+        x = np.stack([
+            landmarks.to_numpy()[1:].flatten() # ignore the first row, wrist
+            for landmarks in list_of_normed_landmarks
+        ])
+        gesture_indices = self.model.predict(x)
+        return [
+            Hand(Hand.gestures[gesture_index], landmarks)
+            for gesture_index, landmarks in zip(gesture_indices, list_of_normed_landmarks)
+        ]
\ No newline at end of file
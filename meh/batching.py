@@ -0,0 +1,340 @@
+"""
+This file contains components for handling data in batches.
+
+Some handlers are far cheaper per item when given many items at once,
+such as handlers that run a model that can predict many samples in one call.
+Handlers can opt into batching by defining the 'batch_size' class parameter,
+in which case the HandlerCollection creates a BatchScheduler for the handler
+when it is started.
+
+The BatchScheduler collects requests from any number of callers,
+and sends them to the handler's 'handle_batch()' method in one batch,
+once we have 'batch_size' requests or the oldest request has waited
+for 'batch_timeout' seconds, whichever comes first.
+"""
+
+from __future__ import annotations
+
+import time
+import threading
+
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Optional
+
+from meh.errors import HandlerRejectedError, DeadlineExpiredError
+from meh.formatters import ConversionCache
+from meh.cache import MISS
+
+
+class BatchScheduler(object):
+    """
+    BatchScheduler - Collects requests and handles them in batches
+
+    We offer the same interface as the HandlerPool,
+    so the HandlerCollection can use us as the pool of a handler.
+    Each request is given a Future, which is resolved when the
+    batch containing the request is handled.
+
+    Batches are handled one at a time, in a thread of our own.
+    Requests whose future was cancelled before their batch
+    was taken are left out of the batch.
+    Requests whose deadline (see HandlerCollection) passed before their batch
+    was taken are also left out, and fail with a DeadlineExpiredError.
+    If 'max_in_flight' is provided, then requests are rejected
+    by raising a HandlerRejectedError when that many requests
+    are waiting or being handled.
+    """
+
+    def __init__(self, hand: Any, size: int, timeout: float, max_in_flight: Optional[int]=None) -> None:
+
+        self.hand = hand  # Handler we are batching for
+        self.size = size  # Maximum number of requests in a batch
+        self.timeout = timeout  # Maximum time in seconds the oldest request can wait
+        self.max_in_flight = max_in_flight  # Maximum requests in flight, None for no limit
+
+        self.queue = deque()  # Requests waiting to be batched
+        self.active = 0  # Number of requests in the batch being handled
+        self.running = True  # Value determining if we are accepting requests
+
+        self.submitted = 0  # Number of requests accepted
+        self.completed = 0  # Number of requests completed
+        self.cached = 0  # Number of requests answered from the handler's cache
+        self.failed = 0  # Number of requests that raised an exception
+        self.rejected = 0  # Number of requests rejected
+        self.expired = 0  # Number of requests dropped as their deadline passed
+        self.batches = 0  # Number of batches handled
+
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self._loop, name='{}-batch'.format(hand.name or type(hand).__name__), daemon=True)
+
+        self.thread.start()
+
+    @property
+    def in_flight(self) -> int:
+        """
+        Number of requests waiting or being handled.
+
+        :return: Requests in flight
+        :rtype: int
+        """
+
+        return len(self.queue) + self.active
+
+    def submit(self, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Future:
+        """
+        Adds the given data to the next batch.
+
+        We convert the data in the calling thread,
+        so conversions are shared with the other handlers in the dispatch,
+        and are not done one after another in our thread.
+        Any conversion errors are raised to the caller.
+        Requests are checked against our limit before they are converted,
+        so rejected data is never decoded.
+
+        If the handler has a response cached for the data,
+        then we return a future that is already done,
+        and the data is never queued.
+
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Future that will contain the data returned by the handler
+        :rtype: Future
+        :raise: HandlerRejectedError: If too many requests are in flight, or we are shutdown
+        """
+
+        fut = Future()
+
+        # Make sure we have room, before doing any work:
+
+        with self.cond:
+
+            self._admit()
+
+        # Convert the data before we queue it:
+
+        data = self.hand.convert.convert_cached(data, cache)
+
+        # Check if the handler has a response already:
+
+        key, out = self.hand._lookup(data, meta)
+
+        if out is not MISS:
+
+            self.cached += 1
+
+            fut.set_result(out)
+
+            return fut
+
+        with self.cond:
+
+            self._admit()
+
+            self.queue.append((data, meta, fut, time.monotonic(), key))
+
+            self.submitted += 1
+
+            self.cond.notify()
+
+        return fut
+
+    def _admit(self):
+        """
+        Ensures we can accept another request.
+
+        Our condition MUST be held!
+
+        :raise: HandlerRejectedError: If too many requests are in flight, or we are shutdown
+        """
+
+        if not self.running:
+
+            raise HandlerRejectedError("Batch scheduler for {} is shutdown!".format(self.hand.name))
+
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+
+            self.rejected += 1
+
+            raise HandlerRejectedError("Handler {} has {} requests in flight!".format(self.hand.name, self.in_flight))
+
+    def run(self, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Any:
+        """
+        Adds the given data to the next batch and waits for the result.
+
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data returned by the handler
+        :rtype: Any
+        """
+
+        return self.submit(data, meta, cache).result()
+
+    def shutdown(self, wait: bool=True):
+        """
+        Stops accepting requests.
+
+        Any requests that are waiting are still handled.
+
+        :param wait: Value determining if we wait for the remaining requests to be handled
+        :type wait: bool
+        """
+
+        with self.cond:
+
+            self.running = False
+
+            self.cond.notify()
+
+        if wait:
+
+            self.thread.join()
+
+    def stats(self) -> dict:
+        """
+        Returns stats about this scheduler.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        return {
+            'kind': 'batch',
+            'batch_size': self.size,
+            'batch_timeout': self.timeout,
+            'max_in_flight': self.max_in_flight,
+            'in_flight': self.in_flight,
+            'queued': len(self.queue),
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'cached': self.cached,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'expired': self.expired,
+            'batches': self.batches,
+            'mean_batch': (self.completed + self.failed) / self.batches if self.batches else 0,
+        }
+
+    def _loop(self):
+        """
+        Collects and handles batches until we are shutdown.
+        """
+
+        while True:
+
+            with self.cond:
+
+                # Wait for a request:
+
+                while self.running and not self.queue:
+
+                    self.cond.wait()
+
+                if not self.queue:
+
+                    # Shutdown and nothing left to do:
+
+                    return
+
+                # Wait until the batch is full, or the oldest request is too old:
+
+                deadline = self.queue[0][3] + self.timeout
+
+                while self.running and len(self.queue) < self.size:
+
+                    remaining = deadline - time.monotonic()
+
+                    if remaining <= 0:
+
+                        break
+
+                    self.cond.wait(remaining)
+
+                # Take the batch, leaving out requests the caller gave up on:
+
+                batch = [self.queue.popleft() for _ in range(min(self.size, len(self.queue)))]
+                batch = [req for req in batch if req[2].set_running_or_notify_cancel()]
+
+                # Leave out requests that ran past their deadline:
+
+                now = time.time() * 1000
+                expired = [req for req in batch if _expired(req[1], now)]
+
+                if expired:
+
+                    batch = [req for req in batch if not _expired(req[1], now)]
+
+                    self.expired += len(expired)
+
+                self.active = len(batch)
+
+            for req in expired:
+
+                req[2].set_exception(DeadlineExpiredError("Deadline passed before {} handled the request!".format(self.hand.name)))
+
+            if batch:
+
+                self._handle(batch)
+
+            with self.cond:
+
+                self.active = 0
+
+    def _handle(self, batch: list):
+        """
+        Handles the given batch and resolves each future.
+
+        :param batch: List of requests to handle
+        :type batch: list
+        """
+
+        try:
+
+            results = self.hand._meta_handle_batch([req[0] for req in batch], [req[1] for req in batch], converted=True)
+
+        except Exception as e:
+
+            results = [e] * len(batch)
+
+        self.batches += 1
+
+        for req, res in zip(batch, results):
+
+            if isinstance(res, Exception):
+
+                self.failed += 1
+
+                req[2].set_exception(res)
+
+            else:
+
+                self.completed += 1
+
+                self.hand._remember(req[4], res)
+
+                req[2].set_result(res)
+
+
+def _expired(meta: Optional[dict], now: float) -> bool:
+    """
+    Determines if the deadline of a request has passed.
+
+    :param meta: Metadata of the request
+    :type meta: dict
+    :param now: Current time in milliseconds since the epoch
+    :type now: float
+    :return: True if the deadline has passed
+    :rtype: bool
+    """
+
+    deadline = meta.get('deadline') if meta else None
+
+    return deadline is not None and deadline <= now
@@ -0,0 +1,274 @@
+"""
+This file contains components that protect the HandlerCollection
+from handlers that keep failing.
+
+The CircuitBreaker keeps track of the failures of a single handler.
+If a handler fails too many times in a window of time,
+then the breaker 'opens', and the handler is skipped
+until a cool-down has passed.
+After the cool-down, a single request is let through to test the handler,
+if it succeeds the breaker 'closes', otherwise it opens again.
+
+The ErrorThrottle limits how often the error handlers are ran
+for the same kind of failure, so a failing handler at a high
+frame rate does not flood the error handlers.
+"""
+
+from __future__ import annotations
+
+import time
+import threading
+
+from collections import deque
+from typing import Any, Optional
+
+
+class CircuitBreaker(object):
+    """
+    CircuitBreaker - Skips a handler after too many failures
+
+    The breaker can be in one of these states:
+
+    * CLOSED - Handler is working, all requests are let through
+    * OPEN - Handler failed too often, all requests are skipped
+    * HALF_OPEN - Cool-down has passed, a single request is let through to test the handler
+
+    We open once 'threshold' failures occur within 'window' seconds,
+    and stay open for 'cooldown' seconds.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, threshold: int=5, window: float=10.0, cooldown: float=30.0) -> None:
+
+        self.threshold = threshold  # Number of failures that opens the breaker
+        self.window = window  # Window in seconds failures are counted in
+        self.cooldown = cooldown  # Time in seconds we stay open
+
+        self.state = CircuitBreaker.CLOSED  # Current state
+        self.failures = deque()  # Times of recent failures
+        self.opened = 0  # Time we last opened
+        self.trial = False  # Value determining if a test request is in flight
+
+        self.trips = 0  # Number of times we opened
+        self.skipped = 0  # Number of requests skipped
+
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """
+        Determines if a request should be let through.
+
+        :return: True if the handler should be ran
+        :rtype: bool
+        """
+
+        if self.state is CircuitBreaker.CLOSED:
+
+            return True
+
+        with self.lock:
+
+            if self.state is CircuitBreaker.OPEN and time.monotonic() - self.opened >= self.cooldown:
+
+                # Cool-down passed, let a test request through:
+
+                self.state = CircuitBreaker.HALF_OPEN
+                self.trial = False
+
+            if self.state is CircuitBreaker.HALF_OPEN and not self.trial:
+
+                self.trial = True
+
+                return True
+
+            if self.state is CircuitBreaker.CLOSED:
+
+                return True
+
+            self.skipped += 1
+
+            return False
+
+    def success(self):
+        """
+        Records a successful request.
+        """
+
+        if self.state is CircuitBreaker.CLOSED and not self.failures:
+
+            return
+
+        with self.lock:
+
+            self.state = CircuitBreaker.CLOSED
+            self.trial = False
+
+            self.failures.clear()
+
+    def failure(self):
+        """
+        Records a failed request.
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+
+            self.failures.append(now)
+
+            # Forget failures outside of the window:
+
+            while self.failures and now - self.failures[0] > self.window:
+
+                self.failures.popleft()
+
+            if self.state is CircuitBreaker.HALF_OPEN or len(self.failures) >= self.threshold:
+
+                # Open the breaker:
+
+                if self.state is not CircuitBreaker.OPEN:
+
+                    self.trips += 1
+
+                self.state = CircuitBreaker.OPEN
+                self.opened = now
+                self.trial = False
+
+    def stats(self) -> dict:
+        """
+        Returns stats about this breaker.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        return {
+            'state': self.state,
+            'failures': len(self.failures),
+            'threshold': self.threshold,
+            'trips': self.trips,
+            'skipped': self.skipped,
+            'retry_in': max(0.0, self.cooldown - (time.monotonic() - self.opened)) if self.state is CircuitBreaker.OPEN else 0.0,
+        }
+
+
+class ErrorThrottle(object):
+    """
+    ErrorThrottle - Rate limits and samples error handling
+
+    Each kind of failure (a handler, exception type and operation)
+    is given a token bucket that refills at 'rate' tokens per second,
+    and can hold at most 'burst' tokens.
+    Each time the error handlers are ran, a token is used.
+    If no tokens are left, then the error is suppressed,
+    except for every 'sample'th suppressed error, which is let through.
+
+    The last response of the error handlers is remembered,
+    so suppressed errors can still send something back to the client.
+    """
+
+    def __init__(self, rate: float=1.0, burst: int=5, sample: int=100) -> None:
+
+        self.rate = rate  # Tokens added per second
+        self.burst = burst  # Maximum number of tokens
+        self.sample = sample  # Let every n-th suppressed error through, 0 to disable
+
+        self.buckets = {}  # Key to [tokens, last time, suppressed since last allowed, last response]
+
+        self.allowed = 0  # Number of errors let through
+        self.suppressed = 0  # Number of errors suppressed
+
+        self.lock = threading.Lock()
+
+    def acquire(self, key: Any) -> Optional[int]:
+        """
+        Determines if the error handlers should be ran for the given failure.
+
+        :param key: Kind of failure
+        :type key: Any
+        :return: Number of errors suppressed since the last one let through, None if this error is suppressed
+        :rtype: int
+        """
+
+        now = time.monotonic()
+
+        with self.lock:
+
+            bucket = self.buckets.get(key)
+
+            if bucket is None:
+
+                bucket = self.buckets[key] = [self.burst, now, 0, None]
+
+            # Refill the bucket:
+
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+            if bucket[0] >= 1 or (self.sample and bucket[2] + 1 >= self.sample):
+
+                # Let the error through:
+
+                bucket[0] = max(0, bucket[0] - 1)
+
+                suppressed = bucket[2]
+                bucket[2] = 0
+
+                self.allowed += 1
+
+                return suppressed
+
+            bucket[2] += 1
+
+            self.suppressed += 1
+
+            return None
+
+    def remember(self, key: Any, response: Any):
+        """
+        Remembers the response of the error handlers for the given failure.
+
+        :param key: Kind of failure
+        :type key: Any
+        :param response: Response of the error handlers
+        :type response: Any
+        """
+
+        with self.lock:
+
+            bucket = self.buckets.get(key)
+
+            if bucket is not None:
+
+                bucket[3] = response
+
+    def last(self, key: Any) -> Any:
+        """
+        Returns the last response of the error handlers for the given failure.
+
+        :param key: Kind of failure
+        :type key: Any
+        :return: Last response, None if there is none
+        :rtype: Any
+        """
+
+        bucket = self.buckets.get(key)
+
+        return None if bucket is None else bucket[3]
+
+    def stats(self) -> dict:
+        """
+        Returns stats about this throttle.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        return {
+            'allowed': self.allowed,
+            'suppressed': self.suppressed,
+            'kinds': len(self.buckets),
+        }
@@ -0,0 +1,201 @@
+"""
+This file contains components for memoizing the responses of handlers.
+
+Clients often send frames that are nearly identical,
+such as when a person is standing still in front of the camera.
+Handlers can opt into a ResultCache, which remembers their responses
+for a short time, keyed by a cheap perceptual hash of the converted data.
+If a similar frame is seen again, then the remembered response is sent back
+instead of running the handler again.
+"""
+
+import time
+import hashlib
+import threading
+
+from collections import OrderedDict
+from typing import Any, Optional
+
+try:
+
+    import numpy as np
+
+except ImportError:
+
+    # Perceptual hashing is not available:
+
+    np = None
+
+MISS = object()  # Value returned by the ResultCache when nothing is found
+
+
+def frame_hash(data: Any, size: Optional[int]=8) -> Optional[Any]:
+    """
+    Computes a cheap hash of the given data.
+
+    Image arrays are given an average hash:
+    we sample the image down to a 'size' by 'size' grid of grayscale blocks,
+    and record which blocks are brighter than the average.
+    Frames that look alike will have the same hash,
+    even if their pixels are not exactly the same.
+    If 'size' is None, then image arrays are given a digest of their exact content instead,
+    for handlers where frames that merely look alike MUST NOT share a response.
+
+    Strings and bytes are given a digest of their content,
+    and any other hashable data is used as is.
+
+    :param data: Data to hash
+    :type data: Any
+    :param size: Size of the grid used for image arrays, None to use the exact content
+    :type size: int
+    :return: Hash of the data, None if the data can not be hashed
+    :rtype: Any
+    """
+
+    if np is not None and isinstance(data, np.ndarray):
+
+        if size is None or data.ndim < 2 or data.shape[0] < size or data.shape[1] < size:
+
+            # Exact hash requested, or too small to sample, use the exact content:
+
+            return hashlib.blake2b(data.tobytes(), digest_size=16).digest()
+
+        # Sample the frame, so we only work with a few pixels:
+
+        height, width = data.shape[:2]
+        small = data[::max(1, height // (size * 4)), ::max(1, width // (size * 4))]
+
+        if small.ndim == 3:
+
+            small = small.mean(axis=2)
+
+        # Average each block in the grid:
+
+        height, width = small.shape[0] - small.shape[0] % size, small.shape[1] - small.shape[1] % size
+        blocks = small[:height, :width].reshape(size, height // size, size, width // size).mean(axis=(1, 3))
+
+        return data.shape, np.packbits(blocks > blocks.mean()).tobytes()
+
+    if isinstance(data, str):
+
+        data = data.encode()
+
+    if isinstance(data, (bytes, bytearray, memoryview)):
+
+        return hashlib.blake2b(data, digest_size=16).digest()
+
+    try:
+
+        hash(data)
+
+    except TypeError:
+
+        # Not hashable, can't be cached:
+
+        return None
+
+    return data
+
+
+class ResultCache(object):
+    """
+    ResultCache - Remembers responses for a short time
+
+    We store up to 'size' responses, evicting the least recently used
+    response once we are full.
+    Responses are forgotten 'ttl' seconds after they are stored.
+
+    We keep track of our hits, misses and evictions,
+    which can be retrieved using 'stats()'.
+    """
+
+    def __init__(self, size: int=256, ttl: float=1.0) -> None:
+
+        self.size = size  # Maximum number of responses to store
+        self.ttl = ttl  # Time in seconds responses are kept for
+
+        self.entries = OrderedDict()  # Key to (expire time, response)
+
+        self.hits = 0  # Number of lookups that found a response
+        self.misses = 0  # Number of lookups that found nothing
+        self.evictions = 0  # Number of responses evicted to make room
+
+        self.lock = threading.Lock()
+
+    def get(self, key: Any) -> Any:
+        """
+        Gets the response stored under the given key.
+
+        :param key: Key of the response
+        :type key: Any
+        :return: Response, MISS if nothing is stored or the response expired
+        :rtype: Any
+        """
+
+        with self.lock:
+
+            entry = self.entries.get(key)
+
+            if entry is None or entry[0] <= time.monotonic():
+
+                self.misses += 1
+
+                return MISS
+
+            # Mark the response as recently used:
+
+            self.entries.move_to_end(key)
+
+            self.hits += 1
+
+            return entry[1]
+
+    def put(self, key: Any, value: Any):
+        """
+        Stores the response under the given key.
+
+        :param key: Key of the response
+        :type key: Any
+        :param value: Response to store
+        :type value: Any
+        """
+
+        with self.lock:
+
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+
+            # Evict the least recently used responses:
+
+            while len(self.entries) > self.size:
+
+                self.entries.popitem(last=False)
+
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Forgets all stored responses.
+        """
+
+        with self.lock:
+
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        """
+        Returns stats about this cache.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        total = self.hits + self.misses
+
+        return {
+            'size': len(self.entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
@@ -13,14 +13,174 @@ directory and loads them.
 
 from __future__ import annotations
 
-import pkgutil
+import sys
+import time
+import asyncio
 import inspect
+import threading
+import contextvars
 
-from collections import defaultdict
-from typing import Any, Tuple, Optional
+from collections import deque
+from concurrent.futures import Executor, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 
-from meh.hand import BaseHandler
-from meh.errors import HandlerLoadError, HandlerStartError, HandlerStopError, HandlerUnloadError
+from types import MappingProxyType
+from typing import Any, Callable, Tuple, Optional, NamedTuple, Mapping
+
+from meh.hand import BaseHandler, AsyncHandler
+from meh.pools import HandlerPool, ExecutionPolicy
+from meh.shared import SharedFramePool
+from meh.batching import BatchScheduler
+from meh.dispatch import DispatchPolicy
+from meh.formatters import BaseFormatter, ConversionCache
+from meh.breaker import CircuitBreaker, ErrorThrottle
+from meh.cache import ResultCache
+from meh.resources import registry
+from meh.discovery import ManifestEntry, build_manifest, select_entries, import_source
+from meh.errors import HandlerLoadError, HandlerStartError, HandlerStopError, HandlerUnloadError, HandlerRejectedError, DeadlineExpiredError
+
+
+class FlightCounter(object):
+    """
+    FlightCounter - Counts the dispatches in flight
+
+    Each dispatch enters the counter of the routing table it uses,
+    and exits once it is done.
+    Anyone can then wait for all dispatches to finish.
+
+    Dispatches happen far more often than reloads,
+    so entering and exiting take no locks.
+    Each dispatch in flight holds an item in a deque,
+    which is appended and popped atomically,
+    and waiting simply polls the number of items until it reaches zero.
+
+    Each counter is chained to the counter of the table it replaced,
+    so waiting also waits for the dispatches still using older tables.
+    Counters in the chain with no dispatches in flight are dropped
+    when a new counter is created, so the chain does not grow forever.
+    """
+
+    def __init__(self, poll: float=0.001, prev: Optional[FlightCounter]=None) -> None:
+
+        self.flights = deque()  # One item for each dispatch in flight
+        self.poll = poll  # Time in seconds between checks while waiting
+        self.prev = prev  # Counter of the table we replaced, None if all older dispatches are done
+
+        self._trim()
+
+    @property
+    def count(self) -> int:
+        """
+        Number of dispatches in flight.
+
+        :return: Dispatches in flight
+        :rtype: int
+        """
+
+        return len(self.flights)
+
+    def enter(self):
+        """
+        Marks a dispatch as in flight.
+        """
+
+        self.flights.append(None)
+
+    def exit(self):
+        """
+        Marks a dispatch as done.
+        """
+
+        self.flights.pop()
+
+    def wait(self, timeout: Optional[float]=None) -> bool:
+        """
+        Waits until no dispatches are in flight,
+        on this table or any table it replaced.
+
+        :param timeout: Maximum time in seconds to wait, None to wait forever
+        :type timeout: float
+        :return: True if no dispatches are in flight, False if we timed out
+        :rtype: bool
+        """
+
+        end = None if timeout is None else time.monotonic() + timeout
+        counter = self
+
+        while counter is not None:
+
+            while counter.flights:
+
+                if end is not None and time.monotonic() >= end:
+
+                    return False
+
+                time.sleep(self.poll)
+
+            counter = counter.prev
+
+        return True
+
+    def _trim(self):
+        """
+        Drops the counters in our chain with no dispatches in flight.
+
+        Replaced tables never gain new dispatches,
+        so once a counter is empty it can be skipped for good.
+        """
+
+        counter = self
+
+        while counter.prev is not None:
+
+            if counter.prev.flights:
+
+                counter = counter.prev
+
+            else:
+
+                counter.prev = counter.prev.prev
+
+
+class RoutingTable(NamedTuple):
+    """
+    RoutingTable - Immutable, precompiled dispatch table
+
+    This table is built by the HandlerCollection each time
+    a handler is loaded, unloaded, started or stopped, and is never altered afterwards.
+    Each value is a tuple of handlers that should be called, in order,
+    for a given key, so the dispatch path only has to do a single
+    dictionary lookup and never has to allocate any new lists.
+
+    The tables are as follows:
+
+    * events - Event ID to handlers (global handlers are already attached)
+    * default - Handlers to use if the event ID is not registered
+    * errors - Exception type to handlers (default error handlers are already attached)
+    * default_error - Handlers to use if the exception type is not registered
+    * policies - Event ID to DispatchPolicy, events not present use the default behavior
+    * shared - Event IDs (None for the default handlers) whose handlers can share conversions
+    * direct - Looks up the meta handle methods of the handlers of an event ID, None if they must be guarded
+    * direct_default - Meta handle methods of the default handlers, None if they must be guarded
+
+    Handlers have nothing to guard if their event has no policy or shared conversions,
+    and none of them have a pool, timeout, circuit breaker or result cache.
+    Such handlers are called directly, so their methods are bound ahead of time.
+    The table is also rebuilt when a handler is started or stopped,
+    as this is when the pool, circuit breaker and result cache are created.
+
+    We also keep count of the dispatches using this table under 'flight',
+    so we know when a replaced table is no longer in use.
+    """
+
+    events: Mapping[Any, Tuple[BaseHandler, ...]]
+    default: Tuple[BaseHandler, ...]
+    errors: Mapping[Any, Tuple[BaseHandler, ...]]
+    default_error: Tuple[BaseHandler, ...]
+    policies: Mapping[Any, DispatchPolicy]
+    shared: frozenset
+    direct: Callable[[Any, Any], Optional[Tuple[Callable, ...]]]
+    direct_default: Optional[Tuple[Callable, ...]]
+    flight: FlightCounter
 
 
 class HandlerCollection(object):
@@ -58,23 +218,115 @@ class HandlerCollection(object):
     {
         'operation': String containing the handler operation,
         'data': Raw data from the socket, None if our operation is anything but 'handle',
-        'excp': Exception that was raised during runtime 
+        'excp': Exception that was raised during runtime,
+        'suppressed': Number of similar errors suppressed since the last one
     }
 
+    Each running handler is given a CircuitBreaker (unless disabled by the handler).
+    If the handler fails too often, then it is skipped for a cool-down period.
+    The state of each breaker can be retrieved using 'breaker_stats()'.
+
+    Error handlers are rate limited by our ErrorThrottle, stored under 'throttle'.
+    If the same handler keeps failing in the same way,
+    then most errors are suppressed, and the last response of the
+    error handlers is sent back instead.
+
     If an error handler is registered under id of 'BaseException',
     then this handler will be registered as a global error handler.
+
+    Handlers are stored in the 'hands' dictionary,
+    which is the source of truth for what is loaded.
+    Dispatching does not work with this dictionary directly,
+    instead we use the RoutingTable stored under 'routes',
+    which is rebuilt each time a handler is loaded or unloaded.
+    Do not alter the 'hands' dictionary yourself!
+    Use the load and unload methods, so the routing table stays in sync.
+
+    Data can be handled synchronously using 'handle()',
+    or asynchronously using 'handle_async()'.
+    When handling asynchronously, AsyncHandlers are awaited natively,
+    and all other handlers are ran in an executor,
+    so the event loop is never blocked.
+    The executor to use can be provided at creation time,
+    by default we use the default executor of the event loop.
+
+    Handlers that define an ExecutionPolicy are instead ran in a
+    dedicated HandlerPool (or SharedFramePool for SHARED policies),
+    which we create when the handler is started
+    and shutdown when the handler is stopped.
+    Handlers ran in worker processes (PROCESS and SHARED policies)
+    are only started in the workers, never in our process.
+    Handlers that define a batch size are given a BatchScheduler instead,
+    which collects requests from all callers and handles them in batches.
+    Stats for each pool can be retrieved using 'pool_stats()'.
+
+    By default, handlers are ran one after another,
+    and the last response that is not None is returned.
+    A DispatchPolicy can be set for an event ID using 'set_policy()',
+    which can run the handlers concurrently (fan-out),
+    and merge the responses in a different way.
+    The policy set for the ID 'None' is used for unregistered events.
+
+    Handler modules can be deferred using 'defer()' (see 'parse_directory()'),
+    in which case the module is only imported and it's handlers loaded
+    the first time an event for one of their IDs is received.
+
+    Handler modules can be reloaded while we are running using 'reload()'.
+    The new handlers are started next to the old ones,
+    and are swapped in once they are ready,
+    so no events are dropped while a module is reloaded.
+
+    Handlers are ran in order of their priority, highest first.
+    Handlers with the same priority are ran in the order they were bound,
+    with global handlers after the handlers bound to the event.
+    A policy can short-circuit, in which case we stop at the first
+    handler that returns a response, so cheap handlers with a high priority
+    (such as caches) can skip expensive handlers entirely.
+
+    Requests can carry a deadline in their metadata,
+    so stale work is dropped instead of answered:
+
+    {
+        'deadline': Time in milliseconds since the epoch the request expires at,
+        'timeout': Milliseconds from now the request expires in, used if no 'deadline' is provided
+    }
+
+    Handlers are skipped once the deadline has passed,
+    and are only waited on until the deadline (or their own 'timeout').
+    The metadata of the caller is never altered,
+    the deadline is added to a copy.
+    Handlers that run out of time respond with our 'late' response,
+    which is also sent back if every handler was skipped.
     """
 
     GLOBAL = "GLOBAL"
 
-    def __init__(self, hand_class: Any=BaseHandler) -> None:
+    def __init__(self, hand_class: Any=BaseHandler, executor: Optional[Executor]=None) -> None:
 
         self.hand_class = hand_class  # Class that all handlers MUST inherit!
-        self.hands = defaultdict(lambda: [])  # Dictionary of all handlers to use
+        self.executor = executor  # Executor to run synchronous handlers in when handling asynchronously
+        self.hands = {}  # Dictionary of all handlers to use
+        self.routes = None  # Precompiled routing table used for dispatching
+        self.policies = {}  # Dictionary of dispatch policies for each event
 
         self.num_loaded = 0  # Number of handlers open
         self.max_num_loaded = 0  # Maximum number of handlers loaded
         self.empty = {}  # Empty response
+        self.late = {'late': True}  # Response of handlers that ran out of time
+
+        self.expired = 0  # Number of handlers skipped as their deadline passed
+        self.timeouts = 0  # Number of handlers that ran out of time
+
+        self.throttle = ErrorThrottle()  # Throttle for the error handlers, None to disable
+
+        self.pending = {}  # Dictionary of events to the modules that must be imported before they are handled
+        self.manifest = {}  # Dictionary of deferred modules to their manifest entries
+        self.running = False  # Value determining if we are started, handlers loaded later are started right away
+        self._load_lock = threading.RLock()  # Lock held while modules are loaded or reloaded
+
+        self._fanout_executor = None  # Executor used for fan-out when none is provided
+
+        self._build_routes()
 
     def reset(self):
         """
@@ -87,13 +339,20 @@ class HandlerCollection(object):
         then these handler instances may be irreversibly deleted!
         """
 
-        # Clear the handlers:
+        with self._load_lock:
 
-        self.hand_class.clear()
+            # Clear the handlers, error handlers included:
 
-        # Clear the error handlers:
+            self.hands.clear()
 
-        self.errors.reset()
+            # Forget any deferred modules:
+
+            self.pending.clear()
+            self.manifest.clear()
+
+            # Rebuild the (now empty) routing table:
+
+            self._build_routes()
 
     def load_handler(self, hand: BaseHandler, ids: Optional[Tuple[str,...]]=None, extract: Optional[bool]=True) -> BaseHandler:
         """
@@ -136,7 +395,7 @@ class HandlerCollection(object):
 
             # Invalid handler!
 
-            raise TypeError("Invalid handler! MUST inherit {}!".format(self.module_type))
+            raise TypeError("Invalid handler! MUST inherit {}!".format(self.hand_class))
 
         if ids is None:
 
@@ -244,11 +503,31 @@ class HandlerCollection(object):
         :raise: ModuleStopException: If the module stop() method fails
         """
 
-        # Call the stop method:
+        # Shutdown the pool, waiting for requests in flight:
+
+        if hand.pool is not None:
+
+            hand.pool.shutdown()
+
+            hand.pool = None
+
+        # Forget any cached responses:
+
+        hand.results = None
+
+        # Recompile the routing table, as we no longer have a pool or cache:
+
+        with self._load_lock:
+
+            self._build_routes()
+
+        # Call the stop method, unless the handler was only started in it's workers:
 
         try:
 
-            hand.stop()
+            if not _in_workers(hand):
+
+                hand.stop()
 
         except Exception as e:
 
@@ -283,11 +562,23 @@ class HandlerCollection(object):
         :rtype: BaseHandler
         """
 
-        # Call the start method:
+        # Call the start method, unless the handler is only started in it's workers:
 
         try:
 
-            hand.start()
+            if not _in_workers(hand):
+
+                hand.start()
+
+            # Create the pool, breaker and cache:
+
+            self._create_components(hand)
+
+            # Recompile the routing table, so we are guarded from now on:
+
+            with self._load_lock:
+
+                self._build_routes()
 
         except Exception as e:
 
@@ -340,8 +631,13 @@ class HandlerCollection(object):
     def start_all(self):
         """
         Starts all loaded event handlers.
+
+        Handlers loaded from deferred modules later on
+        are started as soon as they are loaded.
         """
 
+        self.running = True
+
         # Iterate over all handlers:
 
         for _, hand in self.iter_handlers():
@@ -359,6 +655,8 @@ class HandlerCollection(object):
         Stops all loaded event handlers.
         """
 
+        self.running = False
+
         # Iterate over all handlers:
 
         for _, hand in self.iter_handlers():
@@ -371,288 +669,1892 @@ class HandlerCollection(object):
 
                 self.stop_handler(hand)
 
-    def iter_handlers(self):
+    def set_policy(self, id: Any, policy: Optional[DispatchPolicy]) -> None:
         """
-        Iterates over each handler,
-        and returns each once when encountered.
+        Sets the dispatch policy for the given event ID.
 
-        We return the ID we are under,
-        and the handler instance, respectively.
+        If the policy is None, then the policy is removed,
+        and the default behavior is used for the event.
 
-        This method is best used in a for loop.
+        :param id: ID of the event
+        :type id: Any
+        :param policy: Policy to use for the event
+        :type policy: DispatchPolicy
         """
 
-        # Iterate over each handler list:
+        with self._load_lock:
 
-        for key in self.hands.keys():
+            if policy is None:
 
-            # Iterate over each handler:
+                self.policies.pop(id, None)
 
-            for hand in self.hands[key]:
+            else:
 
-                # Yield each handler:
+                self.policies[id] = policy
 
-                yield key, hand
+            # Recompile the routing table:
 
-    def handle(self, id: str, data: Any, meta: dict) -> Any:
+            self._build_routes()
+
+    def pool_stats(self) -> dict:
         """
-        Sends the given data though the event handlers.
+        Returns stats for each handler running in a pool.
 
-        The returned content is sent back to the client.
+        The stats are stored under the name of the handler,
+        see HandlerPool.stats() for the content of each.
 
-        If any errors are encountered,
-        then they are sent through the error handlers,
-        which have the option to change the state of the handler,
-        HandlerCollection, or return data to be returned to the client.
+        :return: Dictionary of pool stats
+        :rtype: dict
+        """
 
-        :param id: ID of the event
-        :type id: str
-        :param data: Data to be processed
-        :type data: Any
-        :param meta: Metadata for the given request
-        :type meta: dict
-        :return: Data to be sent back to the client
-        :rtype: Any
+        final = {}
+
+        for _, hand in self.iter_handlers():
+
+            if hand.pool is not None:
+
+                final[hand.name or type(hand).__name__] = hand.pool.stats()
+
+        return final
+
+    def defer(self, entries: Tuple[ManifestEntry, ...]) -> int:
+        """
+        Defers loading the handlers in the given manifest entries.
+
+        The module of each entry is imported, and the handlers defined in it loaded,
+        the first time an event for one of the IDs in the module is handled.
+        Only plain event IDs can be deferred,
+        so modules with handlers bound to default, global,
+        or error IDs (or unknown IDs) should be loaded right away.
+
+        :param entries: Entries of the handlers to defer
+        :type entries: tuple
+        :return: Number of handlers deferred
+        :rtype: int
         """
 
-        # Get all handlers associated with the id:
+        with self._load_lock:
 
-        hands = self.hands[id]
+            for entry in entries:
 
-        if not hands:
+                self.manifest.setdefault(entry.module, []).append(entry)
 
-            # No registered handlers, use default ones:
+                for id in entry.ids:
 
-            hands = hands + self.hands[None]
+                    self.pending.setdefault(id, set()).add(entry.module)
 
-        else:
+        return len(entries)
 
-            # Also attach global handlers:
+    def load_deferred(self, id: Any=None) -> int:
+        """
+        Imports the deferred modules for the given event,
+        and loads the handlers defined in them.
+
+        If no event is given, then all deferred modules are loaded.
+        If we are running, then each handler is started once it is loaded.
+        This method is called automatically when an event is handled,
+        so most users will not have to call this.
+
+        :param id: Event to load the handlers for, None for all events
+        :type id: Any
+        :return: Number of handlers loaded
+        :rtype: int
+        """
 
-            hands = hands + self.hands[HandlerCollection.GLOBAL]
+        with self._load_lock:
 
-        # Run though each handler and process them:
+            if id is None:
 
-        final_data = {}
-        temp = None
+                modules = set(self.manifest)
 
-        for hand in hands:
+            else:
 
-            try:
+                modules = self.pending.pop(id, set())
 
-                temp = hand._meta_handle(data, meta)
+            index = 0
 
-            except Exception as e:
+            for name in modules:
 
-                # Handle the exception:
+                entries = self.manifest.pop(name, ())
 
-                temp = self.error_handle(e, hand, data, 'handle', e, meta)
+                if not entries:
 
-            finally:
+                    continue
 
-                if temp is not None:
+                # No longer wait on this module:
 
-                    # Add the data:
+                for key in [key for key, mods in self.pending.items() if name in mods]:
 
-                    final_data = temp
+                    self.pending[key].discard(name)
 
-        # Check if the data is nothing:
+                    if not self.pending[key]:
 
-        if final_data is None:
+                        del self.pending[key]
 
-            # Return generic empty response
+                try:
 
-            return self.empty
+                    module = import_source(name, entries[0].path)
 
-        # Otherwise return data:
+                except Exception as e:
 
-        return final_data
+                    # Import failed, handle the exception:
 
-    def error_handle(self, id: Exception, hand: BaseHandler, data: Any, oper: str, exc: Exception, meta: dict):
-        """
-        Handles the given exception.
+                    self.error_handle(HandlerLoadError, None, None, 'load', e)
 
-        We are a bit different from conventional event handlers,
-        in the sense that we search for class types.
+                    continue
 
-        Default handlers are pulled from the handlers
-        under the key 'BaseException'.
+                for hand in load_module(module, self, self.hand_class, [entry.name for entry in entries]):
 
-        :param id: Key exception to search under
-        :type id: Exception
-        :param hand: Handler to process
-        :type hand: BaseHandler
-        :param data: Data to be processed
-        :type data: Any
-        :param oper: Operation that was undergone
-        :type oper: str
-        :param exc: Exception to analyze
-        :type exc: Exception
-        :return: Data to send back to the client
-        :rtype: Any
+                    if self.running and not hand.running:
+
+                        self.start_handler(hand)
+
+                    index += 1
+
+        return index
+
+    def reload(self, name: str, timeout: Optional[float]=30.0) -> list:
+        """
+        Reloads the handlers defined in the given module.
+
+        We import the module again, and create, load and start (if we are running)
+        a new instance of each handler from the module that is loaded.
+        Registry resources listed in the 'resources' of the old handlers are refreshed first,
+        so the new handlers load their own copy, and the old copy is freed once the old handlers stop.
+        Once all new handlers are ready, we swap them into the routing table at once.
+        Each new handler is bound to the events the old handler was bound to,
+        with any changes to the 'ids' of the handler applied.
+        We then wait for the dispatches using the old routing table
+        (or any table before it) to finish, and stop and unload the old handlers.
+
+        If the module fails to import, or a new handler fails to load or start,
+        then the error is passed to the error handlers,
+        the new handlers that were loaded are stopped and unloaded,
+        and the old handlers are kept.
+
+        Keep in mind, if we are called from within a handler,
+        then we will wait on our own dispatch until we time out!
+
+        :param name: Name of the module to reload
+        :type name: str
+        :param timeout: Maximum time in seconds to wait for the old handlers to finish
+        :type timeout: float
+        :return: List of new handlers
+        :rtype: list
         """
 
-        # Get all handlers affiliated with the exception
+        with self._load_lock:
 
-        hands = self.hands[type(id)]
+            # Find the handlers defined in the module:
 
-        # Add default exception handlers:
+            old = []
 
-        hands = hands + self.hands[BaseException]
+            for _, hand in self.iter_handlers():
 
-        # Iterate over all exception handlers:
+                if type(hand).__module__ == name and hand not in old:
 
-        final_data = {}
+                    old.append(hand)
 
-        for hand in hands:
+            module = sys.modules.get(name)
 
-            # Run the error handlers:
+            if not old or module is None:
 
-            temp = hand._meta_handle({
-                'operation': oper,
-                'data': data,
-                'excp': exc
-            }, meta)
+                # Nothing loaded from this module:
 
-            # Check if data is to be added:
+                return []
 
-            if temp:
+            # Import the module again:
 
-                # Add data:
+            try:
 
-                final_data = temp
+                module = import_source(name, module.__file__, fresh=True)
 
-        return final_data
+            except Exception as e:
 
-    def _load_handler(self, hand, ids):
-        """
-        Adds the handler to our collection. 
+                self.error_handle(HandlerLoadError, None, None, 'load', e)
 
-        This low-level method is not intended to
-        be worked with by end users!
+                return []
 
-        :param mod: Module to add
-        :type mod: BaseModule
-        :param ids: List of events to bind the handler to
-        :type ids: list
-        :param extract: Boolean determining if we should extract IDs from the handler
-        :type extract: bool
-        """
+            # Refresh the resources of the old handlers, so the new ones load them again:
 
-        # Check if we received any IDs:
+            for res in {res for hand in old for res in hand.resources}:
 
-        if not ids:
+                registry.refresh(res)
 
-            # No ids listed! Do not load...
+            # Create the new handlers, and warm them up:
 
-            return 
+            new = []
 
-        # Iterate over each ID:
+            for hand in old:
 
-        for id in ids:
+                try:
 
-            # Get the content:
+                    plug = getattr(module, type(hand).__name__)()
 
-            temp = self.hands[id]
+                    if not isinstance(plug, self.hand_class):
 
-            # Add the handler:
+                        raise TypeError("Invalid handler! MUST inherit {}!".format(self.hand_class))
 
-            temp.append(hand)
+                    plug.collection = self
 
-            # Finally, set the handler:
+                    plug.load()
 
-            self.hands[id] = temp
+                    # Loaded, so it is unloaded if anything fails from here on:
 
-        # Update our stats:
+                    new.append(plug)
 
-        self.max_num_loaded += 1
-        self.num_loaded += 1
+                    if self.running:
 
-        # Attach the collection to the module:
+                        if not _in_workers(plug):
 
-        hand.collection = self
+                            plug.start()
 
-    def _unload_handler(self, hand):
-        """
-        Low-level method for unloading handlers from the collection.
+                        plug.running = True
 
-        We do not call any methods or work with the handler in any way
-        other than removing it from the data structure.
-        We will iterate over ALL handlers and remove the 
-        given handler from all events.
+                        self._create_components(plug)
 
-        We are not meant to be called directly!
-        This method should only be called by high-level
-        methods of HandlerCollection.
+                except Exception as e:
 
-        :param mod: The handler in question to remove
-        :type mod: BaseHandler
-        """
+                    # Failed to warm up, keep the old handlers:
 
-        # Iterate over all modules:
+                    for plug in new:
 
-        for key, check in self.iter_handlers():
+                        self._retire(plug)
 
-            # Check if we found a match:
+                    self.error_handle(HandlerLoadError, hand, None, 'load', e)
 
-            if hand == check:
+                    return []
 
-                # Unload the handler:
+            # Bind the new handlers in place of the old ones:
 
-                self.hands[key].remove(check)
+            for hand, plug in zip(old, new):
 
-        # Update our stats:
+                for key, hands in self.hands.items():
 
-        self.num_loaded -= 1
+                    if hand not in hands:
 
-        # Remove ourselves from the module:
+                        continue
 
-        hand.collection = None
+                    if key in plug.ids or key not in hand.ids:
 
+                        hands[hands.index(hand)] = plug
 
-def parse_directory(path: str, final: HandlerCollection, hand_class: Any=BaseHandler) -> int:
-    """
-    Parses extensions from specified location.
+                    else:
 
-    We make sure that all objects loaded inherit
-    the class specified in the 'hand_class' argument.
+                        hands.remove(hand)
 
-    We also load the handlers into the given HandlerCollection.
+                for key in plug.ids:
 
-    :param path: Path to directory location
-    :type path: str
-    :param final: HandlerCollection to add handler to
-    :type final: HandlerCollection
-    :return: Number of handlers loaded
-    :rtype: int
-    """
+                    if plug not in self.hands.setdefault(key, []):
 
-    # Iterating over every file in specified directory
+                        self.hands[key].append(plug)
 
-    index = 0
+            for key in [key for key, hands in self.hands.items() if not hands]:
 
-    for finder, name, _ in pkgutil.iter_modules(path=[path]):
+                del self.hands[key]
 
-        # Loading module for inspection
+            # Swap the routing table:
+
+            table = self.routes
+
+            self._build_routes()
 
-        module = finder.find_module(name).load_module(name)
+        # Wait for the old handlers to finish, and retire them:
 
-        for member in dir(module):
+        table.flight.wait(timeout)
 
-            # Iterating over builtin attributes
+        for hand in old:
 
-            obj = getattr(module, member)
+            self._retire(hand)
 
-            # Checking if extension is class
+        return new
 
-            if inspect.isclass(obj) and issubclass(obj, hand_class):
+    def _acquire_routes(self) -> RoutingTable:
+        """
+        Gets the current routing table, and marks a dispatch as in flight on it.
+
+        If the table is swapped while we mark ourselves,
+        then we try again with the new table,
+        so 'reload()' never misses a dispatch using an old table.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :return: Routing table to use
+        :rtype: RoutingTable
+        """
 
-                # Create and load the handler:
+        while True:
 
-                plug = obj()
+            table = self.routes
 
-                final.load_handler(plug)
+            table.flight.enter()
 
-                index += 1
+            if table is self.routes:
 
-    return index
+                return table
+
+            table.flight.exit()
+
+    def _create_components(self, hand: BaseHandler):
+        """
+        Creates the pool, circuit breaker, and result cache of the given handler.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hand: Handler to create components for
+        :type hand: BaseHandler
+        """
+
+        # Create the pool if we have a policy or batch size,
+        # shared pools batch in their workers:
+
+        if hand.policy is not None and hand.policy.kind == ExecutionPolicy.SHARED:
+
+            hand.pool = SharedFramePool(hand, hand.policy)
+
+        elif hand.batch_size:
+
+            hand.pool = BatchScheduler(hand, hand.batch_size, hand.batch_timeout, hand.policy.max_in_flight if hand.policy is not None else None)
+
+        elif hand.policy is not None:
+
+            hand.pool = HandlerPool(hand, hand.policy)
+
+        # Create the circuit breaker:
+
+        if hand.breaker_threshold:
+
+            hand.breaker = CircuitBreaker(hand.breaker_threshold, hand.breaker_window, hand.breaker_cooldown)
+
+        # Create the result cache:
+
+        if hand.cache_size:
+
+            hand.results = ResultCache(hand.cache_size, hand.cache_ttl)
+
+    def _retire(self, hand: BaseHandler):
+        """
+        Stops and unloads a handler that is no longer bound to any events.
+
+        We wait for any requests in the pool of the handler to finish.
+        Errors are passed to the error handlers.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hand: Handler to retire
+        :type hand: BaseHandler
+        """
+
+        if hand.pool is not None:
+
+            hand.pool.shutdown()
+
+            hand.pool = None
+
+        hand.results = None
+
+        try:
+
+            if hand.running:
+
+                hand.running = False
+
+                if not _in_workers(hand):
+
+                    hand.stop()
+
+            hand.unload()
+
+        except Exception as e:
+
+            self.error_handle(HandlerUnloadError, hand, None, 'unload', e)
+
+        hand.collection = None
+
+    def breaker_stats(self) -> dict:
+        """
+        Returns the circuit breaker state for each running handler.
+
+        The stats are stored under the name of the handler,
+        see CircuitBreaker.stats() for the content of each.
+
+        :return: Dictionary of breaker stats
+        :rtype: dict
+        """
+
+        final = {}
+
+        for _, hand in self.iter_handlers():
+
+            if hand.breaker is not None:
+
+                final[hand.name or type(hand).__name__] = hand.breaker.stats()
+
+        return final
+
+    def cache_stats(self) -> dict:
+        """
+        Returns the result cache stats for each running handler that caches.
+
+        The stats are stored under the name of the handler,
+        see ResultCache.stats() for the content of each.
+
+        :return: Dictionary of cache stats
+        :rtype: dict
+        """
+
+        final = {}
+
+        for _, hand in self.iter_handlers():
+
+            if hand.results is not None:
+
+                final[hand.name or type(hand).__name__] = hand.results.stats()
+
+        return final
+
+    def iter_handlers(self):
+        """
+        Iterates over each handler,
+        and returns each once when encountered.
+
+        We return the ID we are under,
+        and the handler instance, respectively.
+
+        This method is best used in a for loop.
+        """
+
+        # Iterate over each handler list:
+
+        for key, hands in list(self.hands.items()):
+
+            # Iterate over each handler:
+
+            for hand in tuple(hands):
+
+                # Yield each handler:
+
+                yield key, hand
+
+    def handle(self, id: str, data: Any, meta: dict) -> Any:
+        """
+        Sends the given data though the event handlers.
+
+        The returned content is sent back to the client.
+
+        Handlers with nothing to guard (see 'RoutingTable')
+        are called directly when the request has no deadline,
+        and the routing is done inline,
+        as the overhead of each call adds up on every frame.
+
+        If any errors are encountered,
+        then they are sent through the error handlers,
+        which have the option to change the state of the handler,
+        HandlerCollection, or return data to be returned to the client.
+
+        :param id: ID of the event
+        :type id: str
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Data to be sent back to the client
+        :rtype: Any
+        """
+
+        # Import any deferred modules for this id:
+
+        if self.pending and id in self.pending:
+
+            self.load_deferred(id)
+
+        # Get the routing table, and mark ourselves as in flight on it,
+        # we work with the deque of the counter directly, as this is done for every frame:
+
+        table = self.routes
+        flights = table.flight.flights
+
+        flights.append(None)
+
+        if table is not self.routes:
+
+            # Swapped while we marked ourselves, try again:
+
+            flights.pop()
+
+            table = self._acquire_routes()
+            flights = table.flight.flights
+
+        try:
+
+            # Get the handlers associated with the id, if they have nothing to guard,
+            # global and default handlers are already attached in the routing table:
+
+            calls = table.direct(id, table.direct_default)
+            timed = meta and ('timeout' in meta or 'deadline' in meta)
+
+            if calls is not None and not timed:
+
+                # Nothing to guard, run each handler directly:
+
+                final_data = None
+
+                for call in calls:
+
+                    try:
+
+                        temp = call(data, meta)
+
+                    except Exception as e:
+
+                        temp = self.error_handle(e, call.__self__, data, 'handle', e, meta)
+
+                    if temp is not None:
+
+                        final_data = temp
+
+                return self.empty if final_data is None else final_data
+
+            # Otherwise, get all handlers associated with the id:
+
+            hands = table.events.get(id)
+            key = id
+
+            if hands is None:
+
+                # No registered handlers, use default ones:
+
+                hands = table.default
+                key = None
+
+            # Determine the deadline of the request, without altering the metadata of the caller:
+
+            if timed and 'deadline' not in meta:
+
+                meta = dict(meta, deadline=time.time() * 1000 + meta['timeout'])
+
+            # Share conversions between the handlers, if they can:
+
+            cache = ConversionCache() if key in table.shared else None
+
+            # Use the dispatch policy, if we have one:
+
+            policy = table.policies.get(key) if table.policies else None
+
+            if policy is not None:
+
+                return self._dispatch(hands, data, meta, policy, cache)
+
+            # Run though each handler and process them:
+
+            final_data = None
+
+            for hand in hands:
+
+                if timed or hand.breaker is not None or hand.pool is not None or hand.timeout is not None:
+
+                    temp = self._meta_handle_guarded(hand, data, meta, cache)
+
+                else:
+
+                    # Nothing to guard, run the handler directly:
+
+                    try:
+
+                        temp = hand._meta_handle(data, meta, cache)
+
+                    except Exception as e:
+
+                        temp = self.error_handle(e, hand, data, 'handle', e, meta)
+
+                if temp is not None:
+
+                    # Add the data:
+
+                    final_data = temp
+
+            # Check if the data is nothing:
+
+            if final_data is None:
+
+                # Return generic empty response, or late response if we ran out of time:
+
+                return self.late if timed and self._expired(meta) else self.empty
+
+            # Otherwise return data:
+
+            return final_data
+
+        finally:
+
+            flights.pop()
+
+    async def handle_async(self, id: str, data: Any, meta: dict) -> Any:
+        """
+        Sends the given data though the event handlers asynchronously.
+
+        We are identical to 'handle()', except that we can be awaited.
+        AsyncHandlers are awaited on the running event loop,
+        while synchronous handlers are ran in our executor.
+        Handlers are still ran one after another, in order.
+
+        :param id: ID of the event
+        :type id: str
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Data to be sent back to the client
+        :rtype: Any
+        """
+
+        # Import any deferred modules for this id, without blocking the event loop:
+
+        if self.pending and id in self.pending:
+
+            await asyncio.get_running_loop().run_in_executor(self.executor, self.load_deferred, id)
+
+        # Get the routing table, and mark ourselves as in flight on it:
+
+        table = self._acquire_routes()
+
+        try:
+
+            return await self._route_async(table, id, data, meta)
+
+        finally:
+
+            table.flight.exit()
+
+    async def _route_async(self, table: RoutingTable, id: str, data: Any, meta: dict) -> Any:
+        """
+        Sends the given data though the event handlers in the given routing table asynchronously.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param table: Routing table to use
+        :type table: RoutingTable
+        :param id: ID of the event
+        :type id: str
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Data to be sent back to the client
+        :rtype: Any
+        """
+
+        # Get all handlers associated with the id:
+
+        hands = table.events.get(id)
+        key = id
+
+        if hands is None:
+
+            # No registered handlers, use default ones:
+
+            hands = table.default
+            key = None
+
+        # Determine the deadline of the request, without altering the metadata of the caller:
+
+        if meta and 'timeout' in meta and 'deadline' not in meta:
+
+            meta = dict(meta, deadline=time.time() * 1000 + meta['timeout'])
+
+        # Share conversions between the handlers, if they can:
+
+        cache = ConversionCache() if key in table.shared else None
+
+        # Use the dispatch policy, if we have one:
+
+        policy = table.policies.get(key)
+
+        if policy is not None:
+
+            return await self._dispatch_async(hands, data, meta, policy, cache)
+
+        # Run though each handler and process them:
+
+        final_data = None
+
+        for hand in hands:
+
+            temp = await self._meta_handle_async_guarded(hand, data, meta, cache)
+
+            if temp is not None:
+
+                # Add the data:
+
+                final_data = temp
+
+        # Check if the data is nothing:
+
+        if final_data is None:
+
+            # Return generic empty response, or late response if we ran out of time:
+
+            return self.late if self._expired(meta) else self.empty
+
+        # Otherwise return data:
+
+        return final_data
+
+    def error_handle(self, id: Exception, hand: BaseHandler, data: Any, oper: str, exc: Exception, meta: Optional[dict]=None):
+        """
+        Handles the given exception.
+
+        We are a bit different from conventional event handlers,
+        in the sense that we search for class types.
+
+        Default handlers are pulled from the handlers
+        under the key 'BaseException'.
+
+        :param id: Key exception to search under
+        :type id: Exception
+        :param hand: Handler to process
+        :type hand: BaseHandler
+        :param data: Data to be processed
+        :type data: Any
+        :param oper: Operation that was undergone
+        :type oper: str
+        :param exc: Exception to analyze
+        :type exc: Exception
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Data to send back to the client
+        :rtype: Any
+        """
+
+        # Get all handlers affiliated with the exception,
+        # we accept both exception classes and instances:
+
+        key = id if isinstance(id, type) else type(id)
+
+        # Record the failure, and check if it is throttled:
+
+        suppressed = self._record_failure(hand, key, oper, exc)
+
+        if suppressed is None:
+
+            # Error is throttled, send the last response:
+
+            return self.throttle.last((hand, key, oper))
+
+        # Default exception handlers are already attached:
+
+        table = self.routes
+        hands = table.errors.get(key)
+
+        if hands is None:
+
+            hands = table.default_error
+
+        # Iterate over all exception handlers:
+
+        final_data = {}
+
+        for err in hands:
+
+            # Run the error handlers:
+
+            temp = err._meta_handle({
+                'operation': oper,
+                'data': data,
+                'excp': exc,
+                'suppressed': suppressed,
+            }, meta)
+
+            # Check if data is to be added:
+
+            if temp:
+
+                # Add data:
+
+                final_data = temp
+
+        if self.throttle is not None:
+
+            self.throttle.remember((hand, key, oper), final_data)
+
+        return final_data
+
+    async def error_handle_async(self, id: Exception, hand: BaseHandler, data: Any, oper: str, exc: Exception, meta: Optional[dict]=None):
+        """
+        Handles the given exception asynchronously.
+
+        We are identical to 'error_handle()', except that we can be awaited,
+        and error handlers are ran in the same way as 'handle_async()' runs handlers.
+
+        :param id: Key exception to search under
+        :type id: Exception
+        :param hand: Handler to process
+        :type hand: BaseHandler
+        :param data: Data to be processed
+        :type data: Any
+        :param oper: Operation that was undergone
+        :type oper: str
+        :param exc: Exception to analyze
+        :type exc: Exception
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Data to send back to the client
+        :rtype: Any
+        """
+
+        # Get all handlers affiliated with the exception:
+
+        key = id if isinstance(id, type) else type(id)
+
+        suppressed = self._record_failure(hand, key, oper, exc)
+
+        if suppressed is None:
+
+            # Error is throttled, send the last response:
+
+            return self.throttle.last((hand, key, oper))
+
+        table = self.routes
+        hands = table.errors.get(key)
+
+        if hands is None:
+
+            hands = table.default_error
+
+        # Iterate over all exception handlers:
+
+        final_data = {}
+
+        for err in hands:
+
+            # Run the error handlers:
+
+            temp = await self._meta_handle_async(err, {
+                'operation': oper,
+                'data': data,
+                'excp': exc,
+                'suppressed': suppressed,
+            }, meta)
+
+            # Check if data is to be added:
+
+            if temp:
+
+                # Add data:
+
+                final_data = temp
+
+        if self.throttle is not None:
+
+            self.throttle.remember((hand, key, oper), final_data)
+
+        return final_data
+
+    def _dispatch(self, hands: Tuple[BaseHandler, ...], data: Any, meta: dict, policy: DispatchPolicy, cache: Optional[ConversionCache]=None) -> Any:
+        """
+        Sends the given data through the handlers according to a dispatch policy.
+
+        We split the handlers into steps, see 'DispatchPolicy.steps()',
+        and run each step one after another.
+        If the policy short-circuits, we stop after the first step
+        that returns a response.
+        Finally, we merge the responses.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hands: Handlers to run
+        :type hands: tuple
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param policy: Policy to follow
+        :type policy: DispatchPolicy
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data to be sent back to the client
+        :rtype: Any
+        """
+
+        results = []
+
+        for step in policy.steps(hands):
+
+            if len(step) == 1:
+
+                # Run the handler ourselves:
+
+                temp = self._meta_handle_guarded(step[0], data, meta, cache)
+
+                if temp is not None:
+
+                    results.append(temp)
+
+            else:
+
+                self._fanout(step, data, meta, results, cache)
+
+            if policy.short_circuit and results:
+
+                # We have an answer, skip the rest:
+
+                break
+
+        # Merge the responses:
+
+        final_data = policy.merge(results)
+
+        if final_data is None:
+
+            return self.late if self._expired(meta) else self.empty
+
+        return final_data
+
+    def _fanout(self, hands: Tuple[BaseHandler, ...], data: Any, meta: dict, results: list, cache: Optional[ConversionCache]=None) -> None:
+        """
+        Runs the given handlers concurrently.
+
+        All handlers but the last are submitted to their pool or our executor,
+        and the last handler is ran in the calling thread.
+        We then wait for each response, and add them to the results in order.
+        We only wait on each handler until it runs out of time.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hands: Handlers to run
+        :type hands: tuple
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param results: List to add the responses to
+        :type results: list
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        """
+
+        # Submit all handlers but the last:
+
+        futs = []
+
+        for hand in hands[:-1]:
+
+            wait = self._time_left(hand, meta)
+
+            if wait is not None and wait <= 0:
+
+                # Deadline passed, skip this handler:
+
+                self.expired += 1
+
+                futs.append(None)
+
+                continue
+
+            if hand.breaker is not None and not hand.breaker.allow():
+
+                # Breaker is open, skip this handler:
+
+                futs.append(None)
+
+                continue
+
+            try:
+
+                if hand.pool is None:
+
+                    fut = self._get_fanout_executor().submit(contextvars.copy_context().run, hand._meta_handle, data, meta, cache)
+
+                else:
+
+                    fut = hand.pool.submit(data, meta, cache)
+
+            except Exception as e:
+
+                fut = e
+
+            futs.append(fut)
+
+        # Run the last handler ourselves:
+
+        last = self._meta_handle_guarded(hands[-1], data, meta, cache)
+
+        # Collect the responses in order:
+
+        for hand, fut in zip(hands, futs):
+
+            if fut is None:
+
+                continue
+
+            try:
+
+                if isinstance(fut, Exception):
+
+                    raise fut
+
+                wait = self._time_left(hand, meta)
+
+                temp = fut.result(None if wait is None else max(wait, 0))
+
+            except FutureTimeoutError as e:
+
+                # Submitting, or the handler itself, may have raised the timeout:
+
+                temp = self.error_handle(e, hand, data, 'handle', e, meta) if isinstance(fut, Exception) or fut.done() else self._timed_out(hand, fut, meta)
+
+            except DeadlineExpiredError:
+
+                temp = self._timed_out(hand, meta=meta)
+
+            except Exception as e:
+
+                temp = self.error_handle(e, hand, data, 'handle', e, meta)
+
+            else:
+
+                if hand.breaker is not None:
+
+                    hand.breaker.success()
+
+            if temp is not None:
+
+                results.append(temp)
+
+        if last is not None:
+
+            results.append(last)
+
+    async def _dispatch_async(self, hands: Tuple[BaseHandler, ...], data: Any, meta: dict, policy: DispatchPolicy, cache: Optional[ConversionCache]=None) -> Any:
+        """
+        Sends the given data through the handlers according to a dispatch policy, asynchronously.
+
+        We are identical to '_dispatch()',
+        except that the handlers in each step are gathered concurrently.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hands: Handlers to run
+        :type hands: tuple
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param policy: Policy to follow
+        :type policy: DispatchPolicy
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data to be sent back to the client
+        :rtype: Any
+        """
+
+        results = []
+
+        for step in policy.steps(hands):
+
+            if len(step) == 1:
+
+                temps = (await self._meta_handle_async_guarded(step[0], data, meta, cache),)
+
+            else:
+
+                temps = await asyncio.gather(*(self._meta_handle_async_guarded(hand, data, meta, cache) for hand in step))
+
+            results.extend(temp for temp in temps if temp is not None)
+
+            if policy.short_circuit and results:
+
+                # We have an answer, skip the rest:
+
+                break
+
+        # Merge the responses:
+
+        final_data = policy.merge(results)
+
+        if final_data is None:
+
+            return self.late if self._expired(meta) else self.empty
+
+        return final_data
+
+    def _meta_handle_guarded(self, hand: BaseHandler, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Any:
+        """
+        Runs the given handler, passing any exceptions to the error handlers.
+
+        If the circuit breaker of the handler is open,
+        or the deadline of the request has passed,
+        then we skip the handler and return None.
+        If the handler runs out of time, we return our late response.
+
+        We only stop waiting on handlers that run in a pool,
+        or that define a 'timeout' of their own.
+        All other handlers are ran in the calling thread,
+        and are checked against the deadline once they return.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hand: Handler to run
+        :type hand: BaseHandler
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data returned by the handler or error handlers
+        :rtype: Any
+        """
+
+        wait = self._time_left(hand, meta) if meta and 'deadline' in meta else hand.timeout
+
+        if wait is not None and wait <= 0:
+
+            # Deadline passed, skip this handler:
+
+            self.expired += 1
+
+            return None
+
+        breaker = hand.breaker
+
+        if breaker is not None and not breaker.allow():
+
+            # Breaker is open, skip this handler:
+
+            return None
+
+        fut = None
+
+        try:
+
+            if wait is not None and (hand.pool is not None or hand.timeout is not None):
+
+                # Run the handler elsewhere, so we can stop waiting on it:
+
+                if hand.pool is None:
+
+                    fut = self._get_fanout_executor().submit(contextvars.copy_context().run, hand._meta_handle, data, meta, cache)
+
+                else:
+
+                    fut = hand.pool.submit(data, meta, cache)
+
+                temp = fut.result(wait)
+
+            elif hand.pool is None:
+
+                temp = hand._meta_handle(data, meta, cache)
+
+                if wait is not None and self._expired(meta):
+
+                    # Ran past the deadline of the request:
+
+                    return self._timed_out(hand, meta=meta)
+
+            else:
+
+                temp = hand.pool.run(data, meta, cache)
+
+        except FutureTimeoutError as e:
+
+            if fut is None or fut.done():
+
+                # Handler raised the timeout itself:
+
+                return self.error_handle(e, hand, data, 'handle', e, meta)
+
+            return self._timed_out(hand, fut, meta)
+
+        except DeadlineExpiredError:
+
+            # Dropped by the pool, as the deadline passed:
+
+            return self._timed_out(hand, meta=meta)
+
+        except Exception as e:
+
+            return self.error_handle(e, hand, data, 'handle', e, meta)
+
+        if breaker is not None:
+
+            breaker.success()
+
+        return temp
+
+    async def _meta_handle_async_guarded(self, hand: BaseHandler, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Any:
+        """
+        Runs the given handler asynchronously, passing any exceptions to the error handlers.
+
+        If the circuit breaker of the handler is open,
+        or the deadline of the request has passed,
+        then we skip the handler and return None.
+        If the handler runs out of time, we cancel it and return our late response.
+        Timeouts raised by the handler itself are passed to the error handlers,
+        as we only treat the handler as late if our wait ran out.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hand: Handler to run
+        :type hand: BaseHandler
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data returned by the handler or error handlers
+        :rtype: Any
+        """
+
+        wait = self._time_left(hand, meta) if meta and 'deadline' in meta else hand.timeout
+
+        if wait is not None and wait <= 0:
+
+            # Deadline passed, skip this handler:
+
+            self.expired += 1
+
+            return None
+
+        breaker = hand.breaker
+
+        if breaker is not None and not breaker.allow():
+
+            # Breaker is open, skip this handler:
+
+            return None
+
+        try:
+
+            if wait is None:
+
+                temp = await self._meta_handle_async(hand, data, meta, cache)
+
+            else:
+
+                task = asyncio.ensure_future(self._meta_handle_async(hand, data, meta, cache))
+
+                try:
+
+                    done, _ = await asyncio.wait((task,), timeout=wait)
+
+                except asyncio.CancelledError:
+
+                    task.cancel()
+
+                    raise
+
+                if not done:
+
+                    # Our wait ran out, stop the handler:
+
+                    task.cancel()
+
+                    return self._timed_out(hand, meta=meta)
+
+                temp = task.result()
+
+        except DeadlineExpiredError:
+
+            return self._timed_out(hand, meta=meta)
+
+        except Exception as e:
+
+            return await self.error_handle_async(e, hand, data, 'handle', e, meta)
+
+        if breaker is not None:
+
+            breaker.success()
+
+        return temp
+
+    def _time_left(self, hand: BaseHandler, meta: dict) -> Optional[float]:
+        """
+        Determines how long we can wait on the given handler.
+
+        We use the deadline of the request,
+        or the timeout of the handler, whichever comes first.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hand: Handler to be ran
+        :type hand: BaseHandler
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Time in seconds we can wait, None if we can wait forever
+        :rtype: float
+        """
+
+        wait = hand.timeout
+        deadline = meta.get('deadline') if meta else None
+
+        if deadline is not None:
+
+            left = deadline / 1000 - time.time()
+            wait = left if wait is None else min(wait, left)
+
+        return wait
+
+    def _expired(self, meta: dict) -> bool:
+        """
+        Determines if the deadline of the request has passed.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: True if the deadline has passed
+        :rtype: bool
+        """
+
+        deadline = meta.get('deadline') if meta else None
+
+        return deadline is not None and deadline <= time.time() * 1000
+
+    def _timed_out(self, hand: BaseHandler, fut: Optional[Future]=None, meta: Optional[dict]=None) -> Any:
+        """
+        Records that the given handler ran out of time.
+
+        We cancel the work, so it is never started if it is still waiting.
+        Pools and batch schedulers leave cancelled requests out,
+        so frames we already answered as late are not handled at all.
+
+        If the handler ran past it's own 'timeout',
+        then we count it as a failure with the circuit breaker,
+        so handlers that hang are eventually skipped.
+        Requests that simply ran past their deadline are not counted,
+        so a short spike in load does not open the breaker.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hand: Handler that ran out of time
+        :type hand: BaseHandler
+        :param fut: Future of the work, if any
+        :type fut: Future
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Our late response
+        :rtype: Any
+        """
+
+        if fut is not None:
+
+            fut.cancel()
+
+        self.timeouts += 1
+
+        if hand.breaker is not None and not self._expired(meta):
+
+            hand.breaker.failure()
+
+        return self.late
+
+    def _record_failure(self, hand: BaseHandler, key: type, oper: str, exc: Exception) -> Optional[int]:
+        """
+        Records a failure of the given handler.
+
+        We inform the circuit breaker of the handler,
+        unless the handler simply rejected the request,
+        and then check with our ErrorThrottle.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hand: Handler that failed
+        :type hand: BaseHandler
+        :param key: Type of the exception
+        :type key: type
+        :param oper: Operation that was undergone
+        :type oper: str
+        :param exc: Exception that was raised
+        :type exc: Exception
+        :return: Number of errors suppressed since the last one, None if this error is suppressed
+        :rtype: int
+        """
+
+        breaker = getattr(hand, 'breaker', None)
+
+        if breaker is not None and not isinstance(exc, HandlerRejectedError):
+
+            breaker.failure()
+
+        if self.throttle is None:
+
+            return 0
+
+        return self.throttle.acquire((hand, key, oper))
+
+    def _get_fanout_executor(self) -> Executor:
+        """
+        Returns the executor used for fanning out handlers,
+        and for submitting to pools when handling asynchronously.
+
+        We use the executor provided at creation time,
+        or create a thread pool of our own the first time we are called.
+
+        :return: Executor to use
+        :rtype: Executor
+        """
+
+        if self.executor is not None:
+
+            return self.executor
+
+        if self._fanout_executor is None:
+
+            self._fanout_executor = ThreadPoolExecutor(thread_name_prefix='meh-fanout')
+
+        return self._fanout_executor
+
+    async def _meta_handle_async(self, hand: BaseHandler, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Any:
+        """
+        Runs the meta handle method of the given handler without blocking the event loop.
+
+        AsyncHandlers are awaited directly,
+        all other handlers are ran in our executor.
+        We copy the current context into the executor,
+        so the request metadata is kept separate for each call.
+        Requests for handlers with a pool are also submitted from our executor,
+        as pools convert (and hash) the data in the submitting thread,
+        which would otherwise block the event loop.
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param hand: Handler to run
+        :type hand: BaseHandler
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data returned by the handler
+        :rtype: Any
+        """
+
+        if hand.pool is not None:
+
+            # Submit to the pool off the event loop, and await the handler in it's pool:
+
+            sub = self._get_fanout_executor().submit(hand.pool.submit, data, meta, cache)
+
+            try:
+
+                fut = await asyncio.wrap_future(sub)
+
+            except asyncio.CancelledError:
+
+                # Cancel the request once it is submitted:
+
+                sub.add_done_callback(_cancel_submitted)
+
+                raise
+
+            return await asyncio.wrap_future(fut)
+
+        if isinstance(hand, AsyncHandler):
+
+            # Await the handler natively:
+
+            return await hand._meta_handle_async(data, meta, cache)
+
+        # Run the handler in the executor:
+
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self.executor, contextvars.copy_context().run, hand._meta_handle, data, meta, cache)
+
+    def _load_handler(self, hand, ids):
+        """
+        Adds the handler to our collection. 
+
+        This low-level method is not intended to
+        be worked with by end users!
+
+        :param mod: Module to add
+        :type mod: BaseModule
+        :param ids: List of events to bind the handler to
+        :type ids: list
+        :param extract: Boolean determining if we should extract IDs from the handler
+        :type extract: bool
+        """
+
+        # Check if we received any IDs:
+
+        if not ids:
+
+            # No ids listed! Do not load...
+
+            return 
+
+        with self._load_lock:
+
+            # Iterate over each ID:
+
+            for id in ids:
+
+                # Add the handler:
+
+                self.hands.setdefault(id, []).append(hand)
+
+            # Recompile the routing table:
+
+            self._build_routes()
+
+        # Update our stats:
+
+        self.max_num_loaded += 1
+        self.num_loaded += 1
+
+        # Attach the collection to the module:
+
+        hand.collection = self
+
+    def _unload_handler(self, hand):
+        """
+        Low-level method for unloading handlers from the collection.
+
+        We do not call any methods or work with the handler in any way
+        other than removing it from the data structure.
+        We will iterate over ALL handlers and remove the 
+        given handler from all events.
+
+        We are not meant to be called directly!
+        This method should only be called by high-level
+        methods of HandlerCollection.
+
+        :param mod: The handler in question to remove
+        :type mod: BaseHandler
+        """
+
+        with self._load_lock:
+
+            # Iterate over all modules:
+
+            for key, hands in list(self.hands.items()):
+
+                # Unload the handler, if we find a match:
+
+                hands[:] = [check for check in hands if check != hand]
+
+                if not hands:
+
+                    # No handlers left, remove the key:
+
+                    del self.hands[key]
+
+            # Recompile the routing table:
+
+            self._build_routes()
+
+        # Update our stats:
+
+        self.num_loaded -= 1
+
+        # Remove ourselves from the module:
+
+        hand.collection = None
+
+    def _build_routes(self):
+        """
+        Compiles the routing table used for dispatching.
+
+        We take the handlers stored in 'hands' and build
+        immutable tuples for each key, with the global
+        (or default error) handlers already attached.
+        Each tuple is sorted by handler priority,
+        handlers with the same priority keep the order they were bound in.
+        The new table is swapped in with a single assignment,
+        so any dispatch in progress will keep using the old table.
+        Callers MUST hold '_load_lock' while altering 'hands' and calling us,
+        so two rebuilds never race and lose a swap.
+
+        This low-level method is not intended to
+        be worked with by end users!
+        """
+
+        events = {}
+        errors = {}
+
+        glob = tuple(self.hands.get(HandlerCollection.GLOBAL, ()))
+        default_error = _by_priority(self.hands.get(BaseException, ()))
+
+        for key, hands in self.hands.items():
+
+            # Skip special keys and empty lists:
+
+            if not hands or key is None or key == HandlerCollection.GLOBAL or key is BaseException:
+
+                continue
+
+            if isinstance(key, type) and issubclass(key, BaseException):
+
+                # Error handlers, attach the default error handlers:
+
+                errors[key] = _by_priority(tuple(hands) + default_error)
+
+                continue
+
+            # Event handlers, attach the global handlers:
+
+            events[key] = _by_priority(tuple(hands) + glob)
+
+        # Determine which handlers can share conversions:
+
+        default = _by_priority(self.hands.get(None, ()))
+        shared = [key for key, hands in events.items() if _shares_conversions(hands)]
+
+        if _shares_conversions(default):
+
+            shared.append(None)
+
+        # Determine which handlers have nothing to guard:
+
+        direct = {key: (_bind(hands) if _is_plain(key, hands, shared, self.policies) else None) for key, hands in events.items()}
+
+        # Swap in the new table:
+
+        self.routes = RoutingTable(
+            events=MappingProxyType(events),
+            default=default,
+            errors=MappingProxyType(errors),
+            default_error=default_error,
+            policies=MappingProxyType(dict(self.policies)),
+            shared=frozenset(shared),
+            direct=direct.get,
+            direct_default=_bind(default) if _is_plain(None, default, shared, self.policies) else None,
+            flight=FlightCounter(prev=None if self.routes is None else self.routes.flight),
+        )
+
+
+def _by_priority(hands) -> Tuple[BaseHandler, ...]:
+    """
+    Sorts the given handlers by priority, highest first.
+
+    The sort is stable, so handlers with the same
+    priority keep the order they were given in.
+
+    :param hands: Handlers to sort
+    :type hands: Iterable[BaseHandler]
+    :return: Tuple of sorted handlers
+    :rtype: tuple
+    """
+
+    return tuple(sorted(hands, key=lambda hand: -hand.priority))
+
+
+def _cancel_submitted(sub: Future):
+    """
+    Cancels the request submitted to a pool by the given future.
+
+    :param sub: Future of the submission, containing the future of the request
+    :type sub: Future
+    """
+
+    if not sub.cancelled() and sub.exception() is None:
+
+        sub.result().cancel()
+
+
+def _in_workers(hand: BaseHandler) -> bool:
+    """
+    Determines if the given handler is ran in worker processes.
+
+    Each worker process starts an instance of the handler of it's own,
+    so the instance in our process is never started or stopped,
+    and does not load any models it does not use.
+    It only converts data and caches responses.
+
+    :param hand: Handler to check
+    :type hand: BaseHandler
+    :return: True if the handler is ran in worker processes
+    :rtype: bool
+    """
+
+    return hand.policy is not None and hand.policy.kind in (ExecutionPolicy.PROCESS, ExecutionPolicy.SHARED)
+
+
+def _is_plain(key, hands, shared, policies) -> bool:
+    """
+    Determines if the given handlers of an event have nothing to guard.
+
+    The event must have no policy or shared conversions,
+    and the handlers must have no pool, timeout, circuit breaker or result cache,
+    so they can be called directly when dispatching.
+
+    :param key: Event ID of the handlers, None for the default handlers
+    :type key: Any
+    :param hands: Handlers to check
+    :type hands: Iterable[BaseHandler]
+    :param shared: Event IDs whose handlers share conversions
+    :type shared: Iterable
+    :param policies: Event ID to DispatchPolicy
+    :type policies: dict
+    :return: True if the handlers can be called directly
+    :rtype: bool
+    """
+
+    if key in shared or key in policies:
+
+        return False
+
+    return all(hand.pool is None and hand.breaker is None and hand.results is None and hand.timeout is None for hand in hands)
+
+
+def _bind(hands) -> Tuple[Callable, ...]:
+    """
+    Gets the meta handle method of each given handler.
+
+    Handlers that use plain BaseFormatters have nothing to convert or revert,
+    so we use '_meta_handle_plain()' for them,
+    unless they alter how '_meta_handle()' works.
+    Otherwise we use '_meta_handle()'.
+
+    :param hands: Handlers to get methods from
+    :type hands: Iterable[BaseHandler]
+    :return: Tuple of bound methods
+    :rtype: tuple
+    """
+
+    return tuple(
+        hand._meta_handle_plain
+        if type(hand)._meta_handle is BaseHandler._meta_handle and type(hand.convert) is BaseFormatter and type(hand.revert) is BaseFormatter
+        else hand._meta_handle
+        for hand in hands
+    )
+
+
+def _shares_conversions(hands) -> bool:
+    """
+    Determines if the given handlers can share conversions.
+
+    Handlers that use a plain BaseFormatter do not convert anything,
+    so a ConversionCache is only worth creating if at least two
+    of the handlers convert their data.
+
+    :param hands: Handlers to check
+    :type hands: Iterable[BaseHandler]
+    :return: True if a ConversionCache should be used
+    :rtype: bool
+    """
+
+    return sum(type(hand.convert) is not BaseFormatter for hand in hands) > 1
+
+
+def parse_directory(path: str, final: HandlerCollection, hand_class: Any=BaseHandler, lazy: bool=False, allow: Optional[list]=None, deny: Optional[list]=None) -> int:
+    """
+    Parses extensions from specified location.
+
+    We make sure that all objects loaded inherit
+    the class specified in the 'hand_class' argument.
+    Only handlers defined in each module are loaded,
+    so handlers imported from elsewhere are not loaded twice.
+
+    We also load the handlers into the given HandlerCollection.
+
+    If 'lazy' is True, then we build a manifest of the handlers
+    in each module without importing it, see 'build_manifest()'.
+    Modules whose handlers are only bound to plain event IDs are deferred,
+    and are imported the first time one of their events is handled.
+    All other modules are imported right away.
+
+    Handlers can be selected using the 'allow' and 'deny' lists of fnmatch patterns,
+    see 'select_entries()' for more info.
+    Modules without any selected handlers are never imported.
+
+    :param path: Path to directory location
+    :type path: str
+    :param final: HandlerCollection to add handler to
+    :type final: HandlerCollection
+    :param lazy: Value determining if modules should be imported when first needed
+    :type lazy: bool
+    :param allow: Patterns of handlers to load, None to load all
+    :type allow: list
+    :param deny: Patterns of handlers to skip, None to skip none
+    :type deny: list
+    :return: Number of handlers loaded (or deferred)
+    :rtype: int
+    """
+
+    # Build the manifest of each module:
+
+    modules = {}
+
+    for entry in select_entries(build_manifest(path), allow, deny):
+
+        modules.setdefault(entry.module, []).append(entry)
+
+    index = 0
+
+    for name, entries in modules.items():
+
+        # Determine if we can defer this module:
+
+        if lazy and all(entry.ids is not None and all(isinstance(id, str) and id != HandlerCollection.GLOBAL for id in entry.ids) for entry in entries):
+
+            index += final.defer(tuple(entry for entry in entries if entry.ids))
+
+            continue
+
+        # Loading module for inspection
+
+        module = import_source(name, entries[0].path)
+
+        index += len(load_module(module, final, hand_class, [entry.name for entry in entries]))
+
+    return index
+
+
+def load_module(module: Any, final: HandlerCollection, hand_class: Any=BaseHandler, names: Optional[list]=None) -> list:
+    """
+    Loads the handlers defined in the given module.
+
+    We create an instance of each class defined in the module
+    that inherits the 'hand_class' argument,
+    and load it into the given HandlerCollection.
+
+    :param module: Module to load the handlers from
+    :type module: module
+    :param final: HandlerCollection to add handler to
+    :type final: HandlerCollection
+    :param hand_class: Class all handlers MUST inherit
+    :type hand_class: Any
+    :param names: Names of the classes to load, None for all
+    :type names: list
+    :return: List of handlers loaded
+    :rtype: list
+    """
+
+    loaded = []
+
+    for member in (dir(module) if names is None else names):
+
+        obj = getattr(module, member, None)
+
+        # Checking if extension is a handler defined in this module
+
+        if inspect.isclass(obj) and issubclass(obj, hand_class) and obj.__module__ == module.__name__:
+
+            # Create and load the handler:
+
+            plug = final.load_handler(obj())
+
+            if plug is not None:
+
+                loaded.append(plug)
+
+    return loaded
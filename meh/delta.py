@@ -0,0 +1,136 @@
+"""
+This file contains components for sending only what changed.
+
+Clients usually send frames many times a second,
+and the response to most frames is the same as the last one,
+such as the same gesture, or 'unknown' while nobody is in front of the camera.
+Sending the full response every time wastes bandwidth,
+and the time the client spends parsing it.
+
+The DeltaTracker remembers the last response sent for each event on a connection,
+and only gives back the fields that changed.
+If nothing changed, then no fields need to be sent at all.
+Every so often (and whenever the client asks), the full response is sent instead,
+which is called a keyframe, so clients that missed a delta can catch up.
+"""
+
+import time
+
+from typing import Any, Optional, Tuple
+
+_REMOVED = None  # Value sent for fields that were removed
+
+
+class DeltaTracker(object):
+    """
+    DeltaTracker - Tracks the last response sent on a single connection
+
+    Only dictionary responses are tracked.
+    Fields that changed (or were added) are sent with their new values,
+    and fields that were removed are sent as None.
+    Any other kind of response is always sent in full.
+
+    A keyframe with the full response is sent for an event
+    if 'interval' seconds have passed since the last keyframe for the event,
+    if the response is not a dictionary,
+    or if a keyframe is requested.
+
+    We keep count of the responses that were sent as keyframes,
+    sent as deltas, and skipped because nothing changed,
+    which can be retrieved using 'stats()'.
+
+    :param interval: Time in seconds between keyframes
+    :type interval: float
+    """
+
+    def __init__(self, interval: float=5.0) -> None:
+
+        self.interval = interval  # Time in seconds between keyframes
+        self.last = {}  # Event ID to (last response, time of last keyframe)
+
+        self.keyframes = 0  # Number of responses sent in full
+        self.deltas = 0  # Number of responses sent as deltas
+        self.skipped = 0  # Number of responses not sent, as nothing changed
+
+    def update(self, id: Any, data: Any, keyframe: bool=False) -> Tuple[Optional[Any], bool]:
+        """
+        Records the given response, and determines what should be sent.
+
+        :param id: ID of the event the response is for
+        :type id: Any
+        :param data: Full response
+        :type data: Any
+        :param keyframe: Value determining if the full response must be sent
+        :type keyframe: bool
+        :return: Data to send (None if nothing needs to be sent), and if it is a keyframe
+        :rtype: tuple
+        """
+
+        now = time.monotonic()
+        last = self.last.get(id)
+
+        if keyframe or last is None or not isinstance(data, dict) or not isinstance(last[0], dict) or now - last[1] >= self.interval:
+
+            # Send the full response:
+
+            self.last[id] = (data, now)
+
+            self.keyframes += 1
+
+            return data, True
+
+        old = last[0]
+
+        # Find the fields that changed, or were removed:
+
+        delta = {key: value for key, value in data.items() if key not in old or old[key] != value}
+
+        for key in old:
+
+            if key not in data:
+
+                delta[key] = _REMOVED
+
+        self.last[id] = (data, last[1])
+
+        if not delta:
+
+            self.skipped += 1
+
+            return None, False
+
+        self.deltas += 1
+
+        return delta, False
+
+    def reset(self, id: Any=None):
+        """
+        Forgets the last response sent for the given event,
+        so the next response is sent as a keyframe.
+
+        :param id: ID of the event, None to forget all events
+        :type id: Any
+        """
+
+        if id is None:
+
+            self.last.clear()
+
+            return
+
+        self.last.pop(id, None)
+
+    def stats(self) -> dict:
+        """
+        Returns stats about this tracker.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        return {
+            'events': len(self.last),
+            'keyframes': self.keyframes,
+            'deltas': self.deltas,
+            'skipped': self.skipped,
+        }
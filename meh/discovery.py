@@ -0,0 +1,311 @@
+"""
+This file contains components for discovering handlers without importing them.
+
+Importing a handler module can be very expensive,
+as handlers often import large libraries (such as mediapipe or sklearn),
+or load models when they are imported.
+To keep startup fast, we read the source of each module instead,
+and build a manifest of the handler classes defined in it,
+and the IDs each handler is bound to.
+
+The HandlerCollection can then import each module
+the first time an event for one of it's IDs is received.
+
+Handlers can only be discovered if their 'ids' are defined in the class body
+using simple values, such as strings, built in exceptions, or 'HandlerCollection.GLOBAL'.
+If the IDs of a handler can not be determined, then it's module must be imported
+to find out, which is done right away.
+
+Deployments can choose which handlers are used by filtering
+the manifest with 'select_entries()', in which case the modules
+of the handlers that are not selected are never imported.
+"""
+
+import os
+import ast
+import sys
+import pkgutil
+import fnmatch
+import builtins
+import importlib.util
+
+from typing import Any, Tuple, Optional, NamedTuple
+
+_MISSING = object()  # Value used when a class does not define IDs
+
+
+class ManifestEntry(NamedTuple):
+    """
+    ManifestEntry - Handler found in a module
+
+    We contain the name and path of the module the handler was found in,
+    the name of the handler class, and the IDs the handler is bound to.
+    If the IDs could not be determined, then 'ids' is None.
+    """
+
+    module: str  # Name of the module
+    path: str  # Path to the module source
+    name: str  # Name of the handler class
+    ids: Optional[Tuple[Any, ...]]  # IDs the handler is bound to, None if unknown
+
+
+def build_manifest(path: str, package: str='meh') -> Tuple[ManifestEntry, ...]:
+    """
+    Builds a manifest of the handlers in the given directory.
+
+    We parse each module in the directory, and find each class
+    that inherits (directly or not) from a class imported from 'package'.
+    No modules are imported!
+
+    :param path: Path to directory location
+    :type path: str
+    :param package: Package the handler base classes are imported from
+    :type package: str
+    :return: Entry for each handler found
+    :rtype: tuple
+    """
+
+    final = []
+
+    for _, name, ispkg in pkgutil.iter_modules(path=[path]):
+
+        if ispkg:
+
+            continue
+
+        file = os.path.join(path, name + '.py')
+
+        with open(file, 'r') as f:
+
+            tree = ast.parse(f.read(), filename=file)
+
+        final.extend(ManifestEntry(name, file, cls, ids) for cls, ids in _find_handlers(tree, package))
+
+    return tuple(final)
+
+
+def select_entries(entries: Tuple[ManifestEntry, ...], allow: Optional[list]=None, deny: Optional[list]=None) -> Tuple[ManifestEntry, ...]:
+    """
+    Selects the manifest entries that are allowed and not denied.
+
+    Each pattern is an fnmatch pattern, which is matched against
+    the name of the module (such as 'recog'), and the name of the
+    module and handler class (such as 'recog.FaceRecognize').
+    An entry is selected if it matches any allowed pattern,
+    and does not match any denied pattern.
+
+    :param entries: Entries to select from
+    :type entries: tuple
+    :param allow: Patterns of handlers to allow, None to allow all
+    :type allow: list
+    :param deny: Patterns of handlers to deny, None to deny none
+    :type deny: list
+    :return: Selected entries
+    :rtype: tuple
+    """
+
+    def matches(entry: ManifestEntry, patterns: list) -> bool:
+
+        full = '{}.{}'.format(entry.module, entry.name)
+
+        return any(fnmatch.fnmatchcase(entry.module, pat) or fnmatch.fnmatchcase(full, pat) for pat in patterns)
+
+    return tuple(entry for entry in entries if (allow is None or matches(entry, allow)) and not (deny and matches(entry, deny)))
+
+
+def import_source(name: str, path: str, fresh: bool=False) -> Any:
+    """
+    Imports the module at the given path under the given name.
+
+    If the module has already been imported, then we return it,
+    unless 'fresh' is True, in which case we import it again.
+    If the import fails, then the old module is kept.
+
+    :param name: Name of the module
+    :type name: str
+    :param path: Path to the module source
+    :type path: str
+    :param fresh: Value determining if the module should be imported again
+    :type fresh: bool
+    :return: Module imported
+    :rtype: module
+    """
+
+    old = sys.modules.get(name)
+
+    if not fresh and old is not None and getattr(old, '__file__', None) == path:
+
+        return old
+
+    spec = importlib.util.spec_from_file_location(name, path)
+    module = importlib.util.module_from_spec(spec)
+
+    sys.modules[name] = module
+
+    try:
+
+        if fresh:
+
+            # Compile the source ourselves, so stale bytecode is never used:
+
+            exec(compile(spec.loader.get_data(path), path, 'exec'), module.__dict__)
+
+        else:
+
+            spec.loader.exec_module(module)
+
+    except BaseException:
+
+        # Restore the old module, if any:
+
+        if old is None:
+
+            del sys.modules[name]
+
+        else:
+
+            sys.modules[name] = old
+
+        raise
+
+    return module
+
+
+def _find_handlers(tree: ast.Module, package: str) -> list:
+    """
+    Finds the handler classes defined in the given module.
+
+    This low-level function is not intended to
+    be worked with by end users!
+
+    :param tree: Parsed module
+    :type tree: ast.Module
+    :param package: Package the handler base classes are imported from
+    :type package: str
+    :return: List of class names and their IDs
+    :rtype: list
+    """
+
+    # Find the names imported from the package:
+
+    bases = {}
+
+    for node in tree.body:
+
+        if isinstance(node, ast.ImportFrom) and node.module and node.module.split('.')[0] == package:
+
+            for alias in node.names:
+
+                bases[alias.asname or alias.name] = ()
+
+    # Find the classes that inherit from them:
+
+    final = []
+
+    for node in tree.body:
+
+        if not isinstance(node, ast.ClassDef):
+
+            continue
+
+        parents = [_base_name(base) for base in node.bases]
+
+        if not any(parent in bases for parent in parents):
+
+            continue
+
+        ids = _find_ids(node)
+
+        if ids is _MISSING:
+
+            # Use the IDs of the first parent defined in this module:
+
+            ids = next((bases[parent] for parent in parents if parent in bases), ())
+
+        bases[node.name] = ids
+
+        final.append((node.name, ids))
+
+    return final
+
+
+def _find_ids(node: ast.ClassDef) -> Any:
+    """
+    Finds the IDs defined in the body of the given class.
+
+    This low-level function is not intended to
+    be worked with by end users!
+
+    :param node: Class to check
+    :type node: ast.ClassDef
+    :return: Tuple of IDs, None if they can't be determined, _MISSING if not defined
+    :rtype: tuple
+    """
+
+    for stmt in node.body:
+
+        if isinstance(stmt, ast.Assign) and any(isinstance(targ, ast.Name) and targ.id == 'ids' for targ in stmt.targets):
+
+            value = stmt.value
+
+        elif isinstance(stmt, ast.AnnAssign) and isinstance(stmt.target, ast.Name) and stmt.target.id == 'ids' and stmt.value is not None:
+
+            value = stmt.value
+
+        else:
+
+            continue
+
+        if not isinstance(value, (ast.List, ast.Tuple)):
+
+            return None
+
+        final = []
+
+        for elt in value.elts:
+
+            if isinstance(elt, ast.Constant):
+
+                final.append(elt.value)
+
+            elif isinstance(elt, ast.Name) and isinstance(getattr(builtins, elt.id, None), type) and issubclass(getattr(builtins, elt.id), BaseException):
+
+                final.append(getattr(builtins, elt.id))
+
+            elif isinstance(elt, ast.Attribute) and elt.attr == 'GLOBAL':
+
+                final.append('GLOBAL')
+
+            else:
+
+                # Can't determine this ID:
+
+                return None
+
+        return tuple(final)
+
+    return _MISSING
+
+
+def _base_name(node: ast.expr) -> Optional[str]:
+    """
+    Gets the name of the given base class.
+
+    This low-level function is not intended to
+    be worked with by end users!
+
+    :param node: Base class expression
+    :type node: ast.expr
+    :return: Name of the base class, None if it has none
+    :rtype: str
+    """
+
+    if isinstance(node, ast.Name):
+
+        return node.id
+
+    if isinstance(node, ast.Attribute):
+
+        return node.attr
+
+    return None
@@ -0,0 +1,177 @@
+"""
+This file contains components that control how
+the HandlerCollection dispatches events.
+
+By default, each handler bound to an event is ran one after another,
+and the last response that is not None is sent back to the client.
+A DispatchPolicy can be set for an event ID to change this behavior,
+for example running the handlers concurrently,
+and merging the responses in a different way.
+
+We also offer a few merge functions that can be used with policies.
+A merge function takes a list of responses (with None values removed),
+in the order the handlers are bound, and returns the final response.
+"""
+
+from __future__ import annotations
+
+import json
+
+from itertools import groupby
+from typing import Any, Callable, List, Tuple, Union
+
+
+def merge_last(results: List[Any]) -> Any:
+    """
+    Returns the last response, this is the default behavior.
+
+    :param results: Responses to merge
+    :type results: list
+    :return: Last response, None if there are no responses
+    :rtype: Any
+    """
+
+    return results[-1] if results else None
+
+
+def merge_first(results: List[Any]) -> Any:
+    """
+    Returns the first response.
+
+    :param results: Responses to merge
+    :type results: list
+    :return: First response, None if there are no responses
+    :rtype: Any
+    """
+
+    return results[0] if results else None
+
+
+def merge_list(results: List[Any]) -> Any:
+    """
+    Returns all responses in a list.
+
+    :param results: Responses to merge
+    :type results: list
+    :return: List of responses
+    :rtype: list
+    """
+
+    return results
+
+
+def merge_json(results: List[Any]) -> Any:
+    """
+    Merges JSON objects into one JSON object.
+
+    Each response can be a dictionary or a JSON string (or bytes).
+    We merge the keys of each object in order,
+    so later handlers win if the same key is used twice.
+    Responses that are not objects are ignored.
+
+    :param results: Responses to merge
+    :type results: list
+    :return: JSON string of the merged object, None if there are no objects
+    :rtype: str
+    """
+
+    final = {}
+    found = False
+
+    for res in results:
+
+        # Decode the response if necessary:
+
+        if isinstance(res, (str, bytes, bytearray)):
+
+            res = json.loads(res)
+
+        if isinstance(res, dict):
+
+            final.update(res)
+
+            found = True
+
+    return json.dumps(final) if found else None
+
+
+class DispatchPolicy(object):
+    """
+    DispatchPolicy - Describes how an event should be dispatched
+
+    Policies are set for an event ID using 'HandlerCollection.set_policy()'.
+
+    If 'fanout' is True, then all handlers bound to the event
+    (global handlers included) are ran concurrently.
+    Only enable this if the handlers are independent of each other!
+    Handlers with their own pool are submitted to that pool,
+    all others are ran in the executor of the HandlerCollection.
+
+    'merge' determines how the responses are combined,
+    and can be the name of a builtin merge function
+    ('last', 'first', 'list', 'json') or any callable
+    that takes a list of responses.
+
+    If 'short_circuit' is True, then dispatching stops
+    at the first handler that returns a response (first result wins),
+    and the remaining handlers are not ran.
+    When fanning out, handlers with the same priority
+    are ran concurrently, and we stop after the first
+    priority that returns a response.
+    """
+
+    MERGES = {
+        'last': merge_last,
+        'first': merge_first,
+        'list': merge_list,
+        'json': merge_json,
+    }
+
+    def __init__(self, fanout: bool=False, merge: Union[str, Callable[[List[Any]], Any]]='last', short_circuit: bool=False) -> None:
+
+        if isinstance(merge, str):
+
+            if merge not in DispatchPolicy.MERGES:
+
+                # Invalid merge function!
+
+                raise ValueError("Invalid merge function: {}".format(merge))
+
+            merge = DispatchPolicy.MERGES[merge]
+
+        self.fanout = fanout  # Value determining if we run handlers concurrently
+        self.merge = merge  # Function used for merging responses
+        self.short_circuit = short_circuit  # Value determining if we stop at the first response
+
+    def steps(self, hands: Tuple[Any, ...]) -> List[Tuple[Any, ...]]:
+        """
+        Splits the given handlers into steps.
+
+        Handlers in the same step are ran concurrently,
+        and each step is ran one after another.
+
+        :param hands: Handlers to split, sorted by priority
+        :type hands: tuple
+        :return: List of steps
+        :rtype: list
+        """
+
+        if not self.fanout:
+
+            # Each handler is it's own step:
+
+            return [(hand,) for hand in hands]
+
+        if not self.short_circuit:
+
+            # Run everything at once:
+
+            return [hands] if hands else []
+
+        # Group the handlers by priority:
+
+        return [tuple(group) for _, group in groupby(hands, key=lambda hand: hand.priority)]
+
+    def __repr__(self) -> str:
+
+        return "DispatchPolicy(fanout={}, merge={}, short_circuit={})".format(self.fanout, getattr(self.merge, '__name__', self.merge), self.short_circuit)
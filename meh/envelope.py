@@ -0,0 +1,148 @@
+"""
+This file contains components for packing messages into envelopes.
+
+Messages used to be sent as the metadata (a JSON object)
+followed by the payload, which had to be split by searching for the first '}'.
+This breaks on nested metadata, and slicing copies the payload.
+
+Instead, each message is wrapped in an envelope with a fixed size header:
+
+    +-------+---------+-------+-------------+------+---------+
+    | magic | version | flags | meta length | meta | payload |
+    +-------+---------+-------+-------------+------+---------+
+      2 B      1 B      1 B      4 B (BE)
+
+    * magic - Always b'ME', so envelopes can be told apart from other messages
+    * version - Version of the envelope, currently 1
+    * flags - Bit field describing the payload, see the FLAG_* constants
+    * meta length - Length of the metadata in bytes, big endian
+    * meta - Metadata, encoded as UTF-8 JSON
+    * payload - Everything after the metadata
+
+The header tells us exactly where the payload starts,
+so we can hand back a view of the payload without scanning or copying it.
+"""
+
+import json
+import struct
+
+from typing import Any, NamedTuple, Union
+
+from meh.errors import EnvelopeError
+
+MAGIC = b'ME'  # Bytes every envelope starts with
+VERSION = 1  # Version of the envelopes we create
+
+FLAG_TEXT = 0x01  # Payload is UTF-8 text, rather than raw bytes
+
+HEADER = struct.Struct('!2sBBI')  # Layout of the header
+
+
+class Envelope(NamedTuple):
+    """
+    Envelope - Message taken out of an envelope
+
+    We contain the metadata, the payload, and the flags of the envelope.
+    Binary payloads are a memoryview of the message,
+    text payloads are decoded into a string.
+    """
+
+    meta: dict  # Metadata of the message
+    payload: Union[memoryview, str]  # Payload of the message
+    flags: int  # Flags of the envelope
+
+
+def is_envelope(data: Any) -> bool:
+    """
+    Determines if the given message is an envelope.
+
+    :param data: Message to check
+    :type data: bytes
+    :return: True if the message starts with our magic bytes
+    :rtype: bool
+    """
+
+    return isinstance(data, (bytes, bytearray, memoryview)) and data[:len(MAGIC)] == MAGIC
+
+
+def pack(meta: dict, payload: Union[bytes, bytearray, memoryview, str]=b'') -> bytes:
+    """
+    Packs the given metadata and payload into an envelope.
+
+    Text payloads are encoded as UTF-8, and marked with FLAG_TEXT.
+
+    :param meta: Metadata of the message
+    :type meta: dict
+    :param payload: Payload of the message
+    :type payload: bytes or str
+    :return: Envelope
+    :rtype: bytes
+    """
+
+    flags = 0
+
+    if isinstance(payload, str):
+
+        payload = payload.encode()
+
+        flags |= FLAG_TEXT
+
+    meta = json.dumps(meta, separators=(',', ':')).encode()
+
+    return b''.join((HEADER.pack(MAGIC, VERSION, flags, len(meta)), meta, payload))
+
+
+def unpack(data: Union[bytes, bytearray, memoryview]) -> Envelope:
+    """
+    Takes the message out of the given envelope.
+
+    Binary payloads are never copied.
+
+    :param data: Envelope to unpack
+    :type data: bytes
+    :return: Message in the envelope
+    :rtype: Envelope
+    :raise: EnvelopeError: If the envelope is malformed, or of an unknown version
+    """
+
+    view = memoryview(data)
+
+    if len(view) < HEADER.size:
+
+        raise EnvelopeError("Envelope is too short for a header!")
+
+    magic, version, flags, size = HEADER.unpack_from(view)
+
+    if magic != MAGIC:
+
+        raise EnvelopeError("Message is not an envelope!")
+
+    if version != VERSION:
+
+        raise EnvelopeError("Unsupported envelope version: {}".format(version))
+
+    end = HEADER.size + size
+
+    if end > len(view):
+
+        raise EnvelopeError("Metadata length {} exceeds the envelope!".format(size))
+
+    try:
+
+        meta = json.loads(view[HEADER.size:end].tobytes())
+
+    except ValueError as e:
+
+        raise EnvelopeError("Invalid metadata: {}".format(e)) from None
+
+    if not isinstance(meta, dict):
+
+        raise EnvelopeError("Metadata MUST be a JSON object!")
+
+    payload = view[end:]
+
+    if flags & FLAG_TEXT:
+
+        payload = str(payload, 'utf-8')
+
+    return Envelope(meta, payload, flags)
@@ -44,3 +44,27 @@ class HandlerUnloadError(BaseMEHException):
     """
 
     pass
+
+
+class HandlerRejectedError(BaseMEHException):
+    """
+    HandlerRejectedError - Raised when a handler has too much work in flight to accept more.
+    """
+
+    pass
+
+
+class DeadlineExpiredError(HandlerRejectedError):
+    """
+    DeadlineExpiredError - Raised when a request is dropped as it's deadline passed before it was handled.
+    """
+
+    pass
+
+
+class EnvelopeError(BaseMEHException):
+    """
+    EnvelopeError - Raised when a message envelope is malformed or of an unknown version.
+    """
+
+    pass
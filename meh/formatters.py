@@ -9,10 +9,121 @@ input data, and convert it into a new format.
 
 One example of this is converting JSON strings
 into valid python dicts to be used.
+
+Formatters can also change how they revert data based
+on the metadata of the request, see 'revert_for()'.
+The NegotiatedFormatter uses this to let each client choose
+the format of it's responses, such as JSON or MessagePack.
+
+When many handlers are bound to the same event,
+the same data is often converted by the same kind of formatter many times.
+To prevent this, the HandlerCollection creates a ConversionCache
+for each dispatch, and formatters store their conversions in it
+under their 'cache_key', so each representation is only computed once.
 """
 
+import io
 import json
 import base64
+import threading
+
+try:
+
+    import numpy as np
+
+    from PIL import Image
+
+except ImportError:
+
+    # Image arrays are not available:
+
+    np = None
+    Image = None
+
+try:
+
+    import orjson
+
+except ImportError:
+
+    # Fast JSON is not available, we fall back to json:
+
+    orjson = None
+
+try:
+
+    import msgpack
+
+except ImportError:
+
+    # MessagePack is not available:
+
+    msgpack = None
+
+
+class ConversionCache(object):
+    """
+    ConversionCache - Stores conversions for a single dispatch
+
+    Each value is computed once, even if many threads
+    ask for the same value at the same time.
+    If a conversion fails, then nothing is stored,
+    and the next caller will try again.
+
+    Values in this cache are shared between handlers,
+    so handlers MUST NOT alter the data they are given!
+    """
+
+    def __init__(self) -> None:
+
+        self.values = {}  # Conversions we have computed
+        self.locks = {}  # Lock for each conversion
+        self.lock = threading.Lock()  # Lock guarding the conversion locks
+
+    def get(self, key, func, data):
+        """
+        Gets the value under the given key,
+        computing it with the given function if necessary.
+
+        :param key: Key of the value
+        :type key: Any
+        :param func: Function that converts the data
+        :type func: Callable
+        :param data: Data to convert
+        :type data: Any
+        :return: Converted data
+        :rtype: Any
+        """
+
+        try:
+
+            return self.values[key]
+
+        except KeyError:
+
+            pass
+
+        # Get the lock for this value:
+
+        with self.lock:
+
+            lock = self.locks.setdefault(key, threading.Lock())
+
+        with lock:
+
+            # Another thread may have computed the value:
+
+            try:
+
+                return self.values[key]
+
+            except KeyError:
+
+                pass
+
+            value = self.values[key] = func(data)
+
+            return value
 
 
 class BaseFormatter(object):
@@ -27,8 +138,48 @@ class BaseFormatter(object):
     'convert()' should convert arbitrary input data into something python can use.
     'revert()' should revert arbitrary output data into something that
     can be sent over a socket.
+
+    Conversions are shared between formatters with the same 'cache_key',
+    which is the type of the formatter by default.
+    Formatters that take parameters that change the converted data
+    MUST include these parameters in their cache key!
+
+    Formatters that revert data differently depending on the metadata
+    MUST list the metadata keys they use under 'meta_keys',
+    so responses cached by the handler are kept apart.
     """
 
+    meta_keys = ()  # Metadata keys that change our reverted data
+
+    @property
+    def cache_key(self):
+        """
+        Key our conversions are stored under in a ConversionCache.
+
+        :return: Key to use
+        :rtype: Any
+        """
+
+        return type(self)
+
+    def convert_cached(self, data, cache=None):
+        """
+        Converts input data, using the given cache if provided.
+
+        :param data: Data to be converted
+        :type data: Any
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data to be sent to the event handler
+        :rtype: Any
+        """
+
+        if cache is None:
+
+            return self.convert(data)
+
+        return cache.get(self.cache_key, self.convert, data)
+
     def convert(self, data):
         """
         Converts input data into something the EventHandler can understand.
@@ -65,6 +216,51 @@ class BaseFormatter(object):
 
         return data
 
+    def revert_for(self, data, meta):
+        """
+        Reverts output data for the given request.
+
+        Handlers call this method instead of 'revert()',
+        so formatters can take the metadata into account.
+        By default, we ignore the metadata and call 'revert()'.
+
+        :param data: Data to be reverted
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Data to be sent over a socket
+        :rtype: Any
+        """
+
+        return self.revert(data)
+
+
+def _plain(obj):
+    """
+    Converts objects the JSON and MessagePack encoders don't understand.
+
+    We convert numpy arrays and numbers into python lists and numbers,
+    which are often returned by handlers that use models.
+    Bytes (such as arrays packed with 'meh.quantize') are converted
+    into Base64 strings, as JSON has no binary type.
+
+    :param obj: Object to convert
+    :type obj: Any
+    :return: Plain python object
+    :rtype: Any
+    :raise: TypeError: If the object can't be converted
+    """
+
+    if isinstance(obj, (bytes, bytearray, memoryview)):
+
+        return base64.b64encode(obj).decode('ascii')
+
+    if hasattr(obj, 'tolist'):
+
+        return obj.tolist()
+
+    raise TypeError("Object of type {} can not be encoded!".format(type(obj).__name__))
+
 
 class JSONFormatter(BaseFormatter):
     """
@@ -100,6 +296,181 @@ class JSONFormatter(BaseFormatter):
         return json.dumps(data)
 
 
+class FastJSONFormatter(JSONFormatter):
+    """
+    FastJSONFormatter - Converts and reverts data in JSON format, quickly!
+
+    We use orjson when it is installed, which is many times faster
+    than json, and understands numpy arrays.
+    If it is not installed, then we fall back to json.
+    Numpy arrays and numbers are converted into python objects either way.
+
+    The JSON we produce is compact, with no whitespace between items.
+    """
+
+    def convert(self, data):
+        """
+        Converts input JSON data into a dictionary.
+
+        :param data: Data to be converted
+        :type data: str, bytes or memoryview
+        :return: Dictionary of data
+        :rtype: dict
+        """
+
+        if orjson is not None:
+
+            return orjson.loads(data)
+
+        if isinstance(data, memoryview):
+
+            data = data.tobytes()
+
+        return json.loads(data)
+
+    def revert(self, data):
+        """
+        Reverts input dictionary into a JSON string.
+
+        :param data: Data to be reverted
+        :type data: dict
+        :return: Reverted data
+        :rtype: str
+        """
+
+        if orjson is not None:
+
+            return orjson.dumps(data, default=_plain, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS).decode()
+
+        return json.dumps(data, default=_plain, separators=(',', ':'))
+
+
+class MsgPackFormatter(BaseFormatter):
+    """
+    MsgPackFormatter - Converts and reverts data in MessagePack format!
+
+    MessagePack is a binary format that is smaller and faster
+    to work with than JSON, which is great for binary clients.
+    Our reverted data is bytes, so it MUST be sent as a binary message.
+    Numpy arrays and numbers are converted into python objects.
+
+    We require msgpack to be installed.
+    """
+
+    def __init__(self) -> None:
+
+        if msgpack is None:
+
+            raise ImportError("MsgPackFormatter requires msgpack!")
+
+    def convert(self, data):
+        """
+        Converts input MessagePack data into python objects.
+
+        :param data: Data to be converted
+        :type data: bytes or memoryview
+        :return: Python objects
+        :rtype: Any
+        """
+
+        return msgpack.unpackb(data)
+
+    def revert(self, data):
+        """
+        Reverts python objects into MessagePack data.
+
+        :param data: Data to be reverted
+        :type data: Any
+        :return: Reverted data
+        :rtype: bytes
+        """
+
+        return msgpack.packb(data, default=_plain)
+
+
+class NegotiatedFormatter(BaseFormatter):
+    """
+    NegotiatedFormatter - Reverts data in the format the client asks for!
+
+    Clients choose the format of their responses
+    by providing the name of the format under 'format' in the metadata.
+    Clients that do not provide a format (or provide one we don't know)
+    are given the default format.
+
+    By default, we offer 'json' (the default) using the FastJSONFormatter,
+    and 'msgpack' using the MsgPackFormatter if msgpack is installed.
+    Other formats can be provided as a dictionary of names to formatters.
+
+    Input data is converted by the default formatter.
+    """
+
+    meta_keys = ('format',)
+
+    def __init__(self, formats=None, default='json') -> None:
+
+        if formats is None:
+
+            formats = {'json': FastJSONFormatter()}
+
+            if msgpack is not None:
+
+                formats['msgpack'] = MsgPackFormatter()
+
+        self.formats = formats  # Dictionary of format names to formatters
+        self.default = formats[default]  # Formatter used if no format is requested
+
+    @property
+    def cache_key(self):
+        """
+        Key our conversions are stored under in a ConversionCache.
+
+        We share our conversions with the default formatter.
+
+        :return: Key to use
+        :rtype: Any
+        """
+
+        return self.default.cache_key
+
+    def convert(self, data):
+        """
+        Converts input data using the default formatter.
+
+        :param data: Data to be converted
+        :type data: Any
+        :return: Converted data
+        :rtype: Any
+        """
+
+        return self.default.convert(data)
+
+    def revert(self, data):
+        """
+        Reverts output data using the default formatter.
+
+        :param data: Data to be reverted
+        :type data: Any
+        :return: Reverted data
+        :rtype: Any
+        """
+
+        return self.default.revert(data)
+
+    def revert_for(self, data, meta):
+        """
+        Reverts output data in the format requested in the metadata.
+
+        :param data: Data to be reverted
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Reverted data
+        :rtype: Any
+        """
+
+        return self.formats.get(meta.get('format') if meta else None, self.default).revert(data)
+
+
 class Base64Formatter(BaseFormatter):
     """
     Base64Formatter - Converts and reverts data in Base64!
@@ -127,7 +498,7 @@ class Base64Formatter(BaseFormatter):
         :rtype: str
         """
 
-        return base64.b64encode(data)
+        return base64.b64encode(data).decode('ascii')
 
 
 class Base64ImageFormatter(Base64Formatter):
@@ -161,3 +532,214 @@ class Base64ImageFormatter(Base64Formatter):
         """
 
         return 'data:image/jpeg;base64,' + super().revert(data)
+
+
+class BinaryImageFormatter(BaseFormatter):
+    """
+    BinaryImageFormatter - Converts and reverts raw image bytes!
+
+    Clients can send frames as binary websocket messages,
+    which carry the raw bytes of the image instead of a Base64 data URI.
+    We hand back a memoryview of the bytes, so the image is never copied
+    before it reaches the decoder.
+
+    Frames sent as Base64 data URIs are still accepted,
+    in which case we decode them like the Base64ImageFormatter.
+    """
+
+    def convert(self, data) -> memoryview:
+        """
+        Gets a view of the image bytes.
+
+        :param data: Raw image bytes, or a Base64 data URI
+        :type data: bytes
+        :return: View of the image bytes
+        :rtype: memoryview
+        """
+
+        if isinstance(data, str):
+
+            # Sent as text, decode it:
+
+            data = base64.b64decode(data.split(',')[1])
+
+        return memoryview(data)
+
+    def revert(self, data) -> bytes:
+        """
+        Gets the bytes of the image, to be sent as a binary message.
+
+        :param data: Image bytes to be processed
+        :type data: bytes
+        :return: Bytes of the image
+        :rtype: bytes
+        """
+
+        return bytes(data)
+
+
+class ImageArrayFormatter(Base64ImageFormatter):
+    """
+    ImageArrayFormatter - Converts images into numpy arrays!
+
+    We decode the Base64 image like the Base64ImageFormatter,
+    and then decode the image itself into an RGB numpy array.
+    The bytes of the image are shared with any Base64ImageFormatter
+    used in the same dispatch.
+
+    Raw image bytes (sent as binary websocket messages) are handed
+    straight to the decoder, and are shared with any BinaryImageFormatter
+    used in the same dispatch.
+
+    The arrays we return are read only,
+    as they may be shared between handlers.
+
+    We require numpy and Pillow to be installed.
+    """
+
+    def __init__(self) -> None:
+
+        if np is None:
+
+            raise ImportError("ImageArrayFormatter requires numpy and Pillow!")
+
+    def convert(self, data: str):
+        """
+        Decodes the image into a numpy array.
+
+        :param data: Data to be processed
+        :type data: str
+        :return: RGB array of the image
+        :rtype: numpy.ndarray
+        """
+
+        if not isinstance(data, str):
+
+            # Raw image bytes, no need to decode Base64:
+
+            return self.decode(memoryview(data))
+
+        return self.decode(super().convert(data))
+
+    def convert_cached(self, data, cache=None):
+        """
+        Decodes the image into a numpy array, using the given cache if provided.
+
+        :param data: Data to be processed
+        :type data: str
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: RGB array of the image
+        :rtype: numpy.ndarray
+        """
+
+        if cache is None:
+
+            return self.convert(data)
+
+        def decode(dat):
+
+            if not isinstance(dat, str):
+
+                # Share the image bytes with any BinaryImageFormatter:
+
+                return self.decode(cache.get(BinaryImageFormatter, memoryview, dat))
+
+            # Share the image bytes with any Base64ImageFormatter:
+
+            return self.decode(cache.get(Base64ImageFormatter, super(ImageArrayFormatter, self).convert, dat))
+
+        return cache.get(self.cache_key, decode, data)
+
+    def decode(self, data: bytes):
+        """
+        Decodes the image bytes into a read only numpy array.
+
+        :param data: Bytes of the image
+        :type data: bytes or memoryview
+        :return: RGB array of the image
+        :rtype: numpy.ndarray
+        """
+
+        arr = np.asarray(Image.open(io.BytesIO(data)).convert('RGB'))
+
+        arr.setflags(write=False)
+
+        return arr
+
+    def revert(self, data) -> str:
+        """
+        Encodes the numpy array into a Base64 JPEG image.
+
+        :param data: Array to be processed
+        :type data: numpy.ndarray
+        :return: String of the Base64 image
+        :rtype: str
+        """
+
+        buff = io.BytesIO()
+
+        Image.fromarray(data).save(buff, format='JPEG')
+
+        return super().revert(buff.getvalue())
+
+
+class ScaledImageFormatter(ImageArrayFormatter):
+    """
+    ScaledImageFormatter - Converts images into numpy arrays at a reduced size!
+
+    Models often work with frames much smaller than the frames clients send,
+    so decoding every pixel only for the frame to be shrunk later is wasted work.
+    We ask the decoder for the smallest image that is still at least 'size',
+    which lets JPEG images be scaled down by 1/2, 1/4 or 1/8 while decoding
+    (by skipping the higher frequencies of each DCT block),
+    so less pixels are decoded, converted, and handed to the models.
+    Images that can't be scaled while decoding are decoded at full size.
+
+    The arrays we return are in RGB, and are read only.
+
+    :param size: Minimum width and height of the decoded image
+    :type size: tuple
+    """
+
+    def __init__(self, size=(360, 360)) -> None:
+
+        super().__init__()
+
+        self.size = tuple(size)  # Minimum width and height of the decoded image
+
+    @property
+    def cache_key(self):
+        """
+        Key our conversions are stored under in a ConversionCache.
+
+        Images decoded at different sizes are stored separately.
+
+        :return: Key to use
+        :rtype: Any
+        """
+
+        return type(self), self.size
+
+    def decode(self, data):
+        """
+        Decodes the image bytes into a read only numpy array,
+        scaling the image down while decoding where possible.
+
+        :param data: Bytes of the image
+        :type data: bytes or memoryview
+        :return: RGB array of the image
+        :rtype: numpy.ndarray
+        """
+
+        image = Image.open(io.BytesIO(data))
+
+        # Only scale down, never below our size:
+
+        image.draft('RGB', self.size)
+
+        arr = np.asarray(image.convert('RGB'))
+
+        arr.setflags(write=False)
+
+        return arr
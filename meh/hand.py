@@ -5,10 +5,23 @@ The class of most interest to most people is the BaseHandler,
 which offers an abstract base class that people can use to create 
 their own handlers that can be loaded into the HandlerCollection.
 
+We also offer the AsyncHandler, which is identical to the BaseHandler,
+except that the 'handle()' method is a coroutine.
+
 This file also contains other misc. handlers that may be useful in development!
 """
 
+import asyncio
+import contextvars
+
 from meh.formatters import BaseFormatter
+from meh.cache import MISS, frame_hash
+
+# Metadata of the request being handled, shared by all handlers.
+# Context variables are never freed from the contexts that hold them,
+# so we use a single one instead of one for each handler:
+
+_meta = contextvars.ContextVar('meh_meta', default={})
 
 
 class BaseHandler(object):
@@ -55,20 +68,96 @@ class BaseHandler(object):
 
     Event handlers MUST be loaded into a HandlerCollection class to be properly used!
     If these handlers are used discreetly, then certain components may fail to work.
+
+    Handlers can define a priority using the 'priority' class parameter.
+    Handlers with a higher priority are ran before handlers with a lower one.
+
+    Handlers can define an ExecutionPolicy using the 'policy' class parameter.
+    If a policy is defined, then the HandlerCollection will run this handler
+    in a dedicated pool, which is available under 'pool' while we are running.
+
+    Handlers can opt into batching by defining the 'batch_size' class parameter.
+    If defined, then the HandlerCollection will collect requests
+    from all callers and pass them to 'handle_batch()' in batches of up to
+    'batch_size' requests, waiting at most 'batch_timeout' seconds for a batch to fill.
+    Any ExecutionPolicy defined is used only for it's 'max_in_flight' limit,
+    as batches are handled one at a time in a thread of their own.
+
+    While running, each handler is guarded by a CircuitBreaker.
+    If we fail 'breaker_threshold' times within 'breaker_window' seconds,
+    then we are skipped for 'breaker_cooldown' seconds.
+
+    Handlers that define a 'timeout' are only waited on for that many seconds,
+    after which the HandlerCollection sends back it's 'late' response instead.
+    Keep in mind, the handler is not interrupted, it's response is just ignored.
+    Handlers that run past their 'timeout' count as failures with the circuit breaker,
+    handlers that run past the deadline of the request do not.
+    Handlers without a 'timeout' or pool are ran in the calling thread,
+    so the deadline of the request is only checked once they return.
+
+    Handlers can opt into caching their responses by defining 'cache_size'.
+    While we are running, our responses are remembered for 'cache_ttl' seconds
+    in the ResultCache under 'results', keyed by 'result_key()'.
+    By default, this is a perceptual hash of the converted data,
+    and the values of the 'cache_meta' keys in the metadata.
+    If similar data is handled again, then the remembered response is returned,
+    and we are not called at all!
+    Handlers that MUST NOT answer similar frames alike can set 'cache_hash_size' to None,
+    so only identical frames share a response.
+
+    Handlers that acquire resources from the ResourceRegistry that can change on disk,
+    such as a model that is trained again, should list their names in the 'resources' class parameter.
+    When the module of a handler is reloaded, these resources are refreshed,
+    so the new handler gets a new copy, while the old handler keeps it's copy until it is stopped.
+
+    The metadata of the request being handled is available under 'meta'.
+    This value is stored in a context variable shared by all handlers,
+    so each thread or asyncio task that is handling a request
+    will only see the metadata for it's own request.
     """
 
     ids = []  # List of IDs to bind this handler to
+    priority = 0  # Priority of this handler, higher priorities are ran first
+    policy = None  # ExecutionPolicy to run this handler with, None for the calling thread
+    batch_size = None  # Maximum number of requests to handle in one batch, None to disable batching
+    batch_timeout = 0.05  # Maximum time in seconds to wait for a batch to fill
+    breaker_threshold = 5  # Number of failures that opens our circuit breaker, None to disable
+    breaker_window = 10.0  # Window in seconds failures are counted in
+    breaker_cooldown = 30.0  # Time in seconds we are skipped once the breaker opens
+    timeout = None  # Maximum time in seconds we are waited on, None to wait forever
+    cache_size = None  # Maximum number of responses to remember, None to disable caching
+    cache_ttl = 1.0  # Time in seconds responses are remembered for
+    cache_meta = ()  # Metadata keys that are a part of the cache key
+    cache_hash_size = 8  # Size of the grid used for hashing frames, None to hash their exact content
+    resources = ()  # Names of the registry resources to refresh when our module is reloaded
 
     def __init__(self, name='', convert=BaseFormatter(), revert=BaseFormatter()) -> None:
 
         self.name = name  # Friendly name of this module
         self.running = False  # Value determining if this module us running
         self.collection = None  # Instance of the ModuleCollection we are bound to
+        self.pool = None  # HandlerPool (or BatchScheduler) we are ran in, if we have a policy or batch size
+        self.breaker = None  # CircuitBreaker guarding us while we are running
+        self.results = None  # ResultCache of our responses, if caching is enabled
 
         self.convert = convert  # Formatter used for conversion
         self.revert = revert  # Formatter used for reverting
-        
-        self.meta = {}  # Metadata for each request given
+
+    @property
+    def meta(self) -> dict:
+        """
+        Metadata for the request currently being handled.
+
+        :return: Metadata of the request
+        :rtype: dict
+        """
+
+        return _meta.get()
+
+    @meta.setter
+    def meta(self, meta: dict):
+
+        _meta.set(meta)
 
     def start(self):
         """
@@ -161,15 +250,22 @@ class BaseHandler(object):
 
         raise NotImplementedError("This method should be overridden in the child class!")
 
-    def _meta_handle(self, data, meta):
+    def _meta_handle(self, data, meta, cache=None):
         """
         Meta handle method.
 
         This method does all the work
         of calling the formatters and the handle method.
 
+        If a ConversionCache is provided, then our conversion
+        is shared with the other handlers in the same dispatch.
+
         :param data: Data to be formatted
         :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
         :return: Data to be sent over a websocket
         :rtype: Any
         """
@@ -178,15 +274,504 @@ class BaseHandler(object):
 
         # Convert the in data:
 
-        conv = self.convert.convert(data)
+        conv = self.convert.convert_cached(data, cache)
+
+        if self.results is None:
+
+            # No result cache, handle and revert the data:
+
+            return self.revert.revert_for(self.handle(conv), meta)
+
+        # Check if we have a response already:
+
+        key, out = self._lookup(conv, meta)
+
+        if out is not MISS:
+
+            return out
 
         # Handle the in data:
 
         out = self.handle(conv)
 
-        # Revert and return the data:
+        # Revert, remember, and return the data:
+
+        out = self.revert.revert_for(out, meta)
+
+        self._remember(key, out)
+
+        return out
+
+    def _meta_handle_plain(self, data, meta, cache=None):
+        """
+        Meta handle method for handlers that do not format their data.
+
+        We do the same work as '_meta_handle()',
+        but we skip the formatters, as a plain BaseFormatter
+        returns the data it receives.
+        The HandlerCollection only uses this method if both of our formatters
+        are plain BaseFormatters and we have no ResultCache.
+
+        :param data: Data to be handled
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch, unused
+        :type cache: ConversionCache
+        :return: Data to be sent over a websocket
+        :rtype: Any
+        """
+
+        _meta.set(meta)
+
+        return self.handle(data)
+
+    def handle_batch(self, data, meta):
+        """
+        Method called when there is a batch of data to be handled.
+
+        This method is only used if batching is enabled using 'batch_size'.
+        We are given a list of data and a list of metadata,
+        and MUST return a list of responses in the same order.
+        An exception instance can be returned in place of a response
+        if only a single item in the batch fails.
+
+        By default, we call 'handle()' for each item,
+        which offers no speedup!
+        Handlers that enable batching should override this method
+        to process the entire batch at once.
+
+        :param data: List of data to be processed
+        :type data: list
+        :param meta: List of metadata for each item
+        :type meta: list
+        :return: List of responses
+        :rtype: list
+        """
+
+        final = []
+
+        for dat, met in zip(data, meta):
+
+            self.meta = met
+
+            final.append(self.handle(dat))
+
+        return final
+
+    def _meta_handle_batch(self, data, meta, converted=False):
+        """
+        Meta handle method for batches.
+
+        This method does all the work of calling the formatters
+        for each item, and the handle_batch method.
+        Items that fail are given the exception instead of a response.
+
+        If the data is not yet converted, then we check our ResultCache
+        for each item, and only handle the items we have no response for.
+        Otherwise, the caller is expected to check the cache itself.
+
+        :param data: List of data to be formatted
+        :type data: list
+        :param meta: List of metadata for each item
+        :type meta: list
+        :param converted: Value determining if the data has already been converted
+        :type converted: bool
+        :return: List of data to be sent over a websocket, or exceptions
+        :rtype: list
+        """
+
+        results, indices, items, metas = self._convert_batch(data, meta, converted)
+        keys = None
+
+        if not converted:
+
+            # Check if we have responses already:
+
+            keys = self._lookup_batch(results, indices, items, metas)
+
+        if items:
+
+            # Handle the batch:
+
+            try:
+
+                out = self.handle_batch(items, metas)
+
+            except Exception as e:
+
+                out = [e] * len(items)
+
+            self._revert_batch(results, indices, out, metas)
+
+            if keys is not None:
+
+                self._remember_batch(results, indices, keys)
+
+        return results
+
+    def _convert_batch(self, data, meta, converted=False):
+        """
+        Converts each item in a batch.
+
+        :param data: List of data to be converted
+        :type data: list
+        :param meta: List of metadata for each item
+        :type meta: list
+        :param converted: Value determining if the data has already been converted
+        :type converted: bool
+        :return: Results list, indices of converted items, converted items, and their metadata
+        :rtype: tuple
+        """
+
+        if converted:
+
+            # Nothing to do:
+
+            return [None] * len(data), list(range(len(data))), data, meta
+
+        results = [None] * len(data)
+        indices = []
+        items = []
+        metas = []
+
+        for num, (dat, met) in enumerate(zip(data, meta)):
+
+            try:
+
+                items.append(self.convert.convert(dat))
+
+            except Exception as e:
+
+                results[num] = e
+
+                continue
+
+            indices.append(num)
+            metas.append(met)
+
+        return results, indices, items, metas
+
+    def result_key(self, data, meta):
+        """
+        Determines the key our response to the given data is cached under.
+
+        By default, we use a perceptual hash of the converted data,
+        and the values of the 'cache_meta' keys in the metadata,
+        as well as the 'meta_keys' of our revert formatter
+        (as they change the response that is sent).
+        Handlers can override this method to use something else.
+
+        :param data: Converted data to be handled
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Key to cache the response under, None to not cache the response
+        :rtype: Any
+        """
+
+        frame = frame_hash(data, self.cache_hash_size)
+
+        if frame is None:
+
+            return None
+
+        return (frame,) + tuple(meta.get(key) if meta else None for key in self.cache_meta + self.revert.meta_keys)
+
+    def _lookup(self, data, meta):
+        """
+        Checks our ResultCache for a response to the given data.
+
+        :param data: Converted data to be handled
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :return: Key of the response, and the response (MISS if not found)
+        :rtype: tuple
+        """
+
+        if self.results is None:
+
+            return None, MISS
+
+        key = self.result_key(data, meta)
+
+        if key is None:
+
+            return None, MISS
+
+        return key, self.results.get(key)
+
+    def _remember(self, key, out):
+        """
+        Stores the given response in our ResultCache.
+
+        :param key: Key of the response, None to not store the response
+        :type key: Any
+        :param out: Reverted response to store
+        :type out: Any
+        """
+
+        results = self.results
+
+        if key is not None and results is not None:
+
+            results.put(key, out)
+
+    def _lookup_batch(self, results, indices, items, metas):
+        """
+        Checks our ResultCache for a response to each item in a batch.
+
+        Items we have a response for are added to the results list,
+        and removed from the indices, items and metadata lists.
+
+        :param results: Results list to fill
+        :type results: list
+        :param indices: Indices of each item in the results list
+        :type indices: list
+        :param items: Converted items to be handled
+        :type items: list
+        :param metas: Metadata for each item
+        :type metas: list
+        :return: Key of each item left to be handled, None if caching is disabled
+        :rtype: list
+        """
+
+        if self.results is None:
+
+            return None
+
+        keys = []
+        num = 0
+
+        while num < len(items):
+
+            key, out = self._lookup(items[num], metas[num])
+
+            if out is not MISS:
+
+                # Found a response, no need to handle this item:
+
+                results[indices.pop(num)] = out
+
+                del items[num]
+                del metas[num]
+
+                continue
+
+            keys.append(key)
+
+            num += 1
+
+        return keys
+
+    def _remember_batch(self, results, indices, keys):
+        """
+        Stores the responses of a batch in our ResultCache.
+
+        Items that failed are not stored.
+
+        :param results: Results list
+        :type results: list
+        :param indices: Indices of each handled item in the results list
+        :type indices: list
+        :param keys: Key of each handled item
+        :type keys: list
+        """
+
+        for num, key in zip(indices, keys):
+
+            if not isinstance(results[num], Exception):
+
+                self._remember(key, results[num])
+
+    def _revert_batch(self, results, indices, out, metas):
+        """
+        Reverts each response in a batch into the results list.
+
+        :param results: Results list to fill
+        :type results: list
+        :param indices: Indices of each response in the results list
+        :type indices: list
+        :param out: List of responses to revert
+        :type out: list
+        :param metas: Metadata of each response
+        :type metas: list
+        """
+
+        for num, res, met in zip(indices, out, metas):
+
+            if isinstance(res, Exception):
+
+                results[num] = res
+
+                continue
+
+            try:
+
+                results[num] = self.revert.revert_for(res, met)
+
+            except Exception as e:
+
+                results[num] = e
+
+
+class AsyncHandler(BaseHandler):
+    """
+    AsyncHandler - Class asynchronous handlers should inherit!
+
+    We are identical to the BaseHandler,
+    except that the 'handle()' method is a coroutine.
+    This is great for handlers that spend most of their time waiting,
+    such as handlers that work with the network or a database.
+
+    When used with 'HandlerCollection.handle_async()',
+    we are awaited natively on the event loop.
+    When used with 'HandlerCollection.handle()',
+    we are ran to completion in a new event loop,
+    so we MUST NOT be called synchronously from a thread
+    that already has a running event loop!
+    """
+
+    async def handle(self, data):
+        """
+        Coroutine called when their is data to be handled.
+
+        We raise a NotImplementedError, as this functionality
+        should be overridden in the child classes.
+
+        :param data: Data to be processed
+        :type data: Any
+        """
+
+        raise NotImplementedError("This method should be overridden in the child class!")
+
+    async def _meta_handle_async(self, data, meta, cache=None):
+        """
+        Asynchronous meta handle method.
+
+        We do the same work as '_meta_handle()',
+        but we await the handle coroutine.
+
+        :param data: Data to be formatted
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data to be sent over a websocket
+        :rtype: Any
+        """
+
+        self.meta = meta
+
+        # Convert, handle, and revert the data:
+
+        conv = self.convert.convert_cached(data, cache)
+
+        key, out = self._lookup(conv, meta)
+
+        if out is not MISS:
+
+            return out
+
+        out = self.revert.revert_for(await self.handle(conv), meta)
+
+        self._remember(key, out)
+
+        return out
+
+    def _meta_handle(self, data, meta, cache=None):
+        """
+        Runs the asynchronous meta handle method to completion.
+
+        :param data: Data to be formatted
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data to be sent over a websocket
+        :rtype: Any
+        """
+
+        return asyncio.run(self._meta_handle_async(data, meta, cache))
+
+    async def handle_batch(self, data, meta):
+        """
+        Coroutine called when there is a batch of data to be handled.
+
+        By default, we await 'handle()' for each item.
+        See 'BaseHandler.handle_batch()' for more info.
+
+        :param data: List of data to be processed
+        :type data: list
+        :param meta: List of metadata for each item
+        :type meta: list
+        :return: List of responses
+        :rtype: list
+        """
+
+        final = []
+
+        for dat, met in zip(data, meta):
+
+            self.meta = met
+
+            final.append(await self.handle(dat))
+
+        return final
+
+    async def _meta_handle_batch_async(self, data, meta, converted=False):
+        """
+        Asynchronous meta handle method for batches.
+
+        :param data: List of data to be formatted
+        :type data: list
+        :param meta: List of metadata for each item
+        :type meta: list
+        :param converted: Value determining if the data has already been converted
+        :type converted: bool
+        :return: List of data to be sent over a websocket, or exceptions
+        :rtype: list
+        """
+
+        results, indices, items, metas = self._convert_batch(data, meta, converted)
+        keys = None if converted else self._lookup_batch(results, indices, items, metas)
+
+        if items:
+
+            try:
+
+                out = await self.handle_batch(items, metas)
+
+            except Exception as e:
+
+                out = [e] * len(items)
+
+            self._revert_batch(results, indices, out, metas)
+
+            if keys is not None:
+
+                self._remember_batch(results, indices, keys)
+
+        return results
+
+    def _meta_handle_batch(self, data, meta, converted=False):
+        """
+        Runs the asynchronous batch meta handle method to completion.
+
+        :param data: List of data to be formatted
+        :type data: list
+        :param meta: List of metadata for each item
+        :type meta: list
+        :param converted: Value determining if the data has already been converted
+        :type converted: bool
+        :return: List of data to be sent over a websocket, or exceptions
+        :rtype: list
+        """
 
-        return self.revert.revert(out)
+        return asyncio.run(self._meta_handle_batch_async(data, meta, converted))
 
 
 class NullHandler(BaseHandler):
@@ -5,7 +5,7 @@ Handlers that are here for demo purposes.
 import traceback
 
 from meh.hand import BaseHandler, PrintHandler, RaiseHandler
-from meh.formatters import BaseFormatter, JSONFormatter
+from meh.formatters import BaseFormatter, NegotiatedFormatter
 
 
 class DummyHandler(BaseHandler):
@@ -24,7 +24,7 @@ class DummyHandler(BaseHandler):
 
     def __init__(self):
 
-        super().__init__(name='Dummy Handler', convert=BaseFormatter(), revert=JSONFormatter())
+        super().__init__(name='Dummy Handler', convert=BaseFormatter(), revert=NegotiatedFormatter())
 
     def handle(self, data):
         """
@@ -67,7 +67,7 @@ class DummyErrorHandler(PrintHandler):
     ids = [BaseException]
 
     def __init__(self) -> None:
-        super().__init__(name='DummyErrorHandler', revert=JSONFormatter())
+        super().__init__(name='DummyErrorHandler', revert=NegotiatedFormatter())
 
     def handle(self, data: dict):
         """
@@ -86,7 +86,12 @@ class DummyErrorHandler(PrintHandler):
 
         print(data['excp'])
 
+        if data.get('suppressed'):
+
+            print("Suppressed {} similar errors since the last one".format(data['suppressed']))
+
         return {
             'msg': 'We encountered an error!',
-            'excp': str(data['excp'])
+            'excp': str(data['excp']),
+            'suppressed': data.get('suppressed', 0)
         }
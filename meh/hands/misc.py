@@ -13,6 +13,7 @@ from oauth2client.service_account import ServiceAccountCredentials
 
 from attendanceapp.models import Person, Group
 from meh.hand import BaseHandler
+from meh.pools import ExecutionPolicy
 
 
 class SheetsSync(BaseHandler):
@@ -21,9 +22,13 @@ class SheetsSync(BaseHandler):
     
     We are designed to do this process on demand.
     This process will likely be scheduled to run automatically.
+
+    We run in our own thread, and only one sync may be in flight at once,
+    so a slow sync never holds up the recognition handlers.
     """
     
     ids = ['sync']
+    policy = ExecutionPolicy(ExecutionPolicy.THREAD, workers=1, max_in_flight=1)
     
     def __init__(self, path='credentials.json', url='https://docs.google.com/spreadsheets/d/1ACc_c67UGzhEs3M0a9XFuhQ8ltPV46mreeYqSFsTAB8', group='msuai') -> None:
         
@@ -3,22 +3,79 @@ Event handlers used for recognizing items in pictures!
 
 We provide the HandRecognize and FaceRecognize handlers,
 which will be bound to the IDs 'face' and 'hand' respectively.   
+
+Each handler batches frames in a thread of it's own,
+so a backlog of one kind of frame does not hold up the other.
+If 'RECOG_WORKERS' is set in the MEH settings, then each handler is instead
+ran in that many worker processes, with frames passed through shared memory.
+The hand models are acquired from the ResourceRegistry
+when the HandRecognize handler is started, and released when it is stopped,
+so they are shared with the rest of the process and only loaded while in use.
+Reloading this module loads the gesture model again, so a retrained model is picked up.
+Each handler works with a FrameAnalyzer of it's own built around these models.
+Frames (sent as text or binary) are decoded into RGB numpy arrays by the ScaledImageFormatter,
+which scales them down to about the standard size of the FrameAnalyzer while decoding,
+so a frame sent to both handlers is only decoded once, and never at full size.
 """
 
 import numpy as np
-import io
-import PIL
 
+from django.conf import settings
+from django.db import connections
 from django.utils import timezone
 
 from meh.hand import BaseHandler
-from meh.formatters import Base64ImageFormatter, JSONFormatter
+from meh.pools import ExecutionPolicy
+from meh.resources import registry
+from meh.quantize import quantize
+from meh.formatters import ScaledImageFormatter, NegotiatedFormatter
 
 from interaction.frame_analyzer import FrameAnalyzer
+from interaction.face import FaceClassifier
 
 from attendanceapp.models import Person, Group, AttendanceEvent
 
-frame_ana = FrameAnalyzer()
+import attendanceapp.resources  # Registers the models we use
+
+# Number of worker processes to run each handler in, 0 to run each in a thread:
+
+WORKERS = getattr(settings, 'MEH', {}).get('RECOG_WORKERS', 0)
+
+
+def _policy() -> ExecutionPolicy:
+    """
+    Creates the ExecutionPolicy used by our handlers.
+
+    If worker processes are configured, then frames are passed to them
+    through shared memory, otherwise we use a single thread.
+
+    :return: Policy to use
+    :rtype: ExecutionPolicy
+    """
+
+    if WORKERS:
+
+        return ExecutionPolicy(ExecutionPolicy.SHARED, workers=WORKERS, max_in_flight=64)
+
+    return ExecutionPolicy(ExecutionPolicy.THREAD, workers=1, max_in_flight=64)
+
+
+def _pack_box(box: tuple, shape: tuple) -> bytes:
+    """
+    Packs the given face box, relative to the frame.
+
+    :param box: Box of the face as (top, right, bottom, left) in pixels
+    :type box: tuple
+    :param shape: Shape of the frame
+    :type shape: tuple
+    :return: Box as (left, top, right, bottom), packed
+    :rtype: bytes
+    """
+
+    top, right, bottom, left = box
+    height, width = shape[:2]
+
+    return quantize((left / width, top / height, right / width, bottom / height))
 
 
 class HandRecognize(BaseHandler):
@@ -26,50 +83,99 @@ class HandRecognize(BaseHandler):
     Attempts to recognize hand gestures in the given video frames.
 
     We are bound to the 'hand' ID.
+
+    Frames are handled in batches, so the gesture model
+    is only called once for many frames.
+    Responses to similar frames are cached for a short time,
+    as gestures change quickly.
+
+    If 'overlay' is True in the metadata, then we also send back
+    the 21 landmarks of the hand under 'landmarks',
+    as (x, y) pairs relative to the frame, packed using 'meh.quantize'
+    (84 bytes, None if no hand is found).
     """
 
     ids = ['hand']
+    policy = _policy()
+    batch_size = 16
+    batch_timeout = 0.02
+    cache_size = 256
+    cache_ttl = 0.5
+    cache_meta = ('overlay',)
+    cache_hash_size = 16
+    resources = ('gesture_model',)
 
     def __init__(self) -> None:
 
-        super().__init__(name="HandRecognize", convert=Base64ImageFormatter(), revert=JSONFormatter())
+        super().__init__(name="HandRecognize", convert=ScaledImageFormatter(FrameAnalyzer.standard_size), revert=NegotiatedFormatter())
+
+        self.analyzer = None  # FrameAnalyzer built around the shared models
 
-    def handle(self, data: bytes):
+    def start(self):
+        """
+        Acquire the hand models, and build our FrameAnalyzer.
         """
-        Checks for hand gestures in the given frame.
 
-        We return a list of labels, and coordinates for each label.
+        self.analyzer = FrameAnalyzer(init_classifiers=False, init_mp_hands=False)
+
+        self.analyzer.hand_classifier = registry.acquire('gesture_model')
+        self.analyzer.mp_hands = registry.acquire('mp_hands')
+
+    def stop(self):
+        """
+        Release the hand models.
+        """
+
+        analyzer, self.analyzer = self.analyzer, None
+
+        registry.release('mp_hands', analyzer.mp_hands)
+        registry.release('gesture_model', analyzer.hand_classifier)
+
+    def handle(self, data: np.ndarray):
+        """
+        Checks for hand gestures in the given frame.
 
         :param data: Frame to check
-        :type data: bytes
+        :type data: numpy.ndarray
         :return: Data of hand gestures
         :rtype: dict
         """
 
-        # Convert the image into something we can use:
+        return self.handle_batch([data], [self.meta])[0]
+
+    def handle_batch(self, data: list, meta: list):
+        """
+        Checks for hand gestures in each of the given frames.
+
+        :param data: Frames to check, as numpy arrays
+        :type data: list
+        :param meta: Metadata for each frame
+        :type meta: list
+        :return: Data of hand gestures for each frame
+        :rtype: list
+        """
+
+        # Load the frames into the analyzer and get the results:
 
-        frame = np.array(PIL.Image.open(io.BytesIO(data)))
+        with registry.lock('mp_hands'):
 
-        # Load the frame into the analyzer:
+            results = self.analyzer.recognize_hand_batch(data, 'RGB')
 
-        frame_ana.set_frame(frame, 'BGR')
+        final = []
 
-        # Get the result:
+        for result, met in zip(results, meta):
 
-        result = frame_ana.recognize_hand()
+            out = {'hand': None if result is None else result.gesture}
 
-        print("Hand result: {}".format(result))
-        print("Type: {}".format(type(result)))
+            if met and met.get('overlay'):
 
-        if result is None:
-            
-            # No result! Return nothing:
-            
-            return {'hand': None}
+                # Send the landmarks, packed:
 
-        return {
-            'hand': result.gesture,
-        }
+                out['landmarks'] = None if result is None or result.points is None else quantize(result.points[['x', 'y']].to_numpy())
+
+            final.append(out)
+
+        return final
 
 
 class FaceRecognize(BaseHandler):
@@ -77,84 +183,173 @@ class FaceRecognize(BaseHandler):
     Attempts to recognize faces in the given images.
 
     We are bound to the 'face' id.
+
+    Frames are handled in batches, the known faces of each group
+    are only loaded once per batch, and all faces in a group
+    are matched at once.
+    Responses to identical frames from the same group are cached,
+    so a frame sent again is not matched (and logged) twice.
+    Frames that are merely similar are never answered from the cache,
+    as two people can look alike to a perceptual hash.
+
+    If 'overlay' is True in the metadata, then we also send back
+    the box around the face under 'box', as (left, top, right, bottom)
+    relative to the frame, packed using 'meh.quantize'
+    (8 bytes, None if no face is found).
     """
 
     ids = ['face']
+    policy = _policy()
+    batch_size = 8
+    batch_timeout = 0.05
+    cache_size = 256
+    cache_ttl = 2.0
+    cache_meta = ('group', 'overlay')
+    cache_hash_size = None
 
     def __init__(self) -> None:
-        super().__init__(name="FaceRecognize", convert=Base64ImageFormatter(), revert=JSONFormatter())
+        super().__init__(name="FaceRecognize", convert=ScaledImageFormatter(FrameAnalyzer.standard_size), revert=NegotiatedFormatter())
+
+        self.analyzer = None  # FrameAnalyzer used to match faces
 
     def start(self):
         """
-        Create any necessary components.
+        Build our FrameAnalyzer.
+
+        The face classifier holds no state of it's own,
+        so it is not shared through the registry.
         """
-        
-        # Load the face encodings:
 
-        self.encodings = []
+        # Database connections can't be shared with a parent process,
+        # when ran in a thread they are still in use by the rest of the server:
 
-    def handle(self, data: bytes):
+        if self.policy.kind in (ExecutionPolicy.SHARED, ExecutionPolicy.PROCESS):
+
+            connections.close_all()
+
+        self.analyzer = FrameAnalyzer(init_classifiers=False, init_mp_hands=False)
+
+        self.analyzer.face_classifier = FaceClassifier()
+
+    def stop(self):
+        """
+        Drop our FrameAnalyzer.
         """
-        Checks for hand gestures in the given frame.
-        
-        We return a list of labels, and coordinates for each label.
+
+        self.analyzer = None
+
+    def handle(self, data: np.ndarray):
+        """
+        Checks for known faces in the given frame.
 
         :param data: Frame to check
-        :type data: bytes
-        :return: Data of hand gestures
+        :type data: numpy.ndarray
+        :return: Name of the person found
         :rtype: dict
+        :raise: Group.DoesNotExist: If the group of the frame does not exist
         """
-        
-        # This is probably inefficient!
 
-        # Get the group we are working with:
+        out = self.handle_batch([data], [self.meta])[0]
 
-        group = Group.objects.get(name=self.meta['group'] if 'group' in self.meta else 'msuai')
+        if isinstance(out, Exception):
 
-        # Get list of people:
+            raise out
 
-        people = group.person_set.all()
+        return out
 
-        encodings = []
-        names = []
+    def handle_batch(self, data: list, meta: list):
+        """
+        Checks for known faces in each of the given frames.
+
+        Each person we find is logged as attending.
+        The groups of the batch are looked up at once,
+        frames for a group that does not exist get a Group.DoesNotExist exception,
+        without failing the other frames in the batch.
+
+        :param data: Frames to check, as numpy arrays
+        :type data: list
+        :param meta: Metadata for each frame
+        :type meta: list
+        :return: Name of the person found in each frame, or an exception
+        :rtype: list
+        """
 
-        for per in people:
+        # Split the frames by group:
+
+        groups = {}
+
+        for num, met in enumerate(meta):
+
+            groups.setdefault(met.get('group', 'msuai') if met else 'msuai', []).append(num)
+
+        final = [None] * len(data)
+
+        found = {group.name: group for group in Group.objects.filter(name__in=list(groups))}
+
+        for name, nums in groups.items():
+
+            if name not in found:
+
+                # Unknown group, fail only these frames:
+
+                for num in nums:
+
+                    final[num] = Group.DoesNotExist("Group {} does not exist!".format(name))
 
-            if not per.encodings:
-                
                 continue
 
-            encodings.append(per.encodings)
-            names.append(per.name)
+            # Get the people in the group, and their encodings:
+
+            people, encodings = self._get_people(found[name])
+
+            # Load the frames into the analyzer and get the results:
+
+            results, boxes = self.analyzer.recognize_face_batch([data[num] for num in nums], 'RGB', encodings, return_boxes=True)
+
+            for num, result, box in zip(nums, results, boxes):
+
+                if result is None or result < 0:
 
-        # Convert the image into something we can use:
+                    # No face found! Return nothing:
 
-        frame = np.array(PIL.Image.open(io.BytesIO(data)))
+                    final[num] = {'name': 'unknown'}
 
-        # Load the frame into the analyzer:
+                else:
 
-        frame_ana.set_frame(frame, 'BGR')
+                    # Add a date event to the person:
 
-        # Get the result:
+                    AttendanceEvent(person=people[result], event_date=timezone.now()).save()
 
-        result = frame_ana.recognize_face(encodings)
+                    final[num] = {'name': people[result].name}
 
-        print(result)
+                if meta[num] and meta[num].get('overlay'):
 
-        if result is None:
+                    # Send the box, packed:
 
-            # No face found! Return nothing:
+                    final[num]['box'] = None if box is None else _pack_box(box, data[num].shape)
 
-            return {
-                'name': 'unknown',
-            }
+        return final
 
-        # Add a date event to the person:
+    def _get_people(self, group: Group):
+        """
+        Gets the people in the given group that have a face encoding.
+
+        :param group: Group to get the people of
+        :type group: Group
+        :return: List of people and list of their encodings
+        :rtype: tuple
+        """
+
+        people = []
+        encodings = []
 
-        date = AttendanceEvent(person=names[result], event_date=timezone.now())
+        for per in group.person_set.all():
 
-        date.save()
+            if not per.encodings:
+                
+                continue
+
+            people.append(per)
+            encodings.append(per.encodings)
 
-        return {
-            'name': names[result].name
-        }
+        return people, encodings
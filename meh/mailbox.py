@@ -0,0 +1,193 @@
+"""
+This file contains components for keeping only the latest frame.
+
+Clients send frames at their own pace, which may be faster than we can handle them.
+If every frame is queued, then the queue (and the latency of each response)
+grows without bound, and we spend our time on frames that are long out of date.
+
+A mailbox holds at most one frame.
+A new frame replaces a frame that has not been taken yet,
+and the frame that was replaced is counted as dropped.
+Whoever handles frames always takes the latest one.
+
+We offer the Mailbox for threads, and the AsyncMailbox for coroutines.
+"""
+
+import asyncio
+import threading
+
+from typing import Any, Optional
+
+_EMPTY = object()  # Value held by an empty mailbox
+
+
+class Mailbox(object):
+    """
+    Mailbox - Holds the latest item, for use between threads
+
+    'put()' never blocks, and replaces any item that was not taken.
+    'take()' blocks until there is an item, or the mailbox is closed.
+
+    We keep count of the items received, and the items dropped.
+    """
+
+    def __init__(self) -> None:
+
+        self.item = _EMPTY  # Item waiting to be taken
+        self.closed = False  # Value determining if we are closed
+
+        self.received = 0  # Number of items put in the mailbox
+        self.dropped = 0  # Number of items replaced before they were taken
+
+        self.cond = threading.Condition()
+
+    def put(self, item: Any) -> bool:
+        """
+        Puts the given item in the mailbox, replacing any item waiting.
+
+        :param item: Item to put
+        :type item: Any
+        :return: True if an item was replaced
+        :rtype: bool
+        """
+
+        with self.cond:
+
+            replaced = self.item is not _EMPTY
+
+            self.item = item
+
+            self.received += 1
+            self.dropped += replaced
+
+            self.cond.notify()
+
+            return replaced
+
+    def take(self, timeout: Optional[float]=None) -> Any:
+        """
+        Takes the item in the mailbox, waiting for one if necessary.
+
+        :param timeout: Maximum time in seconds to wait, None to wait forever
+        :type timeout: float
+        :return: Item taken, None if we are closed or timed out
+        :rtype: Any
+        """
+
+        with self.cond:
+
+            self.cond.wait_for(lambda: self.item is not _EMPTY or self.closed, timeout)
+
+            if self.item is _EMPTY:
+
+                return None
+
+            item, self.item = self.item, _EMPTY
+
+            return item
+
+    def close(self):
+        """
+        Closes the mailbox, waking up anyone waiting.
+
+        Any item waiting is dropped.
+        """
+
+        with self.cond:
+
+            self.closed = True
+            self.item = _EMPTY
+
+            self.cond.notify_all()
+
+    def stats(self) -> dict:
+        """
+        Returns stats about this mailbox.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        return {
+            'received': self.received,
+            'dropped': self.dropped,
+            'waiting': self.item is not _EMPTY,
+        }
+
+
+class AsyncMailbox(Mailbox):
+    """
+    AsyncMailbox - Holds the latest item, for use between coroutines
+
+    We are identical to the Mailbox, except that 'take()' is a coroutine,
+    and we MUST only be used from a single event loop.
+    """
+
+    def __init__(self) -> None:
+
+        super().__init__()
+
+        self.event = asyncio.Event()  # Set while there is an item, or we are closed
+
+    def put(self, item: Any) -> bool:
+        """
+        Puts the given item in the mailbox, replacing any item waiting.
+
+        :param item: Item to put
+        :type item: Any
+        :return: True if an item was replaced
+        :rtype: bool
+        """
+
+        replaced = self.item is not _EMPTY
+
+        self.item = item
+
+        self.received += 1
+        self.dropped += replaced
+
+        self.event.set()
+
+        return replaced
+
+    async def take(self, timeout: Optional[float]=None) -> Any:
+        """
+        Takes the item in the mailbox, waiting for one if necessary.
+
+        :param timeout: Maximum time in seconds to wait, None to wait forever
+        :type timeout: float
+        :return: Item taken, None if we are closed or timed out
+        :rtype: Any
+        """
+
+        try:
+
+            await asyncio.wait_for(self.event.wait(), timeout)
+
+        except asyncio.TimeoutError:
+
+            return None
+
+        if self.item is _EMPTY:
+
+            return None
+
+        item, self.item = self.item, _EMPTY
+
+        if not self.closed:
+
+            self.event.clear()
+
+        return item
+
+    def close(self):
+        """
+        Closes the mailbox, waking up anyone waiting.
+
+        Any item waiting is dropped.
+        """
+
+        self.closed = True
+        self.item = _EMPTY
+
+        self.event.set()
@@ -0,0 +1,287 @@
+"""
+This file contains components for running handlers
+in dedicated thread or process pools.
+
+By default, handlers are ran in whatever thread
+calls the HandlerCollection.
+Handlers can instead declare an ExecutionPolicy,
+which the HandlerCollection uses to create a HandlerPool
+for the handler when it is started.
+Each HandlerPool has it's own workers, and a limit on the
+amount of work that can be in flight at once,
+so one slow handler can not starve the others.
+"""
+
+from __future__ import annotations
+
+import threading
+import contextvars
+import multiprocessing
+
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Optional
+
+from meh.errors import HandlerRejectedError
+from meh.formatters import ConversionCache
+
+
+class ExecutionPolicy(object):
+    """
+    ExecutionPolicy - Describes how a handler should be ran
+
+    Handlers can define a policy using the 'policy' class parameter.
+
+    The 'kind' of policy determines the pool to use:
+
+    * THREAD - Run the handler in a dedicated thread pool
+    * PROCESS - Run the handler in a dedicated process pool
+    * SHARED - Run the handler in worker processes, passing frames through shared memory
+
+    'workers' is the number of threads or processes in the pool,
+    and 'max_in_flight' is the maximum number of requests
+    (running or queued) that the pool will accept at once.
+    Any requests over this limit are rejected.
+    If 'max_in_flight' is not provided, then we allow
+    one queued request for each worker.
+
+    Process pools create a new instance of the handler in each
+    worker process, which is then loaded and started.
+    The instance in the parent process is never started,
+    so models acquired in 'start()' are only loaded in the workers.
+    The handler class MUST be importable (or inherited by forking)
+    in the worker processes, and all data, metadata and
+    responses MUST be picklable.
+
+    Shared pools (see SharedFramePool) create a slot of 'slot_size' bytes
+    in shared memory for each request in flight,
+    and converted frames that fit are passed to the workers through these slots.
+    'start_method' is the multiprocessing start method used for
+    process and shared pools, None for the platform default.
+    """
+
+    THREAD = 'thread'
+    PROCESS = 'process'
+    SHARED = 'shared'
+
+    def __init__(self, kind: str=THREAD, workers: int=1, max_in_flight: Optional[int]=None, slot_size: int=2 ** 21, start_method: Optional[str]=None) -> None:
+
+        if kind not in (ExecutionPolicy.THREAD, ExecutionPolicy.PROCESS, ExecutionPolicy.SHARED):
+
+            # Invalid kind!
+
+            raise ValueError("Invalid execution policy kind: {}".format(kind))
+
+        self.kind = kind  # Kind of pool to use
+        self.workers = workers  # Number of workers in the pool
+        self.max_in_flight = max_in_flight if max_in_flight is not None else workers * 2  # Maximum requests in flight
+        self.slot_size = slot_size  # Size in bytes of each shared memory slot
+        self.start_method = start_method  # Multiprocessing start method, None for the default
+
+    def __repr__(self) -> str:
+
+        return "ExecutionPolicy(kind={!r}, workers={}, max_in_flight={})".format(self.kind, self.workers, self.max_in_flight)
+
+
+# Handler instance used by process pool workers:
+
+_process_hand = None
+
+
+def _process_init(cls):
+    """
+    Creates, loads and starts the handler in a process pool worker.
+
+    :param cls: Handler class to instantiate
+    :type cls: type
+    """
+
+    global _process_hand
+
+    _process_hand = cls()
+
+    _process_hand.load()
+    _process_hand.start()
+
+    _process_hand.running = True
+
+
+def _process_call(data, meta):
+    """
+    Handles the given data in a process pool worker.
+
+    :param data: Data to be processed
+    :type data: Any
+    :param meta: Metadata for the given request
+    :type meta: dict
+    :return: Data returned by the handler
+    :rtype: Any
+    """
+
+    return _process_hand._meta_handle(data, meta)
+
+
+class HandlerPool(object):
+    """
+    HandlerPool - Runs a single handler in a dedicated pool
+
+    We are created by the HandlerCollection when a handler
+    with an ExecutionPolicy is started, and shutdown when it is stopped.
+
+    We keep track of the requests in flight,
+    and reject any requests that go over the limit
+    by raising a HandlerRejectedError.
+    Stats about this pool can be retrieved using 'stats()'.
+    """
+
+    def __init__(self, hand: Any, policy: ExecutionPolicy) -> None:
+
+        self.hand = hand  # Handler we are running
+        self.policy = policy  # Policy we are following
+
+        self.in_flight = 0  # Number of requests running or queued
+        self.submitted = 0  # Number of requests accepted
+        self.completed = 0  # Number of requests completed
+        self.failed = 0  # Number of requests that raised an exception
+        self.rejected = 0  # Number of requests rejected
+
+        self.lock = threading.Lock()
+
+        # Create the pool:
+
+        if policy.kind == ExecutionPolicy.PROCESS:
+
+            self.pool = ProcessPoolExecutor(max_workers=policy.workers, mp_context=multiprocessing.get_context(policy.start_method), initializer=_process_init, initargs=(type(hand),))
+
+        else:
+
+            self.pool = ThreadPoolExecutor(max_workers=policy.workers, thread_name_prefix=hand.name or type(hand).__name__)
+
+    @property
+    def queued(self) -> int:
+        """
+        Number of requests waiting for a worker.
+
+        :return: Queue depth
+        :rtype: int
+        """
+
+        return max(0, self.in_flight - self.policy.workers)
+
+    def submit(self, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Future:
+        """
+        Submits the given data to the pool.
+
+        The conversion cache is only used by thread pools,
+        as it can not be shared with other processes.
+
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Future that will contain the data returned by the handler
+        :rtype: Future
+        :raise: HandlerRejectedError: If too many requests are in flight
+        """
+
+        with self.lock:
+
+            # Determine if we have room:
+
+            if self.in_flight >= self.policy.max_in_flight:
+
+                self.rejected += 1
+
+                raise HandlerRejectedError("Handler {} has {} requests in flight!".format(self.hand.name, self.in_flight))
+
+            self.in_flight += 1
+            self.submitted += 1
+
+        # Submit the work:
+
+        try:
+
+            if self.policy.kind == ExecutionPolicy.PROCESS:
+
+                fut = self.pool.submit(_process_call, data, meta)
+
+            else:
+
+                fut = self.pool.submit(contextvars.copy_context().run, self.hand._meta_handle, data, meta, cache)
+
+        except Exception:
+
+            self._done(None)
+
+            raise
+
+        fut.add_done_callback(self._done)
+
+        return fut
+
+    def run(self, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Any:
+        """
+        Submits the given data to the pool and waits for the result.
+
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data returned by the handler
+        :rtype: Any
+        """
+
+        return self.submit(data, meta, cache).result()
+
+    def shutdown(self, wait: bool=True):
+        """
+        Shuts down the pool.
+
+        :param wait: Value determining if we wait for requests in flight to finish
+        :type wait: bool
+        """
+
+        self.pool.shutdown(wait=wait)
+
+    def stats(self) -> dict:
+        """
+        Returns stats about this pool.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        return {
+            'kind': self.policy.kind,
+            'workers': self.policy.workers,
+            'max_in_flight': self.policy.max_in_flight,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'submitted': self.submitted,
+            'completed': self.completed,
+            'failed': self.failed,
+            'rejected': self.rejected,
+        }
+
+    def _done(self, fut: Optional[Future]):
+        """
+        Callback ran when a request is done.
+
+        :param fut: Future that is done
+        :type fut: Future
+        """
+
+        with self.lock:
+
+            self.in_flight -= 1
+
+            if fut is None or fut.cancelled() or fut.exception() is not None:
+
+                self.failed += 1
+
+            else:
+
+                self.completed += 1
@@ -0,0 +1,93 @@
+"""
+This file contains components for packing coordinates into compact arrays.
+
+Handlers that send back coordinates (such as hand landmarks or face boxes)
+would normally send a JSON list of floats, which costs about 20 bytes per value.
+Instead, we quantize each value into a 16 bit fixed point number
+over a known range, and pack the values into little endian bytes,
+which costs 2 bytes per value.
+
+Values are quantized over the range [lo, hi] (by default [0, 1],
+which fits coordinates relative to the size of the frame):
+
+    q = round((value - lo) / (hi - lo) * 65535)
+
+This gives a precision of about 1/65535 of the range,
+which is far finer than a pixel for any frame we work with.
+
+The packed bytes can be sent as is in binary formats (such as MessagePack),
+and are sent as Base64 strings in JSON.
+Clients can unpack them using a 'Uint16Array' (or 'dequantize()' in python).
+"""
+
+import struct
+
+from typing import Iterable, List
+
+SCALE = 65535  # Largest quantized value
+
+
+def quantize(values: Iterable[float], lo: float=0.0, hi: float=1.0) -> bytes:
+    """
+    Quantizes and packs the given values.
+
+    Values outside of the range are clipped to the range.
+
+    :param values: Values to pack, nested iterables (such as points) are flattened
+    :type values: Iterable
+    :param lo: Lowest value of the range
+    :type lo: float
+    :param hi: Highest value of the range
+    :type hi: float
+    :return: Packed values
+    :rtype: bytes
+    """
+
+    span = (hi - lo) / SCALE
+
+    final = [min(SCALE, max(0, round((float(value) - lo) / span))) for value in _flatten(values)]
+
+    return struct.pack('<{}H'.format(len(final)), *final)
+
+
+def dequantize(data: bytes, lo: float=0.0, hi: float=1.0) -> List[float]:
+    """
+    Unpacks values packed by 'quantize()'.
+
+    :param data: Packed values
+    :type data: bytes
+    :param lo: Lowest value of the range
+    :type lo: float
+    :param hi: Highest value of the range
+    :type hi: float
+    :return: Values, flattened
+    :rtype: list
+    """
+
+    span = (hi - lo) / SCALE
+
+    return [lo + value * span for value in struct.unpack('<{}H'.format(len(data) // 2), data)]
+
+
+def _flatten(values: Iterable) -> Iterable[float]:
+    """
+    Flattens nested iterables of values.
+
+    This low-level function is not intended to
+    be worked with by end users!
+
+    :param values: Values to flatten
+    :type values: Iterable
+    :return: Flat values
+    :rtype: Iterable
+    """
+
+    for value in values:
+
+        if hasattr(value, '__iter__'):
+
+            yield from _flatten(value)
+
+        else:
+
+            yield value
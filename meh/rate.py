@@ -0,0 +1,177 @@
+"""
+This file contains components for advising clients on how fast to send frames.
+
+Clients that send frames at a fixed rate either send too many frames
+when we are busy (which are dropped, wasting bandwidth and decoding),
+or too few when we have room to spare (which makes responses feel slow).
+
+The RateAdvisor measures how long each connection waits for it's frames to be handled,
+and how busy we are as a whole, and recommends how often each client should send frames,
+at what resolution, and at what JPEG quality.
+These hints are sent to the client with each response,
+so clients slow down when we are saturated and speed back up when we have headroom.
+"""
+
+import time
+import threading
+
+from typing import Tuple
+
+
+class RateTracker(object):
+    """
+    RateTracker - Measurements of a single connection
+
+    We keep an exponentially weighted moving average
+    of the time taken to handle the frames of the connection.
+    """
+
+    def __init__(self) -> None:
+
+        self.latency = None  # Average time in seconds to handle a frame, None if not measured
+        self.frames = 0  # Number of frames handled
+
+
+class RateAdvisor(object):
+    """
+    RateAdvisor - Recommends frame rates, resolutions and qualities
+
+    We are shared by all connections of the process.
+    Each connection creates a RateTracker using 'track()',
+    and reports each frame it handles using 'begin()' and 'end()',
+    which lets us know how many frames are being handled at once (our load),
+    and how long the frames of each connection take.
+
+    Our hints are determined like so:
+
+        * load - Average number of frames handled at once, divided by our 'capacity'
+        * interval - Latency of the connection, stretched by up to 4 times as our load rises,
+          so each client waits for it's response before sending again,
+          and clients back off as we become saturated
+        * width - Picked from 'widths', largest when idle and smallest when saturated
+        * quality - Between the highest and lowest 'qualities', highest when idle
+
+    :param capacity: Number of frames we can handle at once
+    :type capacity: int
+    :param interval: Lowest and highest frame interval in milliseconds
+    :type interval: tuple
+    :param widths: Frame widths to recommend, largest first
+    :type widths: tuple
+    :param qualities: Highest and lowest JPEG quality to recommend, from 0 to 1
+    :type qualities: tuple
+    :param alpha: Weight given to new measurements in the moving averages
+    :type alpha: float
+    """
+
+    def __init__(self, capacity: int=8, interval: Tuple[int, int]=(100, 2000), widths: Tuple[int, ...]=(640, 480, 360),
+                 qualities: Tuple[float, float]=(0.9, 0.5), alpha: float=0.2) -> None:
+
+        self.capacity = max(1, capacity)  # Number of frames we can handle at once
+        self.interval = interval  # Lowest and highest frame interval in milliseconds
+        self.widths = widths  # Frame widths to recommend, largest first
+        self.qualities = qualities  # Highest and lowest JPEG quality to recommend
+        self.alpha = alpha  # Weight given to new measurements
+
+        self.busy = 0  # Number of frames being handled right now
+        self.load = 0.0  # Average number of frames handled at once, relative to our capacity
+
+        self.lock = threading.Lock()
+
+    def track(self) -> RateTracker:
+        """
+        Creates a tracker for a new connection.
+
+        :return: New tracker
+        :rtype: RateTracker
+        """
+
+        return RateTracker()
+
+    def begin(self) -> float:
+        """
+        Marks a frame as being handled.
+
+        :return: Time the frame started, to be given to 'end()'
+        :rtype: float
+        """
+
+        with self.lock:
+
+            self.busy += 1
+
+            self._sample()
+
+        return time.monotonic()
+
+    def end(self, tracker: RateTracker, start: float):
+        """
+        Marks a frame as handled, and measures how long it took.
+
+        :param tracker: Tracker of the connection the frame was sent on
+        :type tracker: RateTracker
+        :param start: Time the frame started, as returned by 'begin()'
+        :type start: float
+        """
+
+        took = time.monotonic() - start
+
+        with self.lock:
+
+            self.busy -= 1
+
+            self._sample()
+
+            tracker.latency = took if tracker.latency is None else tracker.latency + self.alpha * (took - tracker.latency)
+            tracker.frames += 1
+
+    def hints(self, tracker: RateTracker) -> dict:
+        """
+        Determines the hints to send to the client of the given connection.
+
+        :param tracker: Tracker of the connection
+        :type tracker: RateTracker
+        :return: Recommended 'interval' (ms), 'width' (px), and 'quality' (0 to 1)
+        :rtype: dict
+        """
+
+        load = self.load
+        low, high = self.interval
+
+        # Wait for responses, and back off as we become busy:
+
+        interval = (tracker.latency or 0) * 1000 * (1 + 3 * load)
+
+        # Send smaller, lower quality frames as we become busy:
+
+        width = self.widths[min(len(self.widths) - 1, int(load * len(self.widths)))]
+        quality = self.qualities[0] - (self.qualities[0] - self.qualities[1]) * load
+
+        return {
+            'interval': int(min(high, max(low, interval))),
+            'width': width,
+            'quality': round(quality, 2),
+        }
+
+    def stats(self) -> dict:
+        """
+        Returns stats about our load.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        return {
+            'capacity': self.capacity,
+            'busy': self.busy,
+            'load': round(self.load, 3),
+        }
+
+    def _sample(self):
+        """
+        Updates our average load with the number of frames being handled.
+
+        This low-level method is not intended to
+        be worked with by end users!
+        """
+
+        self.load += self.alpha * (min(1.0, self.busy / self.capacity) - self.load)
@@ -0,0 +1,393 @@
+"""
+This file contains components for sharing heavy resources between handlers.
+
+Many handlers depend on resources that are expensive to create,
+such as machine learning models.
+If each handler (or each part of the project) creates it's own copy,
+then the same model is loaded into memory many times over.
+
+The ResourceRegistry keeps a single copy of each resource,
+which is created the first time it is acquired,
+and freed once the last user releases it.
+Handlers should acquire the resources they need in 'start()',
+and release them in 'stop()', so resources are only kept in memory
+while the handlers using them are running.
+A resource can be refreshed, so the next user gets a new copy
+(for example, a model that was trained again),
+while current users keep the copy they hold until they release it.
+
+Most users will want to use the registry under 'registry',
+which is shared by the entire process.
+"""
+
+import os
+import sys
+import threading
+
+from contextlib import contextmanager
+from typing import Any, Callable, Optional
+
+
+def _rss() -> int:
+    """
+    Gets the resident memory of this process.
+
+    We read '/proc/self/statm' when available,
+    otherwise we fall back to the peak resident memory,
+    which is the best we can do without other libraries.
+
+    :return: Resident memory in bytes
+    :rtype: int
+    """
+
+    try:
+
+        with open('/proc/self/statm', 'r') as f:
+
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+    except (OSError, ValueError, IndexError, AttributeError):
+
+        pass
+
+    try:
+
+        import resource
+
+    except ImportError:
+
+        return 0
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # Linux reports kilobytes, macOS reports bytes:
+
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Resource(object):
+    """
+    Resource - State of a single resource in the registry
+
+    We keep the factory used to create the resource,
+    the function used to close it (if any),
+    the resource itself (None if not loaded),
+    and the number of users holding it.
+
+    The resident memory of the resource is estimated by measuring
+    the resident memory of the process before and after it is created.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], None]]=None) -> None:
+
+        self.name = name  # Name of the resource
+        self.factory = factory  # Function that creates the resource
+        self.close = close  # Function that closes the resource, None if not needed
+
+        self.value = None  # The resource, None if not loaded
+        self.pid = None  # ID of the process that created the resource
+        self.refs = 0  # Number of users holding the resource
+        self.loads = 0  # Number of times the resource was created
+        self.rss = 0  # Estimated resident memory of the resource in bytes
+        self.stale = []  # List of [value, refs] for old copies still held by users
+
+        self.lock = threading.Lock()  # Lock held while the resource is created or freed
+        self.use_lock = threading.RLock()  # Lock users can hold if the resource is not thread safe
+
+
+class ResourceRegistry(object):
+    """
+    ResourceRegistry - Reference counted registry of shared resources
+
+    Resources are registered under a name with a factory,
+    which is called to create the resource the first time it is acquired.
+    Each call to 'acquire()' MUST be matched by a call to 'release()'!
+    Once the last user releases a resource, we close it (if a close function was given),
+    and drop our reference to it so it can be freed.
+
+    Calling 'refresh()' detaches the loaded copy of a resource,
+    so the next call to 'acquire()' creates a new one.
+    Users of the old copy keep it, and once the last of them releases it,
+    the old copy is closed and freed.
+    Users that may hold a resource across a refresh MUST pass the value
+    they acquired to 'release()', so we know which copy they are done with.
+
+    Resources that are not thread safe can be guarded using 'lock()',
+    which returns the same lock to every user of a resource.
+
+    Stats for each resource, including it's estimated resident memory,
+    can be retrieved using 'stats()'.
+
+    Resources are never shared between processes!
+    If a process is forked, then the child creates it's own copy of
+    each resource it acquires, instead of using the one it inherited.
+    """
+
+    def __init__(self) -> None:
+
+        self.resources = {}  # Dictionary of resource names to Resource instances
+        self.lock = threading.Lock()
+
+    def register(self, name: str, factory: Callable[[], Any], close: Optional[Callable[[Any], None]]=None):
+        """
+        Registers a resource under the given name.
+
+        Registering a name again replaces the factory,
+        which is only allowed while the resource is not loaded.
+
+        :param name: Name of the resource
+        :type name: str
+        :param factory: Function that creates the resource
+        :type factory: Callable
+        :param close: Function that closes the resource, None if not needed
+        :type close: Callable
+        :raise: ValueError: If the resource is loaded
+        """
+
+        with self.lock:
+
+            res = self.resources.get(name)
+
+            if res is not None and res.value is not None:
+
+                if res.factory is factory:
+
+                    # Same resource, nothing to do:
+
+                    return
+
+                raise ValueError("Resource {} is loaded and can not be replaced!".format(name))
+
+            self.resources[name] = Resource(name, factory, close)
+
+    def acquire(self, name: str) -> Any:
+        """
+        Acquires the resource registered under the given name.
+
+        If the resource is not loaded, then we create it.
+
+        :param name: Name of the resource
+        :type name: str
+        :return: The resource
+        :rtype: Any
+        :raise: KeyError: If no resource is registered under the name
+        """
+
+        res = self._get(name)
+
+        with res.lock:
+
+            if res.value is not None and res.pid != os.getpid():
+
+                # Inherited from our parent process, create our own:
+
+                res.value = None
+                res.refs = 0
+                res.stale = []
+
+            if res.value is None:
+
+                # Create the resource, and measure it's size:
+
+                before = _rss()
+
+                res.value = res.factory()
+
+                res.rss = max(0, _rss() - before)
+                res.pid = os.getpid()
+                res.loads += 1
+
+            res.refs += 1
+
+            return res.value
+
+    def release(self, name: str, value: Any=None):
+        """
+        Releases the resource registered under the given name.
+
+        If we were the last user, then the resource is freed.
+        If the value given is an old copy of the resource,
+        then we release that copy instead of the loaded one.
+
+        :param name: Name of the resource
+        :type name: str
+        :param value: The resource that was acquired, None for the loaded copy
+        :type value: Any
+        :raise: KeyError: If no resource is registered under the name
+        """
+
+        res = self._get(name)
+
+        with res.lock:
+
+            if value is not None and value is not res.value:
+
+                self._release_stale(res, value)
+
+                return
+
+            if res.refs <= 0:
+
+                # Not held, nothing to do:
+
+                return
+
+            res.refs -= 1
+
+            if res.refs or res.value is None:
+
+                return
+
+            # Last user, free the resource:
+
+            value, res.value = res.value, None
+
+            res.rss = 0
+
+            if res.close is not None:
+
+                res.close(value)
+
+    @contextmanager
+    def use(self, name: str):
+        """
+        Acquires the given resource for the duration of a 'with' block.
+
+        :param name: Name of the resource
+        :type name: str
+        :return: The resource
+        :rtype: Any
+        """
+
+        value = self.acquire(name)
+
+        try:
+
+            yield value
+
+        finally:
+
+            self.release(name, value)
+
+    def refresh(self, name: str):
+        """
+        Refreshes the resource registered under the given name.
+
+        The loaded copy is detached, so the next user creates a new copy.
+        If nobody holds the loaded copy, then it is freed right away.
+
+        :param name: Name of the resource
+        :type name: str
+        :raise: KeyError: If no resource is registered under the name
+        """
+
+        res = self._get(name)
+
+        with res.lock:
+
+            if res.value is None or res.pid != os.getpid():
+
+                # Not loaded by us, nothing to do:
+
+                return
+
+            value, refs = res.value, res.refs
+
+            res.value = None
+            res.refs = 0
+            res.rss = 0
+
+            if refs:
+
+                # Keep the old copy until it's users are done:
+
+                res.stale.append([value, refs])
+
+            elif res.close is not None:
+
+                res.close(value)
+
+    def lock(self, name: str) -> threading.RLock:
+        """
+        Gets the lock shared by all users of the given resource.
+
+        :param name: Name of the resource
+        :type name: str
+        :return: Lock of the resource
+        :rtype: threading.RLock
+        """
+
+        return self._get(name).use_lock
+
+    def stats(self) -> dict:
+        """
+        Returns stats about each resource.
+
+        :return: Dictionary of resource names to stats
+        :rtype: dict
+        """
+
+        return {
+            name: {
+                'loaded': res.value is not None,
+                'refs': res.refs,
+                'loads': res.loads,
+                'rss': res.rss,
+                'stale': len(res.stale),
+            } for name, res in list(self.resources.items())
+        }
+
+    def _release_stale(self, res: Resource, value: Any):
+        """
+        Releases an old copy of the given resource.
+
+        If we were the last user of the copy, then it is freed.
+        The lock of the resource MUST be held!
+
+        :param res: Resource the copy belongs to
+        :type res: Resource
+        :param value: Old copy to release
+        :type value: Any
+        """
+
+        for entry in res.stale:
+
+            if entry[0] is not value:
+
+                continue
+
+            entry[1] -= 1
+
+            if entry[1] <= 0:
+
+                # Last user, free the copy:
+
+                res.stale.remove(entry)
+
+                if res.close is not None:
+
+                    res.close(value)
+
+            return
+
+    def _get(self, name: str) -> Resource:
+        """
+        Gets the Resource registered under the given name.
+
+        :param name: Name of the resource
+        :type name: str
+        :return: Resource
+        :rtype: Resource
+        :raise: KeyError: If no resource is registered under the name
+        """
+
+        try:
+
+            return self.resources[name]
+
+        except KeyError:
+
+            raise KeyError("No resource registered under {}!".format(name)) from None
+
+
+registry = ResourceRegistry()  # Registry shared by the entire process
@@ -0,0 +1,673 @@
+"""
+This file contains components for running handlers in worker processes,
+passing frames through shared memory.
+
+CPU bound handlers (such as handlers that run recognition models)
+can only use a single core when ran in threads.
+The SharedFramePool runs a handler in many worker processes instead,
+each with an instance of the handler (and models) of it's own.
+
+Sending frames to processes normally means pickling every pixel,
+which can cost more than the work itself.
+Instead, we create a ring of fixed size slots in 'multiprocessing.shared_memory'.
+Converted frames are written into a free slot,
+and only the index, shape and type of the slot are sent to the workers,
+which read the frame straight out of shared memory.
+Data that is not an array (or does not fit in a slot) is pickled as usual.
+
+Workers take as many requests as are waiting (up to the 'batch_size' of the handler)
+and handle them as a batch using 'handle_batch()'.
+Requests whose deadline (see HandlerCollection) passed while they were waiting
+are dropped by the workers, and fail with a DeadlineExpiredError.
+"""
+
+from __future__ import annotations
+
+import sys
+import time
+import pickle
+import threading
+import itertools
+import importlib
+import multiprocessing
+
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+from typing import Any, Optional
+
+from meh.cache import MISS
+from meh.errors import HandlerRejectedError, DeadlineExpiredError
+from meh.discovery import import_source
+from meh.formatters import ConversionCache
+
+try:
+
+    import numpy as np
+
+except ImportError:
+
+    # Frames can't be shared, all data is pickled:
+
+    np = None
+
+
+def _resolve(module: str, path: Optional[str], name: str) -> type:
+    """
+    Finds the given handler class in a worker process.
+
+    We use the module if it is already imported (such as when forked),
+    and otherwise import it by name, or from it's source.
+
+    :param module: Name of the module the class is defined in
+    :type module: str
+    :param path: Path to the source of the module
+    :type path: str
+    :param name: Qualified name of the class
+    :type name: str
+    :return: Handler class
+    :rtype: type
+    """
+
+    mod = sys.modules.get(module)
+
+    if mod is None:
+
+        try:
+
+            mod = importlib.import_module(module)
+
+        except ImportError:
+
+            if path is None:
+
+                raise
+
+            mod = import_source(module, path)
+
+    obj = mod
+
+    for part in name.split('.'):
+
+        obj = getattr(obj, part)
+
+    return obj
+
+
+def _picklable(exc: BaseException) -> BaseException:
+    """
+    Ensures the given exception can be sent back to the parent process.
+
+    :param exc: Exception to check
+    :type exc: BaseException
+    :return: The exception, or a RuntimeError describing it if it can't be pickled
+    :rtype: BaseException
+    """
+
+    try:
+
+        pickle.loads(pickle.dumps(exc))
+
+    except Exception:
+
+        return RuntimeError(repr(exc))
+
+    return exc
+
+
+def _shared_worker(shm_name: str, slot_size: int, cls: tuple, batch: int, tasks: Any, results: Any):
+    """
+    Handles requests in a worker process until we receive None.
+
+    Each task is a tuple of (job, slot, shape, dtype, meta, data).
+    If 'slot' is None, then the data was pickled and is in 'data',
+    otherwise the frame is read from the given slot.
+    We send back a tuple of (job, response or exception) for each task.
+    Tasks whose deadline has passed are not handled.
+
+    :param shm_name: Name of the shared memory to read frames from
+    :type shm_name: str
+    :param slot_size: Size of each slot in bytes
+    :type slot_size: int
+    :param cls: Module name, module path, and name of the handler class
+    :type cls: tuple
+    :param batch: Maximum number of requests to handle at once
+    :type batch: int
+    :param tasks: Queue to get tasks from
+    :type tasks: multiprocessing.Queue
+    :param results: Queue to send responses to
+    :type results: multiprocessing.Queue
+    """
+
+    shm = SharedMemory(name=shm_name)
+
+    # Create, load and start our handler:
+
+    hand = _resolve(*cls)()
+
+    hand.load()
+    hand.start()
+
+    hand.running = True
+
+    done = False
+
+    while not done:
+
+        # Get a task, and any others that are waiting:
+
+        task = tasks.get()
+
+        if task is None:
+
+            break
+
+        work = [task]
+
+        while len(work) < batch:
+
+            try:
+
+                task = tasks.get_nowait()
+
+            except Empty:
+
+                break
+
+            if task is None:
+
+                done = True
+
+                break
+
+            work.append(task)
+
+        # Drop the tasks that ran past their deadline:
+
+        now = time.time() * 1000
+        live = []
+
+        for task in work:
+
+            if task[4] and task[4].get('deadline') is not None and task[4]['deadline'] <= now:
+
+                results.put((task[0], DeadlineExpiredError("Deadline passed before {} handled the request!".format(hand.name))))
+
+                continue
+
+            live.append(task)
+
+        work = live
+
+        if not work:
+
+            continue
+
+        # Read each frame:
+
+        items = []
+
+        for job, slot, shape, dtype, meta, data in work:
+
+            if slot is not None:
+
+                data = np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_size)
+
+            items.append(data)
+
+        # Handle the batch:
+
+        try:
+
+            out = hand._meta_handle_batch(items, [task[4] for task in work], converted=True)
+
+        except Exception as e:
+
+            out = [e] * len(work)
+
+        del items, data
+
+        for task, res in zip(work, out):
+
+            results.put((task[0], _picklable(res) if isinstance(res, BaseException) else res))
+
+    hand.running = False
+
+    hand.stop()
+
+    shm.close()
+
+
+class SharedFramePool(object):
+    """
+    SharedFramePool - Runs a single handler in worker processes
+
+    We are created by the HandlerCollection when a handler
+    with a SHARED ExecutionPolicy is started, and shutdown when it is stopped.
+    We offer the same interface as the HandlerPool.
+
+    We create 'max_in_flight' slots of 'slot_size' bytes in shared memory,
+    so each request in flight has a slot of it's own.
+    Data is converted in the calling thread and written to a free slot,
+    which is freed once the response is received.
+    Requests over the limit are rejected by raising a HandlerRejectedError.
+
+    Each worker creates, loads and starts it's own instance of the handler.
+    The handler class MUST be importable in the worker processes
+    (or inherited by forking), and all metadata and responses MUST be picklable.
+
+    If a worker exits while we are running (such as when it crashes,
+    or the handler fails to start), then every request in flight is failed,
+    and all new requests are rejected until we are shutdown.
+    Futures cancelled by their caller are simply left alone.
+    """
+
+    poll = 0.5  # Time in seconds between checks that the workers are alive
+
+    def __init__(self, hand: Any, policy: Any) -> None:
+
+        self.hand = hand  # Handler we are running
+        self.policy = policy  # Policy we are following
+
+        self.slot_size = policy.slot_size  # Size of each slot in bytes
+        self.free = deque(range(policy.max_in_flight))  # Indices of the free slots
+        self.futures = {}  # Job ID to future, slot, and cache key
+        self.jobs = itertools.count()
+
+        self.in_flight = 0  # Number of requests running or queued
+        self.submitted = 0  # Number of requests accepted
+        self.completed = 0  # Number of requests completed
+        self.failed = 0  # Number of requests that raised an exception
+        self.rejected = 0  # Number of requests rejected
+        self.expired = 0  # Number of requests dropped as their deadline passed
+        self.cached = 0  # Number of requests answered from the handler's cache
+        self.shared = 0  # Number of requests passed through shared memory
+
+        self.closing = False  # Value determining if we are shutting down
+        self.broken = None  # Exception describing why we stopped working, None if working
+
+        self.lock = threading.Lock()
+
+        # Create the shared memory and queues:
+
+        ctx = multiprocessing.get_context(policy.start_method)
+
+        self.shm = SharedMemory(create=True, size=policy.max_in_flight * self.slot_size)
+        self.tasks = ctx.Queue()
+        self.results = ctx.Queue()
+
+        # Start the workers:
+
+        cls = (type(hand).__module__, getattr(sys.modules.get(type(hand).__module__), '__file__', None), type(hand).__qualname__)
+
+        self.procs = [
+            ctx.Process(
+                target=_shared_worker,
+                args=(self.shm.name, self.slot_size, cls, hand.batch_size or 1, self.tasks, self.results),
+                name='{}-{}'.format(hand.name or type(hand).__name__, num),
+                daemon=True,
+            ) for num in range(policy.workers)
+        ]
+
+        try:
+
+            for proc in self.procs:
+
+                proc.start()
+
+        except Exception:
+
+            # Failed to start the workers, don't leak the shared memory:
+
+            for proc in self.procs:
+
+                if proc.is_alive():
+
+                    proc.terminate()
+
+            self.shm.close()
+            self.shm.unlink()
+
+            raise
+
+        # Start collecting responses:
+
+        self.collector = threading.Thread(target=self._collect, name='{}-collector'.format(hand.name or type(hand).__name__), daemon=True)
+        self.collector.start()
+
+    @property
+    def queued(self) -> int:
+        """
+        Number of requests waiting for a worker.
+
+        :return: Queue depth
+        :rtype: int
+        """
+
+        return max(0, self.in_flight - self.policy.workers)
+
+    def submit(self, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Future:
+        """
+        Submits the given data to the workers.
+
+        We convert the data in the calling thread,
+        and write it to a free slot if it is an array that fits.
+        Requests are checked against our limit before they are converted,
+        so rejected data is never decoded.
+        If the handler has a response cached for the data,
+        then we return a future that is already done.
+
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Future that will contain the data returned by the handler
+        :rtype: Future
+        :raise: HandlerRejectedError: If too many requests are in flight, or we are shutdown
+        """
+
+        fut = Future()
+
+        # Make sure we have room, before doing any work:
+
+        with self.lock:
+
+            self._admit()
+
+        # Convert the data, and check if the handler has a response already:
+
+        data = self.hand.convert.convert_cached(data, cache)
+
+        key, out = self.hand._lookup(data, meta)
+
+        if out is not MISS:
+
+            self.cached += 1
+
+            fut.set_result(out)
+
+            return fut
+
+        share = np is not None and isinstance(data, np.ndarray) and data.nbytes <= self.slot_size
+
+        with self.lock:
+
+            self._admit()
+
+            self.in_flight += 1
+            self.submitted += 1
+
+            job = next(self.jobs)
+            slot = self.free.popleft() if share else None
+
+            self.futures[job] = (fut, slot, key)
+
+        if slot is None:
+
+            # Send the data itself:
+
+            self.tasks.put((job, None, None, None, meta, data))
+
+            return fut
+
+        # Write the frame to the slot, and send the index:
+
+        np.ndarray(data.shape, dtype=data.dtype, buffer=self.shm.buf, offset=slot * self.slot_size)[...] = data
+
+        self.shared += 1
+
+        self.tasks.put((job, slot, data.shape, data.dtype.str, meta, None))
+
+        return fut
+
+    def _admit(self):
+        """
+        Ensures we can accept another request.
+
+        Our lock MUST be held!
+
+        :raise: HandlerRejectedError: If too many requests are in flight, or we are shutdown or broken
+        """
+
+        if self.shm is None or self.closing:
+
+            raise HandlerRejectedError("Shared pool for {} is shutdown!".format(self.hand.name))
+
+        if self.broken is not None:
+
+            raise HandlerRejectedError("Shared pool for {} is broken: {}".format(self.hand.name, self.broken))
+
+        if self.in_flight >= self.policy.max_in_flight:
+
+            self.rejected += 1
+
+            raise HandlerRejectedError("Handler {} has {} requests in flight!".format(self.hand.name, self.in_flight))
+
+    def run(self, data: Any, meta: dict, cache: Optional[ConversionCache]=None) -> Any:
+        """
+        Submits the given data to the workers and waits for the result.
+
+        :param data: Data to be processed
+        :type data: Any
+        :param meta: Metadata for the given request
+        :type meta: dict
+        :param cache: Cache of conversions for this dispatch
+        :type cache: ConversionCache
+        :return: Data returned by the handler
+        :rtype: Any
+        """
+
+        return self.submit(data, meta, cache).result()
+
+    def shutdown(self, wait: bool=True):
+        """
+        Stops the workers, and frees the shared memory.
+
+        Requests that are still in flight once the workers stop
+        are failed with a HandlerRejectedError.
+        The shared memory is always freed, even if stopping the workers fails.
+
+        :param wait: Value determining if we wait for requests in flight to finish
+        :type wait: bool
+        """
+
+        with self.lock:
+
+            if self.shm is None or self.closing:
+
+                return
+
+            self.closing = True
+
+        try:
+
+            # Tell the workers to stop once they are done:
+
+            for _ in self.procs:
+
+                self.tasks.put(None)
+
+            for proc in self.procs:
+
+                proc.join(None if wait else 0.1)
+
+                if proc.is_alive():
+
+                    proc.terminate()
+
+                    proc.join()
+
+            # Stop the collector once it has received all responses:
+
+            self.results.put(None)
+            self.collector.join()
+
+        finally:
+
+            self._fail_all(HandlerRejectedError("Shared pool for {} is shutdown!".format(self.hand.name)))
+
+            with self.lock:
+
+                self.shm.close()
+                self.shm.unlink()
+
+                self.shm = None
+
+    def stats(self) -> dict:
+        """
+        Returns stats about this pool.
+
+        :return: Dictionary of stats
+        :rtype: dict
+        """
+
+        return {
+            'kind': self.policy.kind,
+            'workers': self.policy.workers,
+            'alive': sum(proc.is_alive() for proc in self.procs),
+            'max_in_flight': self.policy.max_in_flight,
+            'slot_size': self.slot_size,
+            'in_flight': self.in_flight,
+            'queued': self.queued,
+            'submitted': self.submitted,
+            'shared': self.shared,
+            'completed': self.completed,
+            'cached': self.cached,
+            'failed': self.failed,
+            'rejected': self.rejected,
+            'expired': self.expired,
+        }
+
+    def _collect(self):
+        """
+        Receives responses from the workers until we receive None,
+        and resolves each future.
+
+        If a worker exits before we are shutdown,
+        or we fail to receive a response,
+        then every request in flight is failed.
+        """
+
+        try:
+
+            while True:
+
+                try:
+
+                    res = self.results.get(timeout=self.poll)
+
+                except Empty:
+
+                    # Make sure our workers are still alive:
+
+                    if not self.closing and not all(proc.is_alive() for proc in self.procs):
+
+                        raise RuntimeError("Worker for {} exited!".format(self.hand.name))
+
+                    continue
+
+                if res is None:
+
+                    return
+
+                job, out = res
+
+                with self.lock:
+
+                    if job not in self.futures:
+
+                        # Already failed, nobody is waiting on it:
+
+                        continue
+
+                    fut, slot, key = self.futures.pop(job)
+
+                    if slot is not None:
+
+                        self.free.append(slot)
+
+                    self.in_flight -= 1
+
+                    if isinstance(out, DeadlineExpiredError):
+
+                        self.expired += 1
+
+                    elif isinstance(out, BaseException):
+
+                        self.failed += 1
+
+                    else:
+
+                        self.completed += 1
+
+                if not isinstance(out, BaseException):
+
+                    self.hand._remember(key, out)
+
+                _settle(fut, out)
+
+        except BaseException as e:
+
+            # We can no longer receive responses, fail everything in flight:
+
+            self.broken = e
+
+            self._fail_all(e)
+
+    def _fail_all(self, exc: BaseException):
+        """
+        Fails every request in flight with the given exception.
+
+        :param exc: Exception to fail the requests with
+        :type exc: BaseException
+        """
+
+        with self.lock:
+
+            futures = list(self.futures.values())
+
+            self.futures.clear()
+            self.free = deque(range(self.policy.max_in_flight))
+
+            self.failed += len(futures)
+            self.in_flight = 0
+
+        for fut, _, _ in futures:
+
+            _settle(fut, exc)
+
+
+def _settle(fut: Future, out: Any):
+    """
+    Resolves the given future with a response or exception.
+
+    Futures that are already done (such as when cancelled by their caller) are left alone.
+
+    :param fut: Future to resolve
+    :type fut: Future
+    :param out: Response, or exception to raise
+    :type out: Any
+    """
+
+    if fut.done():
+
+        return
+
+    try:
+
+        if isinstance(out, BaseException):
+
+            fut.set_exception(out)
+
+        else:
+
+            fut.set_result(out)
+
+    except InvalidStateError:
+
+        # Cancelled while we were resolving it:
+
+        pass
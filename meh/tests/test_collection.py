@@ -0,0 +1,1034 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import threading
+
+import pytest
+
+from ..collection import HandlerCollection, parse_directory
+from ..hand import BaseHandler, AsyncHandler
+from ..pools import ExecutionPolicy
+from ..shared import SharedFramePool
+from ..errors import HandlerRejectedError, DeadlineExpiredError
+from ..dispatch import DispatchPolicy
+from ..formatters import BaseFormatter
+from ..breaker import CircuitBreaker, ErrorThrottle
+from ..cache import ResultCache, MISS, frame_hash
+from ..resources import registry
+
+
+class EchoHandler(BaseHandler):
+    def __init__(self, name='echo', result=None):
+        super().__init__(name=name)
+        self.result = result
+        self.calls = 0
+
+    def handle(self, data):
+        self.calls += 1
+        return self.result
+
+
+class FailHandler(BaseHandler):
+    def handle(self, data):
+        raise ValueError("fail")
+
+
+class MetaHandler(BaseHandler):
+    def handle(self, data):
+        return data, self.meta
+
+
+class UpperFormatter(BaseFormatter):
+    def convert(self, data):
+        return data.upper()
+
+
+@pytest.fixture
+def hands():
+    return HandlerCollection()
+
+
+class TestRouting:
+    def test_known_id_runs_globals(self, hands):
+        first = hands.load_handler(EchoHandler(result='first'), ids=['frame'])
+        glob = hands.load_handler(EchoHandler(result='glob'), ids=[HandlerCollection.GLOBAL])
+        default = hands.load_handler(EchoHandler(result='default'), ids=[None])
+
+        assert hands.handle('frame', 'data', {}) == 'glob'
+        assert (first.calls, glob.calls, default.calls) == (1, 1, 0)
+
+    def test_unknown_id_uses_default(self, hands):
+        glob = hands.load_handler(EchoHandler(result='glob'), ids=[HandlerCollection.GLOBAL])
+        hands.load_handler(EchoHandler(result='default'), ids=[None])
+
+        assert hands.handle('missing', 'data', {}) == 'default'
+        assert glob.calls == 0
+
+    def test_unknown_id_does_not_add_keys(self, hands):
+        hands.load_handler(EchoHandler(), ids=['frame'])
+
+        for num in range(10):
+            hands.handle('missing{}'.format(num), 'data', {})
+
+        assert list(hands.hands) == ['frame']
+
+    def test_empty_response(self, hands):
+        hands.load_handler(EchoHandler(result=None), ids=['frame'])
+
+        assert hands.handle('frame', 'data', {}) is hands.empty
+
+    def test_routes_are_immutable(self, hands):
+        hands.load_handler(EchoHandler(), ids=['frame'])
+
+        with pytest.raises(TypeError):
+            hands.routes.events['other'] = ()
+
+    def test_unload_rebuilds_routes(self, hands):
+        hand = hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+        old = hands.routes
+
+        hands.unload_handler(hand)
+
+        assert 'frame' not in hands.routes.events
+        assert 'frame' in old.events
+        assert hands.handle('frame', 'data', {}) is hands.empty
+
+    def test_plain_handlers_run_directly(self, hands):
+        hand = hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+
+        assert hands.routes.direct('frame', None) == (hand._meta_handle_plain,)
+        assert hands.handle('frame', 'data', {}) == 'echo'
+
+        hands.start_all()
+
+        assert hands.routes.direct('frame', None) is None
+        assert hands.handle('frame', 'data', {}) == 'echo'
+
+        hands.stop_all()
+
+    def test_direct_handlers_keep_meta_and_formatters(self, hands):
+        hands.load_handler(MetaHandler(), ids=['plain'])
+        upper = hands.load_handler(MetaHandler(convert=UpperFormatter()), ids=['upper'])
+
+        assert hands.routes.direct('upper', None) == (upper._meta_handle,)
+        assert hands.handle('plain', 'data', {'id': 1}) == ('data', {'id': 1})
+        assert hands.handle('upper', 'data', {'id': 2}) == ('DATA', {'id': 2})
+
+
+class TestErrors:
+    def test_error_handlers(self, hands):
+        hands.load_handler(FailHandler(), ids=['frame'])
+        specific = hands.load_handler(EchoHandler(result='value'), ids=[ValueError])
+        default = hands.load_handler(EchoHandler(result='base'), ids=[BaseException])
+
+        assert hands.handle('frame', 'data', {}) == 'base'
+        assert (specific.calls, default.calls) == (1, 1)
+
+    def test_error_handle_accepts_class(self, hands):
+        default = hands.load_handler(EchoHandler(result='base'), ids=[BaseException])
+
+        assert hands.error_handle(ValueError, None, None, 'load', ValueError()) == 'base'
+        assert default.calls == 1
+
+
+class TestBreakers:
+    def test_breaker_opens(self, hands):
+        hand = hands.load_handler(FailHandler(), ids=['frame'])
+        hand.breaker_threshold = 3
+        error = hands.load_handler(EchoHandler(result='base'), ids=[BaseException])
+        hands.start_all()
+
+        for _ in range(5):
+            hands.handle('frame', 'data', {})
+
+        assert error.calls == 3
+        assert hands.breaker_stats()['FailHandler']['state'] == CircuitBreaker.OPEN
+        assert hands.breaker_stats()['FailHandler']['skipped'] == 2
+
+        hands.stop_all()
+
+    def test_breaker_half_open(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.failure()
+
+        assert breaker.allow()
+        assert not breaker.allow()
+
+        breaker.success()
+
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert breaker.allow()
+
+    def test_throttle_returns_last(self, hands):
+        hands.throttle = ErrorThrottle(rate=0, burst=2, sample=0)
+        hands.load_handler(FailHandler(), ids=['frame'])
+        error = hands.load_handler(EchoHandler(result='base'), ids=[BaseException])
+
+        assert [hands.handle('frame', 'data', {}) for _ in range(5)] == ['base'] * 5
+        assert error.calls == 2
+        assert hands.throttle.stats()['suppressed'] == 3
+
+
+class SlowHandler(BaseHandler):
+    timeout = 0.01
+
+    def __init__(self):
+        super().__init__(name='slow')
+        self.release = threading.Event()
+
+    def handle(self, data):
+        self.release.wait(0.5)
+        return 'slow'
+
+
+class TestDeadlines:
+    def test_expired_skips(self, hands):
+        hand = hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+
+        assert hands.handle('frame', 'data', {'deadline': time.time() * 1000 - 1}) == hands.late
+        assert asyncio.run(hands.handle_async('frame', 'data', {'timeout': -1})) == hands.late
+        assert hand.calls == 0
+        assert hands.expired == 2
+
+    def test_within_deadline(self, hands):
+        hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+
+        assert hands.handle('frame', 'data', {'timeout': 1000}) == 'echo'
+
+    def test_handler_timeout(self, hands):
+        hand = hands.load_handler(SlowHandler(), ids=['frame'])
+        hands.late = 'late'
+
+        assert hands.handle('frame', 'data', {}) == 'late'
+        assert asyncio.run(hands.handle_async('frame', 'data', {})) == 'late'
+        assert hands.timeouts == 2
+
+        hand.release.set()
+
+    def test_meta_is_optional(self, hands):
+        hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+
+        assert hands.handle('frame', 'data', None) == 'echo'
+        assert asyncio.run(hands.handle_async('frame', 'data', None)) == 'echo'
+
+    def test_meta_is_not_altered(self, hands):
+        hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+        meta = {'timeout': 1000}
+
+        hands.handle('frame', 'data', meta)
+
+        assert meta == {'timeout': 1000}
+
+    def test_runs_inline(self, hands):
+        threads = []
+        hand = hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+        hand.handle = lambda data: threads.append(threading.current_thread()) or 'echo'
+
+        assert hands.handle('frame', 'data', {'timeout': 1000}) == 'echo'
+        assert threads == [threading.current_thread()]
+
+    def test_deadline_does_not_open_breaker(self, hands):
+        hand = hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+        hand.breaker_threshold = 1
+        hand.handle = lambda data: time.sleep(0.02) or 'echo'
+        hands.start_all()
+
+        for _ in range(3):
+            assert hands.handle('frame', 'data', {'timeout': 10}) == hands.late
+
+        assert hands.breaker_stats()['echo']['state'] == CircuitBreaker.CLOSED
+        assert hands.timeouts == 3
+
+        hands.stop_all()
+
+    def test_own_timeout_error(self, hands):
+        hand = hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+        hand.timeout = 1
+        hand.convert = TimeoutFormatter()
+        hands.load_handler(EchoHandler(result='error'), ids=[BaseException])
+
+        assert hands.handle('frame', 'data', {}) == 'error'
+        assert asyncio.run(hands.handle_async('frame', 'data', {})) == 'error'
+        assert hands.timeouts == 0
+
+    def test_fanout_timeout(self, hands):
+        hand = hands.load_handler(SlowHandler(), ids=['frame'])
+        hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+        hands.set_policy('frame', DispatchPolicy(fanout=True, merge='list'))
+
+        assert hands.handle('frame', 'data', {}) == [hands.late, 'echo']
+
+        hand.release.set()
+
+
+class SleepHandler(AsyncHandler):
+    def __init__(self, result):
+        super().__init__(name='sleep')
+        self.result = result
+
+    async def handle(self, data):
+        await asyncio.sleep(0.01)
+        return {'result': self.result, 'group': self.meta['group']}
+
+
+class TestAsync:
+    def test_handle_async(self, hands):
+        sync = hands.load_handler(EchoHandler(result='sync'), ids=['frame'])
+        hands.load_handler(SleepHandler(result='async'), ids=[HandlerCollection.GLOBAL])
+
+        result = asyncio.run(hands.handle_async('frame', 'data', {'group': 'a'}))
+
+        assert result == {'result': 'async', 'group': 'a'}
+        assert sync.calls == 1
+
+    def test_meta_is_per_request(self, hands):
+        hands.load_handler(SleepHandler(result='async'), ids=['frame'])
+
+        async def run():
+            return await asyncio.gather(*(hands.handle_async('frame', 'data', {'group': num}) for num in range(5)))
+
+        assert [res['group'] for res in asyncio.run(run())] == list(range(5))
+
+    def test_async_handler_sync_dispatch(self, hands):
+        hands.load_handler(SleepHandler(result='async'), ids=['frame'])
+
+        assert hands.handle('frame', 'data', {'group': 'b'}) == {'result': 'async', 'group': 'b'}
+
+    def test_async_errors(self, hands):
+        hands.load_handler(FailHandler(), ids=['frame'])
+        hands.load_handler(EchoHandler(result='base'), ids=[BaseException])
+
+        assert asyncio.run(hands.handle_async('frame', 'data', {})) == 'base'
+
+
+class BlockHandler(BaseHandler):
+    policy = ExecutionPolicy(ExecutionPolicy.THREAD, workers=1, max_in_flight=1)
+
+    def __init__(self):
+        super().__init__(name='block')
+        self.release = threading.Event()
+
+    def handle(self, data):
+        self.release.wait(5)
+        return threading.current_thread().name
+
+
+class TestPools:
+    def test_runs_in_pool(self, hands):
+        hand = hands.load_handler(BlockHandler(), ids=['frame'])
+        hands.start_all()
+        hand.release.set()
+
+        assert hands.handle('frame', 'data', {}).startswith('block')
+        assert hands.pool_stats()['block']['completed'] == 1
+
+        hands.stop_all()
+        assert hand.pool is None
+
+    def test_rejects_over_limit(self, hands):
+        hand = hands.load_handler(BlockHandler(), ids=['frame'])
+        hands.load_handler(EchoHandler(result='rejected'), ids=[BaseException])
+        hands.start_all()
+
+        thread = threading.Thread(target=hands.handle, args=('frame', 'data', {}))
+        thread.start()
+
+        while hand.pool.in_flight == 0:
+            pass
+
+        assert hands.handle('frame', 'data', {}) == 'rejected'
+        assert hands.pool_stats()['block']['rejected'] == 1
+
+        hand.release.set()
+        thread.join()
+        hands.stop_all()
+
+
+class WaitHandler(BaseHandler):
+    def __init__(self, name, barrier):
+        super().__init__(name=name)
+        self.barrier = barrier
+
+    def handle(self, data):
+        self.barrier.wait(5)
+        return {self.name: data}
+
+
+class TimeoutFormatter(BaseFormatter):
+    def convert(self, data):
+        raise TimeoutError("socket timed out")
+
+
+class TestFanout:
+    def test_fanout_runs_concurrently(self, hands):
+        barrier = threading.Barrier(2)
+        hands.load_handler(WaitHandler('hand', barrier), ids=['frame'])
+        hands.load_handler(WaitHandler('face', barrier), ids=['frame'])
+        hands.set_policy('frame', DispatchPolicy(fanout=True, merge='json'))
+
+        assert json.loads(hands.handle('frame', 1, {})) == {'hand': 1, 'face': 1}
+
+    def test_fanout_async(self, hands):
+        barrier = threading.Barrier(2)
+        hands.load_handler(WaitHandler('hand', barrier), ids=['frame'])
+        hands.load_handler(WaitHandler('face', barrier), ids=[HandlerCollection.GLOBAL])
+        hands.set_policy('frame', DispatchPolicy(fanout=True, merge='list'))
+
+        assert asyncio.run(hands.handle_async('frame', 1, {})) == [{'hand': 1}, {'face': 1}]
+
+    def test_fanout_errors(self, hands):
+        hands.load_handler(FailHandler(), ids=['frame'])
+        hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+        hands.load_handler(EchoHandler(result='base'), ids=[BaseException])
+        hands.set_policy('frame', DispatchPolicy(fanout=True, merge='list'))
+
+        assert hands.handle('frame', 1, {}) == ['base', 'echo']
+
+    def test_fanout_submit_timeout(self, hands):
+        hand = hands.load_handler(BatchHandler(), ids=['frame'])
+        hand.convert = TimeoutFormatter()
+        hands.load_handler(EchoHandler(result='echo'), ids=['frame'])
+        hands.load_handler(EchoHandler(result='base'), ids=[BaseException])
+        hands.set_policy('frame', DispatchPolicy(fanout=True, merge='list'))
+        hands.start_all()
+
+        assert hands.handle('frame', 1, {}) == ['base', 'echo']
+        assert hands.timeouts == 0
+
+        hands.stop_all()
+
+    def test_default_policy(self, hands):
+        hands.load_handler(EchoHandler(result='first'), ids=[None])
+        hands.load_handler(EchoHandler(result='second'), ids=[None])
+        hands.set_policy(None, DispatchPolicy(merge='first'))
+
+        assert hands.handle('missing', 1, {}) == 'first'
+
+
+class TestPriority:
+    def test_priority_order(self, hands):
+        low = hands.load_handler(EchoHandler(result='low'), ids=['frame'])
+        glob = hands.load_handler(EchoHandler(result='glob'), ids=[HandlerCollection.GLOBAL])
+        high = hands.load_handler(EchoHandler(result='high'), ids=['frame'])
+        high.priority = 10
+        hands._build_routes()
+
+        assert hands.routes.events['frame'] == (high, low, glob)
+
+    def test_short_circuit(self, hands):
+        cache = hands.load_handler(EchoHandler(result='cached'), ids=['frame'])
+        cache.priority = 10
+        expensive = hands.load_handler(EchoHandler(result='expensive'), ids=['frame'])
+        hands.set_policy('frame', DispatchPolicy(short_circuit=True))
+
+        assert hands.handle('frame', 1, {}) == 'cached'
+        assert expensive.calls == 0
+
+        cache.result = None
+
+        assert hands.handle('frame', 1, {}) == 'expensive'
+        assert asyncio.run(hands.handle_async('frame', 1, {})) == 'expensive'
+
+    def test_short_circuit_fanout(self, hands):
+        barrier = threading.Barrier(2)
+        for name in ('hand', 'face'):
+            hands.load_handler(WaitHandler(name, barrier), ids=['frame']).priority = 5
+        slow = hands.load_handler(EchoHandler(result='slow'), ids=['frame'])
+        hands.set_policy('frame', DispatchPolicy(fanout=True, merge='list', short_circuit=True))
+
+        assert hands.handle('frame', 1, {}) == [{'hand': 1}, {'face': 1}]
+        assert slow.calls == 0
+
+
+class BatchHandler(BaseHandler):
+    batch_size = 4
+    batch_timeout = 5
+
+    def __init__(self):
+        super().__init__(name='batch')
+        self.batches = []
+
+    def handle_batch(self, data, meta):
+        self.batches.append(len(data))
+        return [ValueError(dat) if dat == 'bad' else (dat, met['conn']) for dat, met in zip(data, meta)]
+
+
+class ThreadFormatter(BaseFormatter):
+    def __init__(self):
+        self.threads = []
+
+    def convert(self, data):
+        self.threads.append(threading.current_thread())
+        return data
+
+
+class TestBatching:
+    def test_batches_requests(self, hands):
+        hand = hands.load_handler(BatchHandler(), ids=['frame'])
+        hands.load_handler(EchoHandler(result='error'), ids=[BaseException])
+        hands.start_all()
+
+        async def run():
+            return await asyncio.gather(*(hands.handle_async('frame', dat, {'conn': num}) for num, dat in enumerate(['a', 'b', 'bad', 'c'])))
+
+        assert asyncio.run(run()) == [('a', 0), ('b', 1), 'error', ('c', 3)]
+        assert hand.batches == [4]
+        assert hands.pool_stats()['batch']['failed'] == 1
+
+        hands.stop_all()
+
+    def test_converts_off_the_loop(self, hands):
+        hand = hands.load_handler(BatchHandler(), ids=['frame'])
+        hand.batch_timeout = 0.01
+        hand.convert = ThreadFormatter()
+        hands.start_all()
+
+        assert asyncio.run(hands.handle_async('frame', 'a', {'conn': 0})) == ('a', 0)
+        assert hand.convert.threads and threading.current_thread() not in hand.convert.threads
+
+        hands.stop_all()
+
+    def test_rejects_before_converting(self, hands):
+        hand = hands.load_handler(BatchHandler(), ids=['frame'])
+        hand.policy = ExecutionPolicy(ExecutionPolicy.THREAD, max_in_flight=1)
+        hands.start_all()
+
+        hand.pool.submit('a', {'conn': 0})
+        hand.convert = TimeoutFormatter()
+
+        with pytest.raises(HandlerRejectedError):
+            hand.pool.submit('b', {'conn': 1})
+
+        hands.stop_all()
+
+    def test_batch_timeout(self, hands):
+        hand = hands.load_handler(BatchHandler(), ids=['frame'])
+        hand.batch_timeout = 0.01
+        hands.start_all()
+
+        assert hands.handle('frame', 'a', {'conn': 0}) == ('a', 0)
+        assert hand.batches == [1]
+
+        hands.stop_all()
+
+
+class SlowBatchHandler(BaseHandler):
+    batch_size = 1
+    timeout = 0.05
+
+    def __init__(self):
+        super().__init__(name='slow_batch')
+        self.delay = 0.2
+        self.handled = []
+
+    def handle_batch(self, data, meta):
+        self.handled.extend(data)
+        time.sleep(self.delay)
+        return list(data)
+
+
+class TestBatchTimeout:
+    def test_recovers_after_timeout(self, hands):
+        hand = hands.load_handler(SlowBatchHandler(), ids=['frame'])
+        hand.breaker_threshold = None
+        hands.start_all()
+
+        assert hands.handle('frame', 'a', {}) == hands.late
+
+        hand.delay = 0
+        time.sleep(0.2)
+
+        assert hands.handle('frame', 'b', {}) == 'b'
+        assert hand.pool.thread.is_alive()
+
+        hands.stop_all()
+
+    def test_cancelled_requests_are_skipped(self, hands):
+        hand = hands.load_handler(SlowBatchHandler(), ids=['frame'])
+        hands.start_all()
+
+        async def run():
+            first = await hands.handle_async('frame', 'a', {})
+            second = await hands.handle_async('frame', 'b', {})
+            hand.delay = 0
+            await asyncio.sleep(0.2)
+            return first, second, await hands.handle_async('frame', 'c', {})
+
+        assert asyncio.run(run()) == (hands.late, hands.late, 'c')
+        assert hand.pool.thread.is_alive()
+
+        hands.stop_all()
+
+    def test_late_requests_are_cancelled(self, hands):
+        hand = hands.load_handler(SlowBatchHandler(), ids=['frame'])
+        hand.breaker_threshold = None
+        hands.start_all()
+
+        assert hands.handle('frame', 'a', {}) == hands.late
+        assert hands.handle('frame', 'b', {}) == hands.late
+
+        time.sleep(0.3)
+
+        assert hand.handled == ['a']
+
+        hands.stop_all()
+
+    def test_expired_requests_are_dropped(self, hands):
+        hand = hands.load_handler(SlowBatchHandler(), ids=['frame'])
+        hands.start_all()
+
+        first = hand.pool.submit('a', {})
+        second = hand.pool.submit('b', {'deadline': time.time() * 1000 + 50})
+
+        assert first.result() == 'a'
+
+        with pytest.raises(DeadlineExpiredError):
+            second.result()
+
+        assert hand.handled == ['a']
+        assert hands.pool_stats()['slow_batch']['expired'] == 1
+
+        hands.stop_all()
+
+
+class CountFormatter(BaseFormatter):
+    count = 0
+
+    def convert(self, data):
+        CountFormatter.count += 1
+        return data.upper()
+
+
+class ConvertHandler(BaseHandler):
+    def __init__(self):
+        super().__init__(name='convert', convert=CountFormatter())
+
+    def handle(self, data):
+        return data
+
+
+class TestConversionCache:
+    def test_converts_once(self, hands):
+        CountFormatter.count = 0
+        hands.load_handler(ConvertHandler(), ids=['frame'])
+        hands.load_handler(ConvertHandler(), ids=['frame'])
+
+        assert hands.handle('frame', 'data', {}) == 'DATA'
+        assert CountFormatter.count == 1
+
+    def test_shared_routes(self, hands):
+        hands.load_handler(EchoHandler(), ids=['plain'])
+        hands.load_handler(EchoHandler(), ids=['plain', 'mixed'])
+        hands.load_handler(ConvertHandler(), ids=['mixed', 'frame'])
+        hands.load_handler(ConvertHandler(), ids=['frame'])
+
+        assert hands.routes.shared == {'frame'}
+
+    def test_converts_once_fanout(self, hands):
+        CountFormatter.count = 0
+        for _ in range(4):
+            hands.load_handler(ConvertHandler(), ids=['frame'])
+        hands.set_policy('frame', DispatchPolicy(fanout=True, merge='list'))
+
+        assert hands.handle('frame', 'data', {}) == ['DATA'] * 4
+        assert CountFormatter.count == 1
+
+
+class CachedHandler(EchoHandler):
+    cache_size = 2
+    cache_meta = ('group',)
+
+    def handle(self, data):
+        self.calls += 1
+        return (data, self.meta.get('group'))
+
+
+class CachedBatchHandler(BatchHandler):
+    batch_timeout = 0.01
+    cache_size = 8
+
+
+class TestResultCache:
+    def test_lru_and_ttl(self):
+        cache = ResultCache(size=2, ttl=0.05)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        assert cache.get('b') is MISS
+        assert cache.get('a') == 1
+        assert cache.stats()['evictions'] == 1
+
+        time.sleep(0.06)
+
+        assert cache.get('a') is MISS
+        assert (cache.hits, cache.misses) == (2, 2)
+
+    def test_exact_frame_hash(self):
+        np = pytest.importorskip('numpy')
+        frame = np.zeros((32, 32, 3), dtype=np.uint8)
+        similar = frame.copy()
+        similar[0, 0] = 1
+
+        assert frame_hash(frame) == frame_hash(similar)
+        assert frame_hash(frame, None) != frame_hash(similar, None)
+        assert frame_hash(frame, None) == frame_hash(frame.copy(), None)
+
+    def test_handler_cache(self, hands):
+        hand = hands.load_handler(CachedHandler(), ids=['frame'])
+        hands.start_all()
+
+        for group in ('a', 'a', 'b'):
+            assert hands.handle('frame', 'data', {'group': group}) == ('data', group)
+
+        assert asyncio.run(hands.handle_async('frame', 'data', {'group': 'b'})) == ('data', 'b')
+        assert hand.calls == 2
+        assert hands.cache_stats()['echo']['hits'] == 2
+
+        hands.stop_all()
+        assert hand.results is None
+
+    def test_batch_cache(self, hands):
+        hand = hands.load_handler(CachedBatchHandler(), ids=['frame'])
+        hands.start_all()
+
+        assert hands.handle('frame', 'a', {'conn': 0}) == ('a', 0)
+        assert hands.handle('frame', 'a', {'conn': 0}) == ('a', 0)
+        assert hand.batches == [1]
+        assert hands.pool_stats()['batch']['cached'] == 1
+
+        hands.stop_all()
+
+
+LAZY_MODULE = """
+from meh.hand import BaseHandler, PrintHandler
+
+
+class LazyHandler(BaseHandler):
+    ids = ['lazy', 'other']
+
+    def handle(self, data):
+        return 'lazy'
+
+
+class LazyChild(LazyHandler):
+    pass
+"""
+
+EAGER_MODULE = """
+from meh.hand import BaseHandler, PrintHandler
+
+
+class EagerErrors(PrintHandler):
+    ids = [BaseException]
+"""
+
+
+class TestDiscovery:
+    @pytest.fixture
+    def path(self, tmp_path):
+        (tmp_path / 'meh_lazy_mod.py').write_text(LAZY_MODULE)
+        (tmp_path / 'meh_eager_mod.py').write_text(EAGER_MODULE)
+        yield str(tmp_path)
+        sys.modules.pop('meh_lazy_mod', None)
+        sys.modules.pop('meh_eager_mod', None)
+
+    def test_eager_skips_imported(self, hands, path):
+        assert parse_directory(path, hands) == 3
+        assert sorted(type(hand).__name__ for _, hand in hands.iter_handlers()) == ['EagerErrors', 'LazyChild', 'LazyChild', 'LazyHandler', 'LazyHandler']
+
+    def test_lazy_loads_on_first_event(self, hands, path):
+        assert parse_directory(path, hands, lazy=True) == 3
+        hands.start_all()
+
+        assert 'meh_lazy_mod' not in sys.modules
+        assert 'meh_eager_mod' in sys.modules
+        assert set(hands.pending) == {'lazy', 'other'}
+
+        assert hands.handle('lazy', 'data', {}) == 'lazy'
+        assert 'meh_lazy_mod' in sys.modules
+        assert not hands.pending
+        assert all(hand.running for _, hand in hands.iter_handlers())
+
+        hands.stop_all()
+
+    def test_allow_deny(self, hands, path):
+        assert parse_directory(path, hands, allow=['meh_lazy_mod'], deny=['*.LazyChild']) == 1
+        assert 'meh_eager_mod' not in sys.modules
+        assert [type(hand).__name__ for _, hand in hands.iter_handlers()] == ['LazyHandler', 'LazyHandler']
+
+    def test_lazy_async(self, hands, path):
+        parse_directory(path, hands, lazy=True)
+
+        assert asyncio.run(hands.handle_async('other', 'data', {})) == 'lazy'
+
+
+RELOAD_MODULE = """
+import threading
+
+from meh.hand import BaseHandler
+
+
+class ReloadHandler(BaseHandler):
+    ids = ['reload']
+    release = threading.Event()
+    instances = []
+
+    def __init__(self):
+        super().__init__(name='reload')
+        self.stopped = False
+        self.unloaded = False
+        self.instances.append(self)
+
+    def start(self):
+        if VERSION == 3:
+            raise RuntimeError("start failed")
+
+    def stop(self):
+        self.stopped = True
+
+    def unload(self):
+        self.unloaded = True
+
+    def handle(self, data):
+        if data == 'block':
+            self.release.wait(5)
+        return VERSION
+"""
+
+
+class TestReload:
+    @pytest.fixture
+    def path(self, tmp_path):
+        (tmp_path / 'meh_reload_mod.py').write_text('VERSION = 1' + RELOAD_MODULE)
+        yield tmp_path
+        sys.modules.pop('meh_reload_mod', None)
+
+    def test_reload_swaps(self, hands, path):
+        parse_directory(str(path), hands)
+        hands.start_all()
+        old = hands.routes.events['reload'][0]
+
+        (path / 'meh_reload_mod.py').write_text('VERSION = 2' + RELOAD_MODULE)
+        new = hands.reload('meh_reload_mod')
+
+        assert hands.handle('reload', 'data', {}) == 2
+        assert new[0].running and old.stopped and not old.running
+        assert hands.routes.events['reload'] == tuple(new)
+
+    def test_reload_waits_in_flight(self, hands, path):
+        parse_directory(str(path), hands)
+        hands.start_all()
+        old = hands.routes.events['reload'][0]
+        results = []
+
+        thread = threading.Thread(target=lambda: results.append(hands.handle('reload', 'block', {})))
+        thread.start()
+
+        while hands.routes.flight.count == 0:
+            pass
+
+        reload = threading.Thread(target=hands.reload, args=('meh_reload_mod',))
+        reload.start()
+
+        while 'reload' in hands.routes.events and hands.routes.events['reload'][0] is old:
+            pass
+
+        assert not old.stopped
+        assert hands.handle('reload', 'data', {}) == 1
+
+        old.release.set()
+        thread.join()
+        reload.join()
+
+        assert results == [1]
+        assert old.stopped
+
+    def test_reload_waits_older_tables(self, hands, path):
+        parse_directory(str(path), hands)
+        hands.start_all()
+        old = hands.routes.events['reload'][0]
+
+        thread = threading.Thread(target=hands.handle, args=('reload', 'block', {}))
+        thread.start()
+
+        while hands.routes.flight.count == 0:
+            pass
+
+        hands.set_policy('other', DispatchPolicy(merge='list'))
+
+        reload = threading.Thread(target=hands.reload, args=('meh_reload_mod',))
+        reload.start()
+        time.sleep(0.1)
+
+        assert not old.stopped
+
+        old.release.set()
+        thread.join()
+        reload.join()
+
+        assert old.stopped
+
+    def test_reload_start_failure_unloads_new(self, hands, path):
+        parse_directory(str(path), hands)
+        hands.load_handler(EchoHandler(result='error'), ids=[BaseException])
+        hands.start_all()
+        old = hands.routes.events['reload'][0]
+
+        (path / 'meh_reload_mod.py').write_text('VERSION = 3' + RELOAD_MODULE)
+
+        assert hands.reload('meh_reload_mod') == []
+        assert hands.routes.events['reload'] == (old,)
+
+        new = sys.modules['meh_reload_mod'].ReloadHandler.instances[-1]
+
+        assert new.unloaded and not new.running and new.collection is None
+
+    def test_reload_failure_keeps_old(self, hands, path):
+        parse_directory(str(path), hands)
+        old = hands.routes.events['reload'][0]
+        hands.load_handler(EchoHandler(result='error'), ids=[BaseException])
+
+        (path / 'meh_reload_mod.py').write_text('raise ImportError()')
+
+        assert hands.reload('meh_reload_mod') == []
+        assert hands.routes.events['reload'] == (old,)
+
+
+RESOURCE_MODULE = """
+from meh.hand import BaseHandler
+from meh.resources import registry
+
+
+class ResourceHandler(BaseHandler):
+    ids = ['resource']
+    resources = ('meh_reload_model',)
+
+    def __init__(self):
+        super().__init__(name='resource')
+        self.model = None
+
+    def start(self):
+        self.model = registry.acquire('meh_reload_model')
+
+    def stop(self):
+        registry.release('meh_reload_model', self.model)
+
+    def handle(self, data):
+        return self.model
+"""
+
+
+class TestReloadResources:
+    @pytest.fixture
+    def path(self, tmp_path):
+        (tmp_path / 'meh_resource_mod.py').write_text(RESOURCE_MODULE)
+        registry.register('meh_reload_model', lambda: [])
+        yield tmp_path
+        sys.modules.pop('meh_resource_mod', None)
+        registry.resources.pop('meh_reload_model', None)
+
+    def test_reload_refreshes(self, hands, path):
+        parse_directory(str(path), hands)
+        hands.start_all()
+        old = hands.handle('resource', 'data', {})
+
+        hands.reload('meh_resource_mod')
+
+        assert hands.handle('resource', 'data', {}) is not old
+        assert registry.stats()['meh_reload_model']['refs'] == 1
+        assert registry.stats()['meh_reload_model']['stale'] == 0
+
+
+class SharedHandler(BaseHandler):
+    policy = ExecutionPolicy(ExecutionPolicy.SHARED, workers=2, max_in_flight=4, slot_size=1024)
+
+    def __init__(self):
+        super().__init__(name='shared')
+
+        self.started = False
+
+    def start(self):
+        self.started = True
+
+    def handle(self, data):
+        if data == 'bad':
+            raise ValueError(data)
+        if data == 'slow':
+            time.sleep(0.1)
+        if data == 'exit':
+            os._exit(1)
+        return (data, self.meta['n'], os.getpid())
+
+
+class TestSharedPool:
+    def test_runs_in_workers(self, hands):
+        hands.load_handler(SharedHandler(), ids=['frame'])
+        hands.load_handler(EchoHandler(result='error'), ids=[BaseException])
+        hands.start_all()
+
+        async def run():
+            return await asyncio.gather(*(hands.handle_async('frame', dat, {'n': num}) for num, dat in enumerate(['a', 'b', 'bad', 'c'])))
+
+        results = asyncio.run(run())
+
+        assert [res if res == 'error' else res[:2] for res in results] == [('a', 0), ('b', 1), 'error', ('c', 3)]
+        assert all(res[2] != os.getpid() for res in results if res != 'error')
+
+        stats = hands.pool_stats()['shared']
+        assert (stats['completed'], stats['failed'], stats['in_flight']) == (3, 1, 0)
+
+        hands.stop_all()
+        assert hands.pool_stats() == {}
+
+    def test_cancelled_future(self, hands):
+        hand = hands.load_handler(SharedHandler(), ids=['frame'])
+        hands.start_all()
+
+        hand.pool.submit('slow', {'n': 0}).cancel()
+        time.sleep(0.2)
+
+        assert hands.handle('frame', 'a', {'n': 1})[:2] == ('a', 1)
+        assert hand.pool.collector.is_alive()
+
+        hands.stop_all()
+
+    def test_expired_requests_are_dropped(self, hands):
+        hand = hands.load_handler(SharedHandler(), ids=['frame'])
+        hands.start_all()
+
+        with pytest.raises(DeadlineExpiredError):
+            hand.pool.submit('a', {'n': 0, 'deadline': time.time() * 1000 - 1}).result(5)
+
+        assert hand.pool.stats()['expired'] == 1
+
+        hands.stop_all()
+
+    def test_worker_exit_fails_requests(self, hands, monkeypatch):
+        monkeypatch.setattr(SharedFramePool, 'poll', 0.05)
+        hand = hands.load_handler(SharedHandler(), ids=['frame'])
+        hands.start_all()
+        pool = hand.pool
+
+        with pytest.raises(RuntimeError):
+            pool.submit('exit', {'n': 0}).result(5)
+
+        with pytest.raises(HandlerRejectedError):
+            pool.submit('a', {'n': 1})
+
+        assert pool.stats()['in_flight'] == 0
+
+        hands.stop_all()
+        assert pool.shm is None
+
+    def test_not_started_in_parent(self, hands):
+        hand = hands.load_handler(SharedHandler(), ids=['frame'])
+        hands.start_all()
+
+        assert hand.running and not hand.started
+
+        hands.stop_all()
+
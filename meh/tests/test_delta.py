@@ -0,0 +1,47 @@
+from ..delta import DeltaTracker
+
+
+class TestDeltaTracker:
+    def test_first_response_is_keyframe(self):
+        tracker = DeltaTracker()
+
+        assert tracker.update('face', {'name': 'unknown'}) == ({'name': 'unknown'}, True)
+
+    def test_unchanged_is_skipped(self):
+        tracker = DeltaTracker()
+        tracker.update('face', {'name': 'unknown'})
+
+        assert tracker.update('face', {'name': 'unknown'}) == (None, False)
+        assert tracker.stats()['skipped'] == 1
+
+    def test_only_changes_are_sent(self):
+        tracker = DeltaTracker()
+        tracker.update('hand', {'hand': 'fist', 'landmarks': 'a', 'old': 1})
+
+        assert tracker.update('hand', {'hand': 'fist', 'landmarks': 'b', 'new': 2}) == ({'landmarks': 'b', 'new': 2, 'old': None}, False)
+
+    def test_events_are_tracked_apart(self):
+        tracker = DeltaTracker()
+        tracker.update('face', {'name': 'unknown'})
+
+        assert tracker.update('hand', {'name': 'unknown'}) == ({'name': 'unknown'}, True)
+
+    def test_keyframes(self):
+        tracker = DeltaTracker(interval=0)
+        tracker.update('face', {'name': 'unknown'})
+
+        assert tracker.update('face', {'name': 'unknown'}) == ({'name': 'unknown'}, True)
+
+        tracker.interval = 60
+
+        assert tracker.update('face', {'name': 'unknown'}, keyframe=True) == ({'name': 'unknown'}, True)
+
+        tracker.reset('face')
+
+        assert tracker.update('face', {'name': 'unknown'})[1]
+
+    def test_other_responses_are_sent_in_full(self):
+        tracker = DeltaTracker()
+        tracker.update('error', 'failed')
+
+        assert tracker.update('error', 'failed') == ('failed', True)
@@ -0,0 +1,43 @@
+import pytest
+
+from ..envelope import HEADER, FLAG_TEXT, is_envelope, pack, unpack
+from ..errors import EnvelopeError
+
+
+class TestEnvelope:
+    def test_round_trip(self):
+        meta = {'id': 'face', 'nested': {'a': [1, {'b': '}'}]}}
+        env = unpack(pack(meta, b'\xff\xd8jpeg}'))
+
+        assert env.meta == meta
+        assert bytes(env.payload) == b'\xff\xd8jpeg}'
+        assert env.flags == 0
+
+    def test_payload_not_copied(self):
+        data = bytearray(pack({'id': 'face'}, b'frame'))
+        env = unpack(data)
+
+        assert env.payload.obj is data
+
+    def test_text_payload(self):
+        env = unpack(pack({'id': 'dummy'}, 'hello'))
+
+        assert env.payload == 'hello'
+        assert env.flags & FLAG_TEXT
+
+    def test_is_envelope(self):
+        assert is_envelope(pack({}))
+        assert not is_envelope(b'{"id": "face"}')
+        assert not is_envelope('ME')
+
+    @pytest.mark.parametrize('data', [
+        b'ME',
+        HEADER.pack(b'XX', 1, 0, 0),
+        HEADER.pack(b'ME', 9, 0, 0),
+        HEADER.pack(b'ME', 1, 0, 100) + b'{}',
+        HEADER.pack(b'ME', 1, 0, 2) + b'[]',
+        HEADER.pack(b'ME', 1, 0, 2) + b'{x',
+    ])
+    def test_malformed(self, data):
+        with pytest.raises(EnvelopeError):
+            unpack(data)
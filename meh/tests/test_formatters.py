@@ -0,0 +1,131 @@
+import os
+import json
+import base64
+
+import pytest
+
+from .. import formatters
+from ..cache import ResultCache
+from ..formatters import (ConversionCache, Base64ImageFormatter, BinaryImageFormatter, JSONFormatter,
+                          FastJSONFormatter, MsgPackFormatter, NegotiatedFormatter, ImageArrayFormatter,
+                          ScaledImageFormatter)
+from ..hand import BaseHandler
+
+JPEG = b'\xff\xd8\xff\xe0fake jpeg\xff\xd9'
+URI = 'data:image/jpeg;base64,' + base64.b64encode(JPEG).decode('ascii')
+IMAGE = os.path.join(os.path.dirname(__file__), '..', '..', 'face_images', 'BarackObama.jpg')
+
+
+class TestBinaryImage:
+    def test_bytes_are_not_copied(self):
+        data = bytearray(JPEG)
+        view = BinaryImageFormatter().convert(data)
+
+        assert isinstance(view, memoryview)
+        assert view.obj is data
+
+    def test_accepts_data_uri(self):
+        assert bytes(BinaryImageFormatter().convert(URI)) == JPEG
+
+    def test_revert(self):
+        assert BinaryImageFormatter().revert(memoryview(JPEG)) == JPEG
+
+    def test_text_and_binary_agree(self):
+        cache = ConversionCache()
+
+        assert bytes(BinaryImageFormatter().convert_cached(URI, cache)) == Base64ImageFormatter().convert(URI)
+
+
+class Number:
+    def tolist(self):
+        return 7
+
+
+class TestFastJSON:
+    @pytest.mark.parametrize('backend', ['orjson', 'json'])
+    def test_round_trip(self, monkeypatch, backend):
+        if backend == 'json':
+            monkeypatch.setattr(formatters, 'orjson', None)
+
+        form = FastJSONFormatter()
+        text = form.revert({'name': 'test', 'boxes': [[1, 2]], 'score': Number()})
+
+        assert json.loads(text) == {'name': 'test', 'boxes': [[1, 2]], 'score': 7}
+        assert form.convert(memoryview(text.encode())) == form.convert(text) == JSONFormatter().convert(text)
+
+    @pytest.mark.parametrize('backend', ['orjson', 'json'])
+    def test_bytes_as_base64(self, monkeypatch, backend):
+        if backend == 'json':
+            monkeypatch.setattr(formatters, 'orjson', None)
+
+        assert json.loads(FastJSONFormatter().revert({'box': b'\x01\x02'})) == {'box': 'AQI='}
+
+
+class TestMsgPack:
+    def test_requires_msgpack(self, monkeypatch):
+        monkeypatch.setattr(formatters, 'msgpack', None)
+
+        with pytest.raises(ImportError):
+            MsgPackFormatter()
+
+
+class UpperFormatter(FastJSONFormatter):
+    def revert(self, data):
+        return super().revert(data).upper()
+
+
+class NegotiatedHandler(BaseHandler):
+    cache_size = 8
+
+    def __init__(self):
+        super().__init__(name='negotiated', revert=NegotiatedFormatter({'json': FastJSONFormatter(), 'upper': UpperFormatter()}))
+
+    def handle(self, data):
+        return {'name': data}
+
+
+class TestNegotiated:
+    def test_selects_format(self):
+        form = NegotiatedFormatter({'json': FastJSONFormatter(), 'upper': UpperFormatter()})
+
+        assert form.revert_for('a', {'format': 'upper'}) == '"A"'
+        assert form.revert_for('a', {'format': 'unknown'}) == '"a"'
+        assert form.revert_for('a', None) == form.revert('a') == '"a"'
+
+    def test_default_formats(self):
+        form = NegotiatedFormatter()
+
+        assert 'json' in form.formats
+        assert ('msgpack' in form.formats) == (formatters.msgpack is not None)
+
+    def test_cache_keeps_formats_apart(self):
+        hand = NegotiatedHandler()
+        hand.results = ResultCache()
+
+        assert hand._meta_handle('a', {'format': 'upper'}) == '{"NAME":"A"}'
+        assert hand._meta_handle('a', {}) == '{"name":"a"}'
+
+
+class TestScaledImage:
+    @pytest.fixture(autouse=True)
+    def image(self):
+        pytest.importorskip('numpy')
+        pytest.importorskip('PIL')
+
+        with open(IMAGE, 'rb') as f:
+            self.data = f.read()
+
+    def test_scales_while_decoding(self):
+        full = ImageArrayFormatter().convert(self.data)
+        small = ScaledImageFormatter((64, 64)).convert(memoryview(self.data))
+
+        assert small.shape[0] < full.shape[0] and small.shape[1] < full.shape[1]
+        assert min(small.shape[:2]) >= 64
+        assert small.shape[2] == 3 and not small.flags.writeable
+
+    def test_sizes_are_cached_apart(self):
+        cache = ConversionCache()
+        small = ScaledImageFormatter((64, 64)).convert_cached(self.data, cache)
+
+        assert ScaledImageFormatter((64, 64)).convert_cached(self.data, cache) is small
+        assert ScaledImageFormatter((4096, 4096)).convert_cached(self.data, cache) is not small
@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+from ..mailbox import Mailbox, AsyncMailbox
+
+
+class TestMailbox:
+    def test_latest_wins(self):
+        box = Mailbox()
+
+        assert not box.put(1)
+        assert box.put(2)
+        assert box.take() == 2
+        assert box.stats() == {'received': 2, 'dropped': 1, 'waiting': False}
+
+    def test_take_waits(self):
+        box = Mailbox()
+        threading.Timer(0.05, box.put, (1,)).start()
+
+        assert box.take(timeout=5) == 1
+        assert box.take(timeout=0.01) is None
+
+    def test_close_wakes_taker(self):
+        box = Mailbox()
+        box.put(1)
+        threading.Timer(0.05, box.close).start()
+
+        assert box.take() == 1
+        assert box.take() is None
+
+
+class TestAsyncMailbox:
+    def test_latest_wins(self):
+        async def run():
+            box = AsyncMailbox()
+            box.put(1)
+            box.put(2)
+            first = await box.take()
+            waiter = asyncio.ensure_future(box.take())
+            await asyncio.sleep(0)
+            box.put(3)
+            second = await waiter
+            box.close()
+            return first, second, await box.take(), box.dropped
+
+        assert asyncio.run(run()) == (2, 3, None, 1)
+
+    def test_timeout(self):
+        assert asyncio.run(AsyncMailbox().take(timeout=0.01)) is None
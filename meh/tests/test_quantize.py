@@ -0,0 +1,21 @@
+import pytest
+
+from ..quantize import SCALE, quantize, dequantize
+
+
+class TestQuantize:
+    def test_round_trip(self):
+        points = [(0.25, 0.5), (0.0, 1.0), (0.123456, 0.987654)]
+        data = quantize(points)
+
+        assert len(data) == 12
+        assert dequantize(data) == pytest.approx([0.25, 0.5, 0.0, 1.0, 0.123456, 0.987654], abs=1 / SCALE)
+
+    def test_clips_to_range(self):
+        assert dequantize(quantize([-0.5, 1.5])) == [0.0, 1.0]
+
+    def test_custom_range(self):
+        assert dequantize(quantize([-1.0, 0.0, 1.0], -1, 1), -1, 1) == pytest.approx([-1.0, 0.0, 1.0], abs=2 / SCALE)
+
+    def test_landmarks_are_compact(self):
+        assert len(quantize([(0.5, 0.5)] * 21)) == 84
@@ -0,0 +1,31 @@
+from ..rate import RateAdvisor
+
+
+class TestRateAdvisor:
+    def test_idle_hints(self):
+        advisor = RateAdvisor(capacity=4)
+        tracker = advisor.track()
+
+        assert advisor.hints(tracker) == {'interval': 100, 'width': 640, 'quality': 0.9}
+
+    def test_interval_follows_latency(self):
+        advisor = RateAdvisor(capacity=4)
+        tracker = advisor.track()
+        advisor.end(tracker, advisor.begin() - 0.5)
+
+        assert tracker.latency >= 0.5
+        assert 500 <= advisor.hints(tracker)['interval'] <= 2000
+
+    def test_backs_off_under_load(self):
+        advisor = RateAdvisor(capacity=2, alpha=1.0)
+        tracker = advisor.track()
+        advisor.end(tracker, advisor.begin() - 0.2)
+        idle = advisor.hints(tracker)
+
+        advisor.begin()
+        advisor.begin()
+        busy = advisor.hints(tracker)
+
+        assert advisor.stats()['load'] == 1.0
+        assert busy['interval'] > idle['interval']
+        assert (busy['width'], busy['quality']) == (360, 0.5)
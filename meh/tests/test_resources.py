@@ -0,0 +1,85 @@
+import pytest
+
+from ..resources import ResourceRegistry
+
+
+class Model:
+    def __init__(self):
+        self.closed = False
+
+
+@pytest.fixture
+def registry():
+    reg = ResourceRegistry()
+    reg.created = 0
+
+    def factory():
+        reg.created += 1
+        return Model()
+
+    reg.register('model', factory, close=lambda model: setattr(model, 'closed', True))
+    return reg
+
+
+class TestResourceRegistry:
+    def test_lazy_and_shared(self, registry):
+        assert registry.created == 0
+        assert not registry.stats()['model']['loaded']
+
+        first = registry.acquire('model')
+        second = registry.acquire('model')
+
+        assert first is second
+        assert registry.created == 1
+        assert registry.stats()['model']['refs'] == 2
+
+    def test_freed_by_last_user(self, registry):
+        model = registry.acquire('model')
+        registry.acquire('model')
+
+        registry.release('model')
+        assert not model.closed
+
+        registry.release('model')
+        assert model.closed
+        assert not registry.stats()['model']['loaded']
+
+        assert registry.acquire('model') is not model
+        assert registry.stats()['model']['loads'] == 2
+
+    def test_use(self, registry):
+        with registry.use('model') as model:
+            assert registry.stats()['model']['refs'] == 1
+
+        assert model.closed
+
+    def test_unknown(self, registry):
+        with pytest.raises(KeyError):
+            registry.acquire('missing')
+
+    def test_replace_loaded(self, registry):
+        registry.acquire('model')
+
+        with pytest.raises(ValueError):
+            registry.register('model', Model)
+
+    def test_refresh(self, registry):
+        old = registry.acquire('model')
+
+        registry.refresh('model')
+        new = registry.acquire('model')
+
+        assert new is not old
+        assert registry.stats()['model']['stale'] == 1
+
+        registry.release('model', old)
+        assert old.closed and not new.closed
+        assert registry.stats()['model']['refs'] == 1
+        assert registry.stats()['model']['stale'] == 0
+
+    def test_refresh_not_loaded(self, registry):
+        registry.refresh('model')
+        registry.acquire('model')
+
+        assert registry.created == 1
+        assert registry.stats()['model']['stale'] == 0